@@ -1,19 +1,45 @@
 import streamlit as st
-import spotipy
+from spotipy.cache_handler import MemoryCacheHandler
 from spotipy.oauth2 import SpotifyOAuth
-import pandas as pd
-import urllib.parse
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from auth import TokenManager
+from cache import SqliteCache, TieredCache, TTLCache, row_weight
+from client import SCOPE, get_client
+from clone import CloneJob, list_pages, run_clone, uri_pages
+from enrich import EnrichmentCache, Enricher
+from exporters import EXPORT_FORMATS, available_formats, export_bytes, export_stream_file
+from fetching import PlaylistFetchError, PlaylistFetchPlanner, fetch_track_page, iter_track_pages
+from jobs import CANCELLED, DONE, FAILED, JobRunner
+from library import LibraryLoader
+from links import is_short_link, parse_link, parse_links, resolve_links
+from metrics import METRICS, RERUN_OVERHEAD_BUDGET, RenderClock, enable_json_log, run_overhead
+from playlist_index import OWNERSHIP_FILTERS, SORT_ORDERS, PlaylistIndex
+from search import MIN_QUERY_LENGTH, QUICK_ACCESS, SEARCH_LIMIT, SEARCH_TTL, PlaylistSearch
+from setops import MATCH_LEVELS, OPERATIONS, combine, result_name
+from share import chunk_messages, decode_share_code, encode_share_code, whatsapp_url
+from shared_cache import SharedCache, open_backend
+from tracks import TrackTable, fetch_track_table, stream_track_chunks
+
+RUN_STARTED = time.perf_counter()   # Imports are free after the first run; everything below is timed
 
 # --- PAGE CONFIG ---
 st.set_page_config(
     page_title="Spotify Playlist Manager",
-    page_icon="🎵",
+    page_icon=":material/music_note:",     # An emoji icon would load Streamlit's whole emoji table on a cold start
     layout="wide",
     initial_sidebar_state="collapsed"
 )
 
 # --- CUSTOM CSS (THEME & ANIMATIONS) ---
-st.markdown("""
+THEME_CSS = """
 <style>
     /* MAIN BACKGROUND WITH GRADIENT */
     .stApp {
@@ -173,7 +199,14 @@ st.markdown("""
     }
 
 </style>
-""", unsafe_allow_html=True)
+"""
+
+@st.cache_resource
+def minified_css():
+    # Sent again on every run, so strip comments and indentation once per process
+    return re.sub(r"\s+", " ", re.sub(r"/\*.*?\*/", "", THEME_CSS, flags=re.DOTALL)).strip()
+
+st.markdown(minified_css(), unsafe_allow_html=True)
 
 
 # --- CONFIG & SECRETS ---
@@ -181,19 +214,46 @@ try:
     CLIENT_ID = st.secrets.get("SPOTIPY_CLIENT_ID", 'SENIN_CLIENT_ID_BURAYA')
     CLIENT_SECRET = st.secrets.get("SPOTIPY_CLIENT_SECRET", 'SENIN_CLIENT_SECRET_BURAYA')
     REDIRECT_URI = st.secrets.get("SPOTIPY_REDIRECT_URI", 'http://localhost:8501')
+    # Optional SQLite file so cached libraries/tracks survive restarts
+    CACHE_PATH = st.secrets.get("CACHE_PATH", '')
+    # Optional SQLite track store: unchanged playlists are never refetched
+    STORE_PATH = st.secrets.get("STORE_PATH", '')
+    # Optional SQLite file for export enrichment lookups (in memory otherwise)
+    ENRICH_PATH = st.secrets.get("ENRICH_PATH", '')
+    # Optional diagnostics output: JSON-lines event log and OpenMetrics file
+    METRICS_LOG = st.secrets.get("METRICS_LOG", '')
+    METRICS_FILE = st.secrets.get("METRICS_FILE", '')
+    # Cache shared by all users for public playlists and search results:
+    # "" keeps it in memory, a file path or redis:// URL shares it across processes, "off" disables it
+    SHARED_CACHE = st.secrets.get("SHARED_CACHE", '')
+    # Playlists longer than this are streamed page by page instead of kept in memory (0: never)
+    STREAM_THRESHOLD = int(st.secrets.get("STREAM_THRESHOLD", 20000))
 except Exception:
     st.error("Secrets bulunamadı. Lütfen .streamlit/secrets.toml dosyasını kontrol et.")
     st.stop()
 
 
+# --- METRICS ---
+# Each section of this run is timed as a `render` metric, tagged with the session
+if METRICS_LOG:
+    enable_json_log(METRICS_LOG)
+session_id = st.session_state.setdefault('session_label', uuid.uuid4().hex[:8])
+render_clock = RenderClock(session=session_id, start=RUN_STARTED)
+render_clock.lap("startup")
+
+
 # --- LOGIN & AUTH ---
-sp_oauth = SpotifyOAuth(
-    client_id=CLIENT_ID,
-    client_secret=CLIENT_SECRET,
-    redirect_uri=REDIRECT_URI,
-    # Scopes: playlist access (read/write), user library, follow status, etc.
-    scope="playlist-read-private playlist-read-collaborative playlist-modify-public playlist-modify-private user-library-read user-read-private user-follow-read"
-)
+# Built once per session. Tokens are kept in memory only: the default file
+# cache would be shared by every user of the server.
+if 'sp_oauth' not in st.session_state:
+    st.session_state['sp_oauth'] = SpotifyOAuth(
+        client_id=CLIENT_ID,
+        client_secret=CLIENT_SECRET,
+        redirect_uri=REDIRECT_URI,
+        scope=SCOPE,
+        cache_handler=MemoryCacheHandler()
+    )
+sp_oauth = st.session_state['sp_oauth']
 
 if 'token_info' not in st.session_state:
     query_params = st.query_params
@@ -225,65 +285,405 @@ if 'token_info' not in st.session_state:
         )
         st.stop()
 
-token = st.session_state['token_info']['access_token']
-sp = spotipy.Spotify(auth=token)
+# The manager refreshes the token shortly before it expires (and once on a
+# 401), shared by every worker thread of this session.
+if 'token_manager' not in st.session_state:
+    st.session_state['token_manager'] = TokenManager(
+        st.session_state['token_info'], refresh=sp_oauth.refresh_access_token
+    )
+token_manager = st.session_state['token_manager']
+sp = get_client(token_manager)
 
 # --- DUAL TOKEN SUTUP ---
 # User requested: Use main token for WRITING (sp), but allow an external token (Exportify) for READING (sp_read).
 external_token = st.session_state.get('external_token')
+external_manager = None
 if external_token:
-    sp_read = spotipy.Spotify(auth=external_token)
+    if 'external_token_manager' not in st.session_state:
+        # Pasted tokens can't be refreshed; assume the standard one-hour lifetime
+        st.session_state['external_token_manager'] = TokenManager(
+            {'access_token': external_token}, label="External token"
+        )
+    external_manager = st.session_state['external_token_manager']
+
+if external_manager is not None and not external_manager.expired:
+    sp_read = get_client(external_manager)
     st.toast("Using External Token for Fetching Data", icon="🔓")
 else:
     sp_read = sp
+    if external_manager is not None:
+        st.toast("External token expired, reading with your login instead", icon="⌛")
+# Per-account caches below are keyed by this manager, so a new login never reuses the last one's
+reader_manager = external_manager if sp_read is not sp else token_manager
+
+# Everything tied to the logged-in account, dropped on logout
+ACCOUNT_STATE = (
+    'token_info', 'token_manager', 'external_token', 'external_token_manager',
+    'reader_profiles', 'fetch_planners', 'playlist_search', 'library_loaders', 'library_index',
+    'spotify_cache', 'clone_jobs', 'sync_results', 'fetch_log', 'api_total',
+    'selected_search_id', 'search_active', 'search_last_typed', 'quick_access_prefetched',
+    'bulk_result', 'bulk_warnings', 'combine_result', 'link_import',
+)
+
+
+# --- CACHE ---
+LIBRARY_TTL = 15 * 60      # Playlist list can change any time, keep it short
+TRACKS_TTL = 24 * 3600     # Keyed by snapshot_id, so only age limits it
+TRACKS_PER_PAGE = 100      # Rows rendered at once in the track list (one API page in streaming mode)
+MAX_DIFF_LINES = 50        # Per change type in the sync diff
+MAX_LIBRARY_OPTIONS = 200  # Playlists rendered in the library picker at once
+SHARE_CODE_INLINE = 4000   # Longer share codes are offered as a download instead of shown
+JOB_WAIT = 0.5             # Seconds a run waits for a new job before showing progress
+SESSION_CACHE_ROWS = 100_000   # Session memory bound: tracks of cached tables plus library playlists
+
+@st.cache_resource
+def get_disk_cache(path):
+    return SqliteCache(path)
+
+if 'spotify_cache' not in st.session_state:
+    st.session_state['spotify_cache'] = TieredCache(
+        TTLCache(maxsize=SESSION_CACHE_ROWS, ttl=LIBRARY_TTL, weigh=row_weight),
+        get_disk_cache(CACHE_PATH) if CACHE_PATH else None,
+    )
+cache = st.session_state['spotify_cache']
+
+@st.cache_resource
+def get_track_store(path):
+    from store import TrackStore
+    return TrackStore(path)
+
+track_store = get_track_store(STORE_PATH) if STORE_PATH else None
+
+@st.cache_resource
+def get_enrichment_cache(path):
+    # Track and artist metadata is the same for every user, so one cache serves all sessions
+    return EnrichmentCache(path or ":memory:")
+
+@st.cache_resource
+def get_shared_cache(spec):
+    return SharedCache(open_backend(spec))
+
+shared_cache = get_shared_cache(SHARED_CACHE) if SHARED_CACHE != 'off' else None
+
+@st.cache_resource
+def get_job_runner():
+    # One worker pool per process; jobs are registered per session
+    return JobRunner()
+
+job_runner = get_job_runner()
+
+render_clock.lap("auth")
 
 
 # --- FUNCTIONS ---
-def get_playlist_id_from_link(url):
-    if "playlist/" in url:
-        try:
-            part1 = url.split("playlist/")[1]
-            return part1.split("?")[0]
-        except:
-            return None
-    return None
+def get_reader_profile():
+    """`current_user()` of the reading token, fetched once per session."""
+    profiles = st.session_state.setdefault('reader_profiles', {})
+    if reader_manager not in profiles:
+        profiles[reader_manager] = sp_read.current_user()
+    return profiles[reader_manager]
+
+def get_reader_id():
+    """Spotify user id behind the reading token (cache namespace)."""
+    return get_reader_profile()['id']
+
+def get_reader_country():
+    """Country of the reading token (None without scope user-read-private)."""
+    return get_reader_profile().get('country')
 
 def get_user_playlists():
-    """Fetch all playlists from the user's library.
-    
-    Note: "Made For You" playlists (Discover Weekly, Release Radar, etc.) 
-    will only appear if the user has followed/liked them in Spotify.
+    """Fetch all playlists from the user's library (see library.LibraryLoader).
+
+    Returns `(playlists, complete)`. The first page is waited for; the rest
+    load in the background and `playlists` is the in-order prefix so far.
+    Results are cached for LIBRARY_TTL; "Refresh Playlists" invalidates them.
     """
-    all_playlists = []
-    fetch_log = []  # Debug log
-    
     try:
-        # First request
-        results = sp_read.current_user_playlists(limit=50)
-        total_from_api = results.get('total', 0)
-        all_playlists.extend(results['items'])
-        fetch_log.append(f"First fetch: Got {len(results['items'])} items, API says total={total_from_api}")
-        
-        # Pagination
-        page_num = 1
-        while results['next']:
-            results = sp_read.next(results)
-            page_num += 1
-            all_playlists.extend(results['items'])
-            fetch_log.append(f"Page {page_num}: Got {len(results['items'])} more items")
-        
-        fetch_log.append(f"Final count: {len(all_playlists)} playlists fetched (API said {total_from_api})")
-        
+        reader_id = get_reader_id()
+        cache_key = ('library', reader_id)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached, True
+
+        loaders = st.session_state.setdefault('library_loaders', {})
+        loader = loaders.get(reader_id)
+        if loader is None:
+            loader = loaders[reader_id] = LibraryLoader(sp_read).start()
+
         # Store log in session state for display
-        st.session_state['fetch_log'] = fetch_log
-        st.session_state['api_total'] = total_from_api
-        
+        st.session_state['fetch_log'] = loader.fetch_log
+        st.session_state['api_total'] = loader.total or 0
+        if not loader.done:
+            return list(loader.playlists), False
+
+        del loaders[reader_id]
+        if loader.error is not None:
+            raise loader.error
+        cache.set(cache_key, loader.playlists, ttl=LIBRARY_TTL)
+        return loader.playlists, True
+
     except Exception as e:
         st.error(f"Error fetching library: {e}")
         import traceback
-        st.session_state['fetch_log'] = [f"ERROR: {str(e)}", traceback.format_exc()]
-            
-    return all_playlists
+        st.session_state['fetch_log'] = [f"ERROR: {str(e)}", "".join(traceback.format_exception(e))]
+
+    return [], True
+
+def get_library_index(playlists):
+    """PlaylistIndex for the current library, rebuilt only when it changes."""
+    fingerprint = (get_reader_id(), len(playlists), hash(tuple((pl['id'], pl.get('snapshot_id')) for pl in playlists if pl)))
+    cached = st.session_state.get('library_index')
+    if cached is None or cached[0] != fingerprint:
+        cached = (fingerprint, PlaylistIndex(playlists, user_id=get_reader_id()))
+        st.session_state['library_index'] = cached
+    return cached[1]
+
+def get_fetch_planner():
+    """One planner per reading token, so the working strategy is remembered."""
+    planners = st.session_state.setdefault('fetch_planners', {})
+    if reader_manager not in planners:
+        planners[reader_manager] = PlaylistFetchPlanner(sp_read, memo=cache, namespace=get_reader_id())
+    return planners[reader_manager]
+
+def get_playlist_search():
+    """One cached searcher per reading token, kept across reruns."""
+    searchers = st.session_state.setdefault('playlist_search', {})
+    if reader_manager not in searchers:
+        shared_search = shared_cache.search_view(get_reader_country()) if shared_cache else None
+        searchers[reader_manager] = PlaylistSearch(
+            sp_read, cache=TieredCache(TTLCache(maxsize=256, ttl=SEARCH_TTL), shared_search)
+        )
+    return searchers[reader_manager]
+
+def cached_track_table(playlist, market=None):
+    """The cached TrackTable for a playlist snapshot, or None.
+
+    Public, non-collaborative playlists are also looked up in the shared
+    cache, so a playlist one user has loaded is free for everyone else.
+    """
+    snapshot_id = playlist.get('snapshot_id')
+    if not snapshot_id:
+        return None
+    cache_key = ('table', get_reader_id(), playlist['id'], snapshot_id, market)
+    table = cache.get(cache_key)
+    if table is None and shared_cache is not None:
+        table = shared_cache.get_table(playlist, market, country=get_reader_country())
+        if table is not None:
+            cache.set(cache_key, table, ttl=TRACKS_TTL)
+    return table
+
+def start_track_table_job(playlist, market=None):
+    """Build the TrackTable for a playlist in the background, once per snapshot.
+
+    With a track store configured, unchanged playlists are read from it and
+    changed ones are diffed against the stored version. The job publishes the
+    growing table as `partial` and finishes with `(table, sync or None)`;
+    the table also goes into the cache (and the shared cache, if the playlist
+    may be shared) when there is a snapshot_id. An earlier job for the same
+    snapshot is returned as is, even failed or cancelled; `forget` it to retry.
+    """
+    playlist_id, snapshot_id, name = playlist['id'], playlist.get('snapshot_id'), playlist.get('name') or ""
+    reader, reader_id, country = sp_read, get_reader_id(), get_reader_country()
+    cache_key = ('table', reader_id, playlist_id, snapshot_id, market)
+
+    def build(job):
+        # Runs on a worker thread: no Streamlit calls in here
+        def on_page(table, total):
+            job.report(len(table) / total if total else None, f"Loaded {len(table)} / {total} tracks", partial=table)
+
+        if track_store is not None and snapshot_id:
+            sync = track_store.sync(
+                reader, reader_id, {'id': playlist_id, 'name': name, 'snapshot_id': snapshot_id},
+                market=market, on_page=on_page
+            )
+            return sync.table, sync
+        return fetch_track_table(reader, playlist_id, market=market, on_page=on_page), None
+
+    def store(result):
+        if snapshot_id:
+            cache.set(cache_key, result[0], ttl=TRACKS_TTL)
+            if shared_cache is not None:
+                shared_cache.set_table(playlist, result[0], market, country=country)
+
+    return job_runner.submit(session_id, cache_key, build, label=f"Loading {name or playlist_id}", on_done=store)
+
+def stream_page_table(playlist, market=None, offset=0):
+    """One page of a streamed playlist as a small TrackTable, fetched when viewed.
+
+    Streaming mode never builds the whole table, so each page shown is
+    fetched on its own and cached like any other small entry.
+    """
+    snapshot_id = playlist.get('snapshot_id')
+    cache_key = ('stream_page', get_reader_id(), playlist['id'], snapshot_id, market, offset)
+    table = cache.get(cache_key)
+    if table is None:
+        table = TrackTable()
+        table.extend(fetch_track_page(sp_read, playlist['id'], offset, market)['items'])
+        cache.set(cache_key, table, ttl=TRACKS_TTL if snapshot_id else LIBRARY_TTL)
+    return table
+
+def stream_chunks(playlist, market=None):
+    """Fresh stream of TrackTable chunks for exports and share codes in streaming mode."""
+    return stream_track_chunks(sp_read, playlist['id'], market=market)
+
+def stream_export(playlist, fmt, market=None):
+    """Streaming-mode export as bytes for a download; its temporary file is closed before returning."""
+    with export_stream_file(stream_chunks(playlist, market), fmt) as fh:
+        return fh.read()
+
+def stream_uri_pages(playlist, market=None):
+    """`run_clone` pages read straight from the API, resumable at any offset."""
+    reader, playlist_id = sp_read, playlist['id']
+    return lambda start=0: uri_pages(iter_track_pages(reader, playlist_id, market=market, start=start))
+
+def shared_table_loader(load_table=None):
+    """Wrap a bulk export `load_table(playlist)` so shareable playlists go through the shared cache."""
+    reader, country = sp_read, get_reader_country()
+    load_table = load_table or (lambda pl: fetch_track_table(reader, pl['id']))
+    if shared_cache is None:
+        return load_table
+
+    def load(pl):
+        table = shared_cache.get_table(pl, country=country)
+        if table is None:
+            table = load_table(pl)
+            shared_cache.set_table(pl, table, country=country)
+        return table
+    return load
+
+def make_table_loader():
+    """`load_table(playlist)` for background jobs: the track store (if configured), then the shared cache."""
+    reader, store_account = sp_read, get_reader_id()
+    return shared_table_loader(
+        (lambda pl: track_store.sync(reader, store_account, pl).table) if track_store else None
+    )
+
+def clone_task(job, clone_job, writer, pages_from, snapshot_id=None):
+    """Background body of a clone; cancelling pauses it resumably."""
+    run_clone(
+        clone_job, writer, pages_from,
+        on_progress=lambda c: job.report(
+            c.progress, f"Added {c.added} / {c.total} tracks · {c.throughput:.0f} tracks/s"
+        ),
+        snapshot_id=snapshot_id,
+    )
+    return clone_job
+
+def bulk_export_task(job, reader, playlists, path, fmt, load_table=None, enricher=None):
+    """Background body of a bulk export; returns `(BulkResult, warnings)`."""
+    from bulk import export_playlists
+
+    result = export_playlists(
+        reader, playlists, path, fmt=fmt,
+        on_progress=lambda done, total, entry: job.report(done / total, f"{done} / {total} · {entry.name}"),
+        load_table=load_table, enricher=enricher,
+    )
+    return result, list(enricher.warnings) if enricher else []
+
+def combine_task(job, playlists, operation, match, load_table, enricher=None):
+    """Background body of a set operation over playlists.
+
+    Returns `(setops.SetResult, playlist names)`, the names as they were when
+    the job started.
+    """
+    tables = []
+    for n, pl in enumerate(playlists):
+        job.report(n / (len(playlists) + 1), f"Loading {pl.get('name') or pl['id']}...")
+        tables.append(load_table(pl))
+    isrcs = None
+    if enricher is not None:
+        job.report(len(playlists) / (len(playlists) + 1), "Looking up ISRCs...")
+        isrcs = [enricher.isrcs(table) for table in tables]
+    return combine(tables, operation, match=match, isrcs=isrcs), [pl.get('name') or pl['id'] for pl in playlists]
+
+def import_task(job, reader, refs, load_table=None):
+    """Background body of a bulk link import; returns a links.LinkImport."""
+    return resolve_links(
+        reader, refs, load_table=load_table,
+        on_progress=lambda done, total: job.report(done / total, f"Resolved {done} / {total} links"),
+    )
+
+def export_task(job, table, fmt, enricher):
+    """Background body of an enriched single-playlist export (memoized on the table)."""
+    job.report(message=f"Looking up details for {len(table)} tracks...")
+    export_bytes(
+        table, fmt, enricher,
+        on_progress=lambda kind, done, total: job.report(done / total, f"Looking up {kind} details: {done} / {total}"),
+    )
+    return list(enricher.warnings) if enricher else []
+
+def arrow_table(data):
+    """Columns (a dict of lists) or rows (a list of dicts) as a pyarrow Table.
+
+    st.dataframe sends Arrow tables as they are; anything else first becomes
+    a pandas DataFrame, about ten times slower for a page of tracks.
+    """
+    import pyarrow as pa    # A Streamlit dependency; loaded with the first table shown
+    return pa.table(data) if isinstance(data, dict) else pa.Table.from_pylist(data)
+
+def show_job_progress(job, cancel=True):
+    st.progress(job.progress, text=job.message or f"{job.label}...")
+    if cancel and st.button("Cancel", key=f"cancel_job_{job.id}", use_container_width=True):
+        job.cancel()
+
+@st.fragment(run_every=1)
+def watch_job(key, render=show_job_progress):
+    """Redraw a running job every second; rerun the whole app once it ends."""
+    job = job_runner.get(session_id, key)
+    if job is None or not job.active:
+        st.rerun()
+    render(job)
+
+def render_clone_writer(key, default_name, pages_fn, make_job, button="✨ Create Playlist",
+                        disabled=False, snapshot_id=None):
+    """Name, start, resume and watch the playlist write stored in `clone_jobs[key]`.
+
+    `make_job(name)` builds a new CloneJob and `pages_fn()` returns its
+    `run_clone` pages; neither is called until writing starts. With no
+    `default_name` the name is not asked for and the CloneJob's default is used.
+    """
+    clone_jobs = st.session_state.setdefault('clone_jobs', {})
+    clone_job = clone_jobs.get(key)
+    job_key = ('clone', key)
+    write_job = job_runner.get(session_id, job_key)
+    writing = write_job is not None and write_job.active
+
+    name = None
+    if default_name is not None:
+        name = st.text_input("New playlist name", value=default_name, key=f"clone_name_{key}")
+    create_clicked = st.button(button, use_container_width=True, key=f"clone_create_{key}",
+                               disabled=writing or disabled)
+    resume_clicked = False
+    if not writing and clone_job is not None and clone_job.status in ("paused", "failed"):
+        if clone_job.status == "paused":
+            st.warning(f"Paused after {clone_job.added} tracks.")
+        else:
+            st.error(f"Failed after {clone_job.added} tracks: {clone_job.error}")
+        if "403" in (clone_job.error or ""):
+            st.warning("⚠️ Permission Denied: Your current token (e.g. Exportify) might be Read-Only. You cannot create playlists with it.")
+        if clone_job.resumable:
+            resume_clicked = st.button("↻ Resume Copy", use_container_width=True, key=f"clone_resume_{key}")
+
+    if create_clicked or resume_clicked:
+        if create_clicked:
+            clone_job = make_job(name)
+            clone_jobs[key] = clone_job
+        job_runner.forget(session_id, job_key)
+        job_runner.submit(
+            session_id, job_key, clone_task, clone_job, sp, pages_fn(), snapshot_id=snapshot_id,
+            label=f"Writing {clone_job.target_name or f'Copy of {clone_job.source_name}'}", long_running=True
+        )
+        writing = True
+
+    if writing:
+        watch_job(job_key)
+    elif clone_job is not None and clone_job.status == "done":
+        st.success(f"✅ Created! {clone_job.added} tracks in {clone_job.elapsed:.1f}s")
+        if clone_job.restarted:
+            st.caption("The playlist changed while the copy was paused, so it was copied again from the start.")
+        if clone_job.skipped:
+            st.caption(f"{clone_job.skipped} local or unavailable tracks were skipped.")
+        st.text_input("New Shareable Link", value=clone_job.target_url, key=f"clone_link_{key}")
 
 
 # --- APP HEADER (Small) ---
@@ -294,7 +694,13 @@ with st.sidebar:
     
     st.markdown("---")
     if st.button("Refresh Playlists", use_container_width=True):
-        # Clear any cached data
+        # Drop the cached library so it is fetched again. Track pages stay
+        # cached: they are keyed by snapshot_id, so only changed playlists miss.
+        # Without a profile yet, no library was cached by this session.
+        reader_profile = st.session_state.get('reader_profiles', {}).get(reader_manager)
+        if reader_profile is not None:
+            cache.delete(('library', reader_profile['id']))
+        st.session_state.pop('library_loaders', None)
         if 'fetch_log' in st.session_state:
             del st.session_state['fetch_log']
         if 'api_total' in st.session_state:
@@ -302,15 +708,62 @@ with st.sidebar:
         st.rerun()
     
     if st.button("🚪 Logout / Reset", use_container_width=True):
-        if 'token_info' in st.session_state:
-            del st.session_state['token_info']
-        if 'selected_search_id' in st.session_state:
-            del st.session_state['selected_search_id']
-        if 'external_token' in st.session_state:
-            del st.session_state['external_token']
+        job_runner.drop_session(session_id)
+        for key in ACCOUNT_STATE:
+            st.session_state.pop(key, None)
+        # Bulk archives hold the whole library; don't leave them in the server's temp dir
+        if 'bulk_dir' in st.session_state:
+            shutil.rmtree(st.session_state.pop('bulk_dir'), ignore_errors=True)
         st.rerun()
 
+    # Token lifetimes (refreshed automatically for the main login)
+    st.caption(f"🔑 Login token valid for {max(0, int(token_manager.expires_in // 60))} min")
+    if external_manager is not None:
+        if external_manager.expired:
+            st.warning("⌛ External token expired. Paste a new one below or clear it.")
+        else:
+            st.caption(f"🔓 External token valid for ~{int(external_manager.expires_in // 60)} min")
+
+    session_jobs = job_runner.jobs(session_id)
+    if session_jobs:
+        st.markdown("---")
+        with st.expander(f"⏳ Background Jobs ({sum(job.active for job in session_jobs)} running)"):
+            for job in session_jobs:
+                st.caption(f"{job.label} · {job.status} · {job.progress:.0%} · {job.elapsed:.0f}s")
+                if job.active and st.button("Cancel", key=f"cancel_sidebar_{job.id}", use_container_width=True):
+                    job.cancel()
+                    st.rerun()
+
     st.markdown("---")
+    with st.expander("📊 Diagnostics"):
+        last_laps = st.session_state.get('render_laps')
+        if last_laps:
+            st.caption("Last run: " + " · ".join(f"{section} {seconds * 1000:.0f} ms" for section, seconds in last_laps))
+            overhead = run_overhead(last_laps)
+            if overhead > RERUN_OVERHEAD_BUDGET:
+                st.warning(f"Startup and auth took {overhead * 1000:.0f} ms, over the {RERUN_OVERHEAD_BUDGET * 1000:.0f} ms budget.")
+        metrics_kind = st.selectbox(
+            "Show", options=[None, "api", "page", "prepare", "export", "render"],
+            format_func=lambda kind: kind or "everything", key="metrics_kind"
+        )
+        timings = METRICS.snapshot(metrics_kind)
+        if timings:
+            st.dataframe(arrow_table(timings), hide_index=True, use_container_width=True)
+        else:
+            st.caption("Nothing recorded yet.")
+        cache_stats = METRICS.cache_snapshot()
+        if cache_stats:
+            st.dataframe(arrow_table(cache_stats), hide_index=True, use_container_width=True)
+        st.caption("Totals for this server process, all sessions.")
+        st.download_button(
+            label="⬇️ Metrics (OpenMetrics)",
+            data=METRICS.openmetrics,
+            file_name="spotify-tools-metrics.txt",
+            mime="text/plain",
+            on_click="ignore",
+            use_container_width=True
+        )
+
     with st.expander("🔓 Token Hack (Reader Mode)"):
         st.info("Paste a 'Read-Only' token (e.g. from Exportify) here. We will use it to **FETCH** playlists, but use your main login to **CREATE** them.")
         external_token_input = st.text_input("External Access Token", type="password", help="Paste Exportify token here.")
@@ -318,20 +771,23 @@ with st.sidebar:
         if st.button("Inject Read Token", use_container_width=True, type="primary"):
             if external_token_input:
                 st.session_state['external_token'] = external_token_input
+                st.session_state.pop('external_token_manager', None)
                 st.success("Read token injected! Reloading...")
-                import time
                 time.sleep(1)
                 st.rerun()
         
         if st.button("Clear External Token", use_container_width=True):
             if 'external_token' in st.session_state:
                 del st.session_state['external_token']
+                st.session_state.pop('external_token_manager', None)
                 st.rerun()
+render_clock.lap("sidebar")
 
 
 # --- MAIN INTERFACE ---
 tab1, tab2, tab3 = st.tabs(["📂 Library", "🔍 Search", "🔗 Paste Link"])
 selected_playlist_id = None
+library_snapshots = {}  # playlist id -> snapshot_id, lets the planner skip refetches
 
 # TAB 1: LIBRARY
 with tab1:
@@ -348,34 +804,201 @@ with tab1:
             "3. Refresh this page"
         )
         
-        my_playlists = get_user_playlists()
-        
-        # Debug information
-        spotify_owned = [pl for pl in my_playlists if pl and pl['owner']['id'] == 'spotify']
-        user_owned = [pl for pl in my_playlists if pl and pl['owner']['id'] != 'spotify']
+        my_playlists, library_complete = get_user_playlists()
+        library_snapshots = {pl['id']: pl.get('snapshot_id') for pl in my_playlists if pl}
         
-        # Debug information (Internal only, not displayed)
-        spotify_owned = [pl for pl in my_playlists if pl and pl['owner']['id'] == 'spotify']
-        user_owned = [pl for pl in my_playlists if pl and pl['owner']['id'] != 'spotify']
+        library_index = get_library_index(my_playlists)
 
-        
-        # Build playlist options
-        playlist_options = {}
-        for pl in my_playlists:
-            if pl:
-                display_name = f"{pl['name']} • {pl['owner']['display_name']}"
-                playlist_options[display_name] = pl['id']
-
-        sorted_keys = sorted(playlist_options.keys(), key=str.lower)
-        
         st.markdown("### Your Library")
-        contact_selected = st.selectbox("Select a playlist", options=sorted_keys, label_visibility="collapsed")
-        
-        if contact_selected:
-            selected_playlist_id = playlist_options[contact_selected]
+        if not library_complete:
+            # Pages after the first are still coming in; rerun once they are all here
+            @st.fragment(run_every=1)
+            def library_progress():
+                loader = st.session_state.get('library_loaders', {}).get(get_reader_id())
+                if loader is None or loader.done:
+                    st.rerun()
+                total = loader.total or 0
+                loaded = len(loader.playlists)
+                st.progress(min(loaded / total, 1.0) if total else 0.0,
+                            text=f"Loading library... {loaded} / {total} playlists")
+
+            library_progress()
+
+        col_filter, col_owner, col_sort = st.columns([3, 2, 2])
+        with col_filter:
+            library_query = st.text_input(
+                "Filter", placeholder="Filter by name, owner or description...",
+                label_visibility="collapsed", key="library_filter"
+            )
+        with col_owner:
+            ownership = st.selectbox(
+                "Show", options=list(OWNERSHIP_FILTERS), format_func=OWNERSHIP_FILTERS.get,
+                label_visibility="collapsed", key="library_ownership"
+            )
+        with col_sort:
+            library_sort = st.selectbox(
+                "Sort", options=list(SORT_ORDERS), format_func=SORT_ORDERS.get,
+                label_visibility="collapsed", key="library_sort"
+            )
+
+        matching_ids, match_count = library_index.search(library_query, ownership, library_sort)
+        window_ids = matching_ids[:MAX_LIBRARY_OPTIONS]
+        st.caption(
+            f"{len(library_index.mine)} yours · {len(library_index) - len(library_index.mine)} followed "
+            f"({len(library_index.spotify_owned)} by Spotify)"
+            + (f" · showing {len(window_ids)} of {match_count} matches, refine the filter to see more"
+               if match_count > len(window_ids) else "")
+        )
+
+        selected_library_id = st.selectbox(
+            "Select a playlist", options=window_ids, format_func=library_index.label,
+            label_visibility="collapsed", key="library_select"
+        )
+
+        if selected_library_id:
+            selected_playlist_id = selected_library_id
+        elif library_query:
+            st.caption("No playlists match this filter.")
+
+        # BULK EXPORT: many playlists into one archive
+        with st.expander("📦 Bulk Export (many playlists → one ZIP)"):
+            if not library_complete:
+                st.caption("Available once the whole library has loaded.")
+            export_all = st.checkbox(f"All {match_count} playlists matching the filter above")
+            if export_all:
+                bulk_ids = matching_ids
+            else:
+                # Keep earlier picks selectable when the filter changes
+                picked = [pid for pid in st.session_state.get('bulk_ids', []) if pid in library_index.by_id]
+                bulk_ids = st.multiselect(
+                    "Playlists", options=list(dict.fromkeys(picked + window_ids)),
+                    format_func=library_index.label, key="bulk_ids"
+                )
+            bulk_format = st.selectbox(
+                "File format", options=available_formats(),
+                format_func=lambda key: EXPORT_FORMATS[key].label, key="bulk_format"
+            )
+            bulk_enrich = EXPORT_FORMATS[bulk_format].enrichable and st.checkbox(
+                "Add audio features, ISRC, release date & genres", key="bulk_enrich"
+            )
+            bulk_dir = st.session_state.setdefault('bulk_dir', tempfile.mkdtemp(prefix="spotify-export-"))
+            bulk_name = f"spotify-playlists-{bulk_format}" + ("-enriched" if bulk_enrich else "")
+            bulk_path = os.path.join(bulk_dir, f"{bulk_name}.zip")
+            st.caption("Running again continues an interrupted export; finished playlists are skipped.")
+
+            bulk_key = ('bulk',)
+            bulk_job = job_runner.get(session_id, bulk_key)
+            bulk_running = bulk_job is not None and bulk_job.active
+            if st.button(f"Export {len(bulk_ids)} Playlists", use_container_width=True,
+                         disabled=not bulk_ids or not library_complete or bulk_running):
+                reader = sp_read
+                job_runner.forget(session_id, bulk_key)
+                bulk_job = job_runner.submit(
+                    session_id, bulk_key, bulk_export_task,
+                    reader, [library_index.by_id[pid] for pid in bulk_ids], bulk_path, bulk_format,
+                    # Unchanged playlists come straight from the track store, if configured
+                    load_table=make_table_loader(),
+                    enricher=Enricher(reader, get_enrichment_cache(ENRICH_PATH)) if bulk_enrich else None,
+                    label=f"Exporting {len(bulk_ids)} playlists", long_running=True,
+                )
+                bulk_running = True
+
+            if bulk_running:
+                watch_job(bulk_key)
+            elif bulk_job is not None:
+                if bulk_job.status == DONE:
+                    st.session_state['bulk_result'], st.session_state['bulk_warnings'] = bulk_job.result
+                elif bulk_job.status == CANCELLED:
+                    st.warning("Export cancelled; run it again to continue where it stopped.")
+                else:
+                    st.error(f"Export failed: {bulk_job.error}")
+                job_runner.forget(session_id, bulk_key)
+            for warning in st.session_state.get('bulk_warnings', ()):
+                st.warning(warning)
+
+            bulk_result = st.session_state.get('bulk_result')
+            if bulk_result and os.path.exists(bulk_result.path):
+                exported = len(bulk_result.entries) - len(bulk_result.failed)
+                st.success(f"✅ {exported} playlists exported in {bulk_result.elapsed:.1f}s")
+                for entry in bulk_result.failed:
+                    st.caption(f"⚠️ {entry.name}: {entry.error}")
+                st.download_button(
+                    label="⬇️ Download ZIP",
+                    data=Path(bulk_result.path).read_bytes,
+                    file_name=os.path.basename(bulk_result.path),
+                    mime="application/zip",
+                    on_click="ignore",
+                    use_container_width=True
+                )
+                if st.button("Clear Archive", use_container_width=True):
+                    os.remove(bulk_result.path)
+                    del st.session_state['bulk_result']
+                    st.session_state.pop('bulk_warnings', None)
+                    st.rerun()
+
+        # COMBINE: set operations across playlists, written like a clone
+        with st.expander("🧮 Combine Playlists (merge, dedupe, intersect, subtract)"):
+            picked = [pid for pid in st.session_state.get('combine_ids', []) if pid in library_index.by_id]
+            combine_ids = st.multiselect(
+                "Playlists, in order", options=list(dict.fromkeys(picked + window_ids)),
+                format_func=library_index.label, key="combine_ids"
+            )
+            combine_op = st.selectbox(
+                "Operation", options=list(OPERATIONS),
+                format_func=lambda op: f"{op.capitalize()}: {OPERATIONS[op]}", key="combine_op"
+            )
+            combine_match = st.selectbox(
+                "Same track when", options=list(MATCH_LEVELS), format_func=MATCH_LEVELS.get, key="combine_match"
+            )
+
+            combine_key = ('combine',)
+            combine_job = job_runner.get(session_id, combine_key)
+            combining = combine_job is not None and combine_job.active
+            if st.button("Preview Result", use_container_width=True, disabled=not combine_ids or combining):
+                reader = sp_read
+                job_runner.forget(session_id, combine_key)
+                combine_job = job_runner.submit(
+                    session_id, combine_key, combine_task,
+                    [library_index.by_id[pid] for pid in combine_ids], combine_op, combine_match, make_table_loader(),
+                    # ISRCs come from the (cached) track lookup of export enrichment
+                    Enricher(reader, get_enrichment_cache(ENRICH_PATH)) if combine_match != "uri" else None,
+                    label=f"{combine_op.capitalize()} of {len(combine_ids)} playlists", long_running=True,
+                )
+                combining = True
+
+            if combining:
+                watch_job(combine_key)
+            elif combine_job is not None:
+                if combine_job.status == DONE:
+                    st.session_state['combine_result'] = combine_job.result
+                    # A paused write of the previous result must not resume with these tracks
+                    st.session_state.get('clone_jobs', {}).pop('combine', None)
+                elif combine_job.status == FAILED:
+                    st.error(f"Combining failed: {combine_job.error}")
+                job_runner.forget(session_id, combine_key)
+
+            if 'combine_result' in st.session_state:
+                combined, combined_names = st.session_state['combine_result']
+                st.caption(
+                    f"{combined.operation.capitalize()} of {len(combined_names)} playlists: "
+                    f"{len(combined.table)} tracks · {combined.duplicates} duplicates dropped · "
+                    f"{combined.skipped} unavailable or local skipped"
+                    + "".join(f" · {n} matched by {level}" for level, n in combined.matched_by.items() if n)
+                )
+                st.dataframe(arrow_table(combined.table.window(0, TRACKS_PER_PAGE)), hide_index=True, use_container_width=True, height=300)
+
+                render_clone_writer(
+                    'combine', result_name(combined.operation, combined_names), lambda: combined.table.uri_pages,
+                    lambda name: CloneJob(
+                        combined.operation, combined_names[0], target_name=name,
+                        description=f"{combined.operation.capitalize()} of {', '.join(combined_names)}",
+                    ),
+                    disabled=not len(combined.table),
+                )
 
     except Exception as e:
         st.error(f"Error loading library: {e}")
+render_clock.lap("library_tab")
 
 # TAB 2: SEARCH (Visual Grid)
 with tab2:
@@ -390,20 +1013,40 @@ with tab2:
 
     # Quick Access Buttons
     st.markdown("<p style='font-size:0.9rem; color:#B3B3B3; margin-top:20px;'>Quick Access (Official):</p>", unsafe_allow_html=True)
-    col_q1, col_q2, col_q3, col_q4 = st.columns(4)
-    
+    playlist_search = get_playlist_search()
+    if not st.session_state.get('quick_access_prefetched'):
+        # Warm the cache for the fixed queries while the user looks around
+        for quick_query in QUICK_ACCESS.values():
+            playlist_search.prefetch(quick_query)
+        st.session_state['quick_access_prefetched'] = True
+
     auto_search_term = None
-    if col_q1.button("Discover Weekly"): auto_search_term = "Discover Weekly owner:spotify"
-    if col_q2.button("Release Radar"): auto_search_term = "Release Radar owner:spotify"
-    if col_q3.button("On Repeat"): auto_search_term = "On Repeat owner:spotify"
-    if col_q4.button("Time Capsule"): auto_search_term = "Time Capsule owner:spotify"
+    for col_q, (quick_label, quick_query) in zip(st.columns(len(QUICK_ACCESS)), QUICK_ACCESS.items()):
+        if col_q.button(quick_label):
+            auto_search_term = quick_query
 
-    final_query = auto_search_term if auto_search_term else (search_query if search_clicked else None)
+    # Searches run on GO, Enter (a changed query) or Quick Access; the active
+    # query then survives reruns and is served from cache.
+    typed_query = search_query.strip()
+    if auto_search_term:
+        st.session_state['search_active'] = {'query': auto_search_term, 'pages': 1}
+    elif len(typed_query) >= MIN_QUERY_LENGTH and (search_clicked or typed_query != st.session_state.get('search_last_typed')):
+        st.session_state['search_active'] = {'query': typed_query, 'pages': 1}
+    st.session_state['search_last_typed'] = typed_query
 
-    if final_query:
+    search_active = st.session_state.get('search_active')
+    if search_active:
+        final_query = search_active['query']
         try:
-            results_search = sp_read.search(q=final_query, type='playlist', limit=8)
-            playlists_found = results_search['playlists']['items']
+            playlists_found = []
+            has_more = False
+            for page in range(search_active['pages']):
+                results_page = playlist_search.search(final_query, offset=page * SEARCH_LIMIT)
+                playlists_found.extend(results_page['items'])
+                has_more = results_page['has_more']
+            if has_more:
+                # Fetch the next page before "Load more" is clicked
+                playlist_search.prefetch(final_query, offset=search_active['pages'] * SEARCH_LIMIT)
             
             if playlists_found:
                 st.markdown("<br>", unsafe_allow_html=True)
@@ -412,21 +1055,24 @@ with tab2:
                 # GRID DISPLAY
                 cols = st.columns(4)
                 for i, pl in enumerate(playlists_found):
-                    if pl:
-                        with cols[i % 4]:
-                            # Card HTML
-                            img_url = pl['images'][0]['url'] if pl['images'] else "https://via.placeholder.com/300"
-                            if st.button(f"Select:\n{pl['name'][:20]}...", key=pl['id']): # Hack to make card clickable-ish
-                                st.session_state['selected_search_id'] = pl['id']
-                                st.rerun()
-                                
-                            st.markdown(f"""
-                            <div style="margin-top:-10px; margin-bottom:20px;">
-                                <img src="{img_url}" style="width:100%; border-radius:8px;">
-                                <div style="font-weight:bold; font-size:0.9em; margin-top:5px;">{pl['name']}</div>
-                                <div style="font-size:0.8em; color:#B3B3B3;">{pl['owner']['display_name']}</div>
-                            </div>
-                            """, unsafe_allow_html=True)
+                    with cols[i % 4]:
+                        # Card HTML
+                        img_url = pl['images'][0]['url'] if pl['images'] else "https://via.placeholder.com/300"
+                        if st.button(f"Select:\n{pl['name'][:20]}...", key=f"search_{i}_{pl['id']}"): # Hack to make card clickable-ish
+                            st.session_state['selected_search_id'] = pl['id']
+                            st.rerun()
+                            
+                        st.markdown(f"""
+                        <div style="margin-top:-10px; margin-bottom:20px;">
+                            <img src="{img_url}" style="width:100%; border-radius:8px;">
+                            <div style="font-weight:bold; font-size:0.9em; margin-top:5px;">{pl['name']}</div>
+                            <div style="font-size:0.8em; color:#B3B3B3;">{pl['owner']['display_name']}</div>
+                        </div>
+                        """, unsafe_allow_html=True)
+
+                if has_more and st.button("Load more", use_container_width=True):
+                    search_active['pages'] += 1
+                    st.rerun()
             else:
                 st.warning("No playlists found.")
                 
@@ -436,6 +1082,7 @@ with tab2:
     # Check for session state selection
     if 'selected_search_id' in st.session_state:
         selected_playlist_id = st.session_state['selected_search_id']
+render_clock.lap("search_tab")
 
 
 # TAB 3: PASTE LINK
@@ -444,50 +1091,127 @@ with tab3:
     st.markdown("### Import via Link")
     link_input = st.text_input("Paste URL", placeholder="https://open.spotify.com/playlist/...")
     if link_input:
-        parsed_id = get_playlist_id_from_link(link_input)
-        if parsed_id:
-            selected_playlist_id = parsed_id
+        parsed_ref = parse_link(link_input)
+        if parsed_ref is not None and parsed_ref.kind == "playlist":
+            selected_playlist_id = parsed_ref.id
+        elif parsed_ref is not None:
+            st.info(f"That link is a {parsed_ref.kind}, not a playlist; add it under Bulk Import below.")
+        elif is_short_link(link_input):
+            st.error("Short links can't be read here; open it and paste the full open.spotify.com link.")
         else:
             st.error("Invalid Spotify Link")
 
+    # BULK IMPORT: many playlist / album / track links into one list
+    with st.expander("📋 Bulk Import (many links at once)"):
+        bulk_links = st.text_area(
+            "Links or URIs", height=150,
+            placeholder="https://open.spotify.com/album/...\nspotify:track:...\nhttps://open.spotify.com/playlist/...",
+            help="Playlists, albums and tracks; separated by new lines, spaces or commas."
+        )
+        import_refs, import_duplicates, import_invalid = parse_links(bulk_links)
+        if bulk_links:
+            kinds = {kind: sum(ref.kind == kind for ref in import_refs) for kind in ("playlist", "album", "track")}
+            st.caption(
+                (" · ".join(f"{n} {kind}s" for kind, n in kinds.items() if n) or "No links recognized")
+                + (f" · {import_duplicates} duplicates removed" if import_duplicates else "")
+            )
+            if import_invalid:
+                st.warning(f"Not recognized ({len(import_invalid)}): " + ", ".join(import_invalid[:10])
+                           + (" ..." if len(import_invalid) > 10 else ""))
+
+        import_key = ('import',)
+        import_job = job_runner.get(session_id, import_key)
+        importing = import_job is not None and import_job.active
+        if st.button(f"Import {len(import_refs)} Links", use_container_width=True,
+                     disabled=not import_refs or importing):
+            job_runner.forget(session_id, import_key)
+            job_runner.submit(
+                session_id, import_key, import_task, sp_read, import_refs, make_table_loader(),
+                label=f"Importing {len(import_refs)} links", long_running=True,
+            )
+            importing = True
+
+        if importing:
+            watch_job(import_key)
+        elif import_job is not None:
+            if import_job.status == DONE:
+                st.session_state['link_import'] = import_job.result
+                # A paused write of the previous import must not resume with these tracks
+                st.session_state.get('clone_jobs', {}).pop('import', None)
+            elif import_job.status == FAILED:
+                st.error(f"Import failed: {import_job.error}")
+            job_runner.forget(session_id, import_key)
+
+        imported = st.session_state.get('link_import')
+        if imported is not None:
+            st.caption(f"{len(imported.table)} tracks from {len(imported.results) - len(imported.failed)} links "
+                       f"in {imported.elapsed:.1f}s")
+            for entry in imported.failed:
+                st.caption(f"⚠️ {entry.kind} {entry.id}: {entry.error}")
+            st.dataframe(arrow_table(imported.table.window(0, TRACKS_PER_PAGE)), hide_index=True, use_container_width=True, height=300)
+
+            import_format = st.selectbox(
+                "File format", options=available_formats(),
+                format_func=lambda key: EXPORT_FORMATS[key].label, key="import_format"
+            )
+            st.download_button(
+                label=f"⬇️ Download as {EXPORT_FORMATS[import_format].label}",
+                data=lambda: export_bytes(imported.table, import_format),
+                file_name=f"spotify-import.{EXPORT_FORMATS[import_format].extension}",
+                mime=EXPORT_FORMATS[import_format].mime,
+                on_click="ignore",
+                use_container_width=True
+            )
+
+            render_clone_writer(
+                'import', "Imported links", lambda: imported.table.uri_pages,
+                lambda name: CloneJob(
+                    "link-import", name, target_name=name, description=f"Imported from {len(imported.results)} links",
+                ),
+                disabled=not len(imported.table),
+            )
+
+    # RESTORE: recreate a playlist from a share code
+    with st.expander("📥 Restore from Share Code"):
+        share_code_input = st.text_area("Share code", placeholder="spl1:...", height=100)
+        share_code_file = st.file_uploader("...or a share code file", type=["txt"])
+        if share_code_file is not None:
+            share_code_input = share_code_file.getvalue().decode("utf-8", "replace")
+        if share_code_input:
+            try:
+                restored_name, restored_uris = decode_share_code(share_code_input)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.caption(f"{restored_name or 'Shared playlist'}: {len(restored_uris)} tracks")
+                # Keyed by the code, so a paused write only resumes with the tracks it started with
+                render_clone_writer(
+                    f"restore-{hashlib.sha1(share_code_input.strip().encode('utf-8')).hexdigest()[:12]}",
+                    restored_name or "Shared playlist", lambda: list_pages(restored_uris),
+                    lambda name: CloneJob("share-code", restored_name, target_name=name,
+                                          description="Restored from a share code"),
+                    button="✨ Create Playlist from Code", disabled=not restored_uris,
+                )
+render_clock.lap("link_tab")
+
 
 # --- DISPLAY RESULTS ---
 if selected_playlist_id:
     results = None
+    results_market = None
     fetch_errors = []
-    
-    # Strategy 1: Market = from_token (Requires scope user-read-private)
-    if not results:
-        try:
-            results = sp_read.playlist(selected_playlist_id, market='from_token')
-        except Exception as e:
-            fetch_errors.append(f"Strategy 1 (from_token): {e}")
 
-    # Strategy 2: No Market (Generic)
-    if not results:
-        try:
-            results = sp_read.playlist(selected_playlist_id)
-        except Exception as e:
-            fetch_errors.append(f"Strategy 2 (No Market): {e}")
+    try:
+        results, results_market = get_fetch_planner().resolve(
+            selected_playlist_id, snapshot_id=library_snapshots.get(selected_playlist_id)
+        )
+    except PlaylistFetchError as e:
+        fetch_errors = e.errors
+    except Exception as e:
+        fetch_errors.append(str(e))
 
-    # Strategy 3: Market = US (Fallback)
-    if not results:
-        try:
-            results = sp_read.playlist(selected_playlist_id, market='US')
-        except Exception as e:
-            fetch_errors.append(f"Strategy 3 (US): {e}")
-            
-    # Strategy 4: Raw (No additional types)
-    if not results:
-        try:
-            results = sp_read.playlist(selected_playlist_id, additional_types=None)
-        except Exception as e:
-            fetch_errors.append(f"Strategy 4 (No additional_types): {e}")
-            
     if results:
         try:
-            tracks = results['tracks']['items']
-
             st.markdown("<br>", unsafe_allow_html=True)
             
             # HERO SECTION
@@ -508,132 +1232,248 @@ if selected_playlist_id:
             # CONTENT AREA
             col_list, col_actions = st.columns([2, 1.2])
 
-            # PREPARE DATA
-            share_list_text = []
-            track_data_csv = []
-            track_uris = [] # For cloning
-            
-            for item in tracks:
-                if item.get('track'):
-                    track = item['track']
-                    t_name = track['name']
-                    track_uris.append(track['uri']) # Collect URI
-                    t_artist = track['artists'][0]['name']
-                    t_album = track['album']['name'] if 'album' in track else ""
-                    
-                    share_list_text.append(f"{t_name} - {t_artist}")
-                    track_data_csv.append({
-                        "Title": t_name,
-                        "Artist": t_artist,
-                        "Album": t_album,
-                        "Duration (ms)": track['duration_ms']
-                    })
-
             # --- LEFT: TRACK LIST ---
+            # Only one window of TRACKS_PER_PAGE rows is sent to the browser,
+            # so render cost doesn't grow with the playlist.
             with col_list:
                 st.subheader("🎵 Tracks")
-                with st.container(height=500):
-                    for idx, item in enumerate(tracks):
-                        if item.get('track'):
-                            tr = item['track']
-                            # Custom HTML Row for better look
-                            st.markdown(
-                                f"""
-                                <div class="track-row">
-                                    <div class="track-info">
-                                        <span class="track-name">{idx + 1}. {tr['name']}</span>
-                                        <span class="track-artist">{tr['artists'][0]['name']}</span>
-                                    </div>
-                                </div>
-                                """, 
-                                unsafe_allow_html=True
-                            )
-                        else:
-                            # Handle empty/local tracks
-                            st.caption(f"{idx + 1}. Unknown Track (Local? or Unplayable)")
+                total_tracks = results['tracks']['total'] or 0
+                page_count = max(1, -(-total_tracks // TRACKS_PER_PAGE))
+                view_page = 1
+                if page_count > 1:
+                    view_page = st.number_input(
+                        f"Page (of {page_count})", min_value=1, max_value=page_count, value=1,
+                        key=f"track_page_{selected_playlist_id}"
+                    )
+                window_start = (view_page - 1) * TRACKS_PER_PAGE
+                window_end = window_start + TRACKS_PER_PAGE
+
+                # STREAMING MODE: very long playlists are never held in memory;
+                # the list fetches the page being viewed and every action streams.
+                streaming = bool(STREAM_THRESHOLD) and total_tracks > STREAM_THRESHOLD
+                track_table = None
+                if streaming:
+                    st.caption(f"⚡ Streaming mode: {total_tracks} tracks are read page by page, never all at once.")
+                    page_table = stream_page_table(results, results_market, window_start)
+                    st.dataframe(arrow_table(page_table.window(0, TRACKS_PER_PAGE, first_position=window_start + 1)), hide_index=True, use_container_width=True, height=500)
+                else:
+                    # PREPARE DATA (one table per snapshot, shared by every view below).
+                    # Fetching runs as a background job, so reruns don't restart it.
+                    track_table = cached_track_table(results, results_market)
+                if track_table is None and not streaming:
+                    # Returns the existing job if there is one: a failed or cancelled load stays shown until Retry
+                    tracks_job = start_track_table_job(results, market=results_market)
+                    tracks_job.wait(JOB_WAIT)   # Small playlists are done before progress would flash
+                    if tracks_job.status == DONE:
+                        track_table, last_sync = tracks_job.result
+                        if last_sync is not None:
+                            st.session_state.setdefault('sync_results', {})[selected_playlist_id] = last_sync
+                        if results.get('snapshot_id'):
+                            # Cached now; the job is no longer needed
+                            job_runner.forget(session_id, tracks_job.key)
+                    elif tracks_job.status in (FAILED, CANCELLED):
+                        st.error(f"Could not load tracks: {tracks_job.error or 'cancelled'}")
+                        if st.button("↻ Retry", use_container_width=True):
+                            job_runner.forget(session_id, tracks_job.key)
+                            st.rerun()
+                    else:
+                        def show_loading(job):
+                            # The visible window appears as soon as its rows are in
+                            show_job_progress(job)
+                            table = job.partial
+                            rows = len(table.available) if table is not None else 0     # Last column filled per row
+                            if rows > window_start:
+                                st.dataframe(arrow_table(table.window(window_start, min(window_end, rows))), hide_index=True, use_container_width=True, height=500)
+
+                        watch_job(tracks_job.key, show_loading)
+
+                if track_table is not None:
+                    st.dataframe(arrow_table(track_table.window(window_start, window_end)), hide_index=True, use_container_width=True, height=500)
+
+                # Changes since the last time this playlist was synced to the store
+                last_sync = st.session_state.get('sync_results', {}).get(selected_playlist_id)
+                if last_sync is not None and last_sync.diff:
+                    with st.expander(f"🔄 Changed since last sync: {last_sync.diff.summary()}"):
+                        for title, changes in (("Added", last_sync.diff.added), ("Removed", last_sync.diff.removed), ("Moved", last_sync.diff.moved)):
+                            if changes:
+                                st.markdown(f"**{title}**")
+                                st.text("\n".join(f"{pos}. {label}" for pos, label in changes[:MAX_DIFF_LINES]))
+                                if len(changes) > MAX_DIFF_LINES:
+                                    st.caption(f"... and {len(changes) - MAX_DIFF_LINES} more")
 
             # --- RIGHT: ACTIONS ---
             with col_actions:
-                st.container()
-                with st.container():
-                    st.subheader("Share EXACT List")
-                    st.info("ℹ️ Spotify links often change songs. Use these tools to share your **exact** tracklist.")
-                    
-                    # 1. Text Copy (Best for Chat)
-                    st.markdown("**1. Copy to WhatsApp/Discord**")
-                    text_content = "\n".join(share_list_text)
+                if track_table is None and not streaming:
+                    st.caption("Sharing, export and cloning are available once the tracks have loaded.")
+                else:
+                    st.container()
+                    with st.container():
+                        st.subheader("Share EXACT List")
+                        st.info("ℹ️ Spotify links often change songs. Use these tools to share your **exact** tracklist.")
                     
-                    # WhatsApp Button
-                    encoded_text = urllib.parse.quote(text_content)
-                    whatsapp_url = f"https://wa.me/?text={encoded_text}"
-                    st.markdown(f"""
-                    <a href="{whatsapp_url}" target="_blank" style="
-                        display: inline-block;
-                        background-color: #25D366;
-                        color: white;
-                        padding: 8px 16px;
-                        border-radius: 20px;
-                        text-decoration: none;
-                        font-weight: bold;
-                        margin-bottom: 10px;
-                    ">
-                        📱 Share on WhatsApp
-                    </a>
-                    """, unsafe_allow_html=True)
-
-                    # Code Block for Copy
-                    st.code(text_content, language="text")
-                    st.caption("Click the copy button 📄 in the top right of the box above.")
+                        # 1. Text Copy (Best for Chat)
+                        st.markdown("**1. Copy to WhatsApp/Discord**")
+                        # Split once per snapshot into messages short enough for a wa.me link;
+                        # only the one being shared is sent to the browser
+                        if streaming:
+                            messages = []
+                            st.caption("Too long to send as messages: share the code or the text file instead.")
+                        else:
+                            messages = track_table.memo('share_messages', lambda: chunk_messages(track_table.share_lines(), results['name']))
+                        message_index = 0
+                        if len(messages) > 1:
+                            message_index = st.number_input(
+                                f"Message (of {len(messages)})", min_value=1, max_value=len(messages), value=1,
+                                key=f"share_part_{selected_playlist_id}"
+                            ) - 1
+                        message = messages[message_index] if messages else ""
                     
-                    st.markdown("<br>", unsafe_allow_html=True)
+                        if not streaming:
+                            # WhatsApp Button
+                            st.markdown(f"""
+                            <a href="{whatsapp_url(message)}" target="_blank" style="
+                                display: inline-block;
+                                background-color: #25D366;
+                                color: white;
+                                padding: 8px 16px;
+                                border-radius: 20px;
+                                text-decoration: none;
+                                font-weight: bold;
+                                margin-bottom: 10px;
+                            ">
+                                📱 Share on WhatsApp{f" ({message_index + 1}/{len(messages)})" if len(messages) > 1 else ""}
+                            </a>
+                            """, unsafe_allow_html=True)
 
-                    # 2. CSV Export (Best for Backup)
-                    st.markdown("**2. Download File**")
-                    df = pd.DataFrame(track_data_csv)
-                    csv = df.to_csv(index=False).encode('utf-8')
+                            # Code Block for Copy
+                            st.code(message, language="text")
+                            st.caption("Click the copy button 📄 in the top right of the box above.")
+                        if streaming:
+                            # Held as one string while served: text lines are far smaller than the full export
+                            st.download_button(
+                                label="⬇️ Whole list as text",
+                                data=lambda: "\n".join(line for chunk in stream_chunks(results, results_market) for line in chunk.share_lines()),
+                                file_name=f"{results['name']}.txt",
+                                mime="text/plain",
+                                on_click="ignore",
+                                use_container_width=True
+                            )
+                        elif len(messages) > 1:
+                            st.download_button(
+                                label="⬇️ Whole list as text",
+                                data=lambda: track_table.memo('share_text', lambda: "\n".join(track_table.share_lines())),
+                                file_name=f"{results['name']}.txt",
+                                mime="text/plain",
+                                on_click="ignore",
+                                use_container_width=True
+                            )
                     
-                    st.download_button(
-                        label="⬇️ Download as CSV",
-                        data=csv,
-                        file_name=f"{results['name']}.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
+                        st.markdown("<br>", unsafe_allow_html=True)
+
+                        # 2. Share Code (compact, restores the exact playlist)
+                        st.markdown("**2. Share Code (Restorable)**")
+                        if streaming:
+                            # Built page by page on click; only the compressed code is kept
+                            st.download_button(
+                                label="⬇️ Share code",
+                                data=lambda: encode_share_code(
+                                    results['name'], (uri for chunk in stream_chunks(results, results_market) for uri in chunk.uri)
+                                ),
+                                file_name=f"{results['name']}.spl.txt",
+                                mime="text/plain",
+                                on_click="ignore",
+                                use_container_width=True
+                            )
+                        else:
+                            share_code = track_table.memo('share_code', lambda: encode_share_code(results['name'], track_table.uri))
+                            if len(share_code) <= SHARE_CODE_INLINE:
+                                st.code(share_code, language="text")
+                            else:
+                                st.download_button(
+                                    label=f"⬇️ Share code ({len(share_code) // 1024} KB)",
+                                    data=share_code,
+                                    file_name=f"{results['name']}.spl.txt",
+                                    mime="text/plain",
+                                    on_click="ignore",
+                                    use_container_width=True
+                                )
+                        st.caption("Anyone can recreate this exact playlist from it under 🔗 Paste Link → Restore.")
+
+                        st.markdown("<br>", unsafe_allow_html=True)
+
+                        # 3. File Export (Best for Backup)
+                        st.markdown("**3. Download File**")
+                        export_key = st.selectbox(
+                            "Format", options=available_formats(),
+                            format_func=lambda key: EXPORT_FORMATS[key].label, label_visibility="collapsed"
+                        )
+                        export_format = EXPORT_FORMATS[export_key]
+                        # Enrichment columns line up with a whole table, so streaming exports go without
+                        enrich_export = export_format.enrichable and not streaming and st.checkbox(
+                            "Add audio features, ISRC, release date & genres",
+                            help="Looked up in batches and cached, so repeat tracks and artists cost nothing."
+                        )
+                        enricher = Enricher(sp_read, get_enrichment_cache(ENRICH_PATH)) if enrich_export else None
+                        export_ready = True
+                        if enricher is not None:
+                            # Lookups can take a while: run them as a job, then download the memoized bytes
+                            # A failed or cancelled job stays shown until Retry, so reruns don't restart it
+                            export_job_key = ('export', selected_playlist_id, results.get('snapshot_id'), export_key)
+                            export_job = job_runner.get(session_id, export_job_key)
+                            if export_job is None:
+                                export_job = job_runner.submit(
+                                    session_id, export_job_key, export_task,
+                                    track_table, export_key, enricher, label=f"Enriching {results['name']}", long_running=True
+                                )
+                                export_job.wait(JOB_WAIT)
+                            export_ready = export_job.status == DONE
+                            if export_job.active:
+                                watch_job(export_job.key)
+                            elif export_ready:
+                                for warning in export_job.result:
+                                    st.warning(warning)
+                            else:
+                                st.error(f"Enrichment failed: {export_job.error or 'cancelled'}")
+                                if st.button("↻ Retry", key="retry_enrich", use_container_width=True):
+                                    job_runner.forget(session_id, export_job_key)
+                                    st.rerun()
 
-                    st.markdown("<br>", unsafe_allow_html=True)
+                        # Bytes are only generated when the button is clicked, then memoized per snapshot.
+                        # Streaming exports are encoded to a temporary file instead; Streamlit keeps the
+                        # bytes read back from it in memory to serve them, but only that one copy is held.
+                        st.download_button(
+                            label=f"⬇️ Download as {export_format.label}",
+                            data=(
+                                (lambda: stream_export(results, export_key, results_market)) if streaming
+                                else (lambda: export_bytes(track_table, export_key, enricher))
+                            ),
+                            file_name=f"{results['name']}.{export_format.extension}",
+                            mime=export_format.mime,
+                            on_click="ignore",
+                            disabled=not export_ready,
+                            use_container_width=True
+                        )
+
+                        st.markdown("<br>", unsafe_allow_html=True)
                     
-                    # 3. Direct Link (Fallback)
-                    st.markdown("**3. Original Link (May Change Songs)**")
-                    spotify_url = results['external_urls']['spotify']
-                    st.text_input("Spotify URL", value=spotify_url, label_visibility="collapsed")
+                        # 4. Direct Link (Fallback)
+                        st.markdown("**4. Original Link (May Change Songs)**")
+                        spotify_url = results['external_urls']['spotify']
+                        st.text_input("Spotify URL", value=spotify_url, label_visibility="collapsed")
                     
-                    st.markdown("<br>", unsafe_allow_html=True)
+                        st.markdown("<br>", unsafe_allow_html=True)
 
-                    # 4. Clone Feature
-                    st.markdown("**4. Clone & Share (Static Link)**")
-                    st.caption("Creates a new playlist in YOUR library with these exact songs.")
+                        # 5. Clone Feature
+                        st.markdown("**5. Clone & Share (Static Link)**")
+                        st.caption("Creates a new playlist in YOUR library with these exact songs.")
                     
-                    if st.button("✨ Create Copy of Playlist", use_container_width=True):
-                        try:
-                            with st.spinner("Creating playlist..."):
-                                # 1. Create Playlist
-                                user_id = sp.current_user()['id']
-                                new_pl_name = f"Copy of {results['name']}"
-                                desc = f"Static copy of {results['name']} created on {pd.Timestamp.now().strftime('%Y-%m-%d')}"
-                                new_pl = sp.user_playlist_create(user_id, new_pl_name, public=False, description=desc)
-                                
-                                # 2. Add Tracks (Chunked 100)
-                                if track_uris:
-                                    for i in range(0, len(track_uris), 100):
-                                        chunk = track_uris[i:i+100]
-                                        sp.playlist_add_items(new_pl['id'], chunk)
-                                
-                                st.success(f"✅ Created!")
-                                st.text_input("New Shareable Link", value=new_pl['external_urls']['spotify'])
-                        except Exception as e:
-                            st.error(f"Failed: {e}")
-                            if "403" in str(e):
-                                st.warning("⚠️ Permission Denied: Your current token (e.g. Exportify) might be Read-Only. You cannot create playlists with it.")
+                        # Copying runs as a job: it keeps going while the page is used
+                        render_clone_writer(
+                            selected_playlist_id, None,
+                            lambda: stream_uri_pages(results, results_market) if streaming else track_table.uri_pages,
+                            lambda name: CloneJob(selected_playlist_id, results['name'], results.get('snapshot_id')),
+                            button="✨ Create Copy of Playlist", snapshot_id=results.get('snapshot_id'),
+                        )
         except Exception as e:
             st.error(f"Error processing playlist display: {e}")
             
@@ -644,3 +1484,8 @@ if selected_playlist_id:
                 st.write(err)
             
             st.warning("⚠️ Try clicking 'Logout / Reset' in the sidebar to refresh permissions!")
+
+render_clock.lap("playlist_view")
+st.session_state['render_laps'] = render_clock.laps
+if METRICS_FILE:
+    METRICS.write_openmetrics(METRICS_FILE)
@@ -0,0 +1,77 @@
+"""Access token lifetime handling.
+
+A `TokenManager` owns one token_info dict and hands out a valid access token
+before every request, refreshing it shortly before it expires. All worker
+threads of a session share one manager, and the lock makes sure only one of
+them refreshes while the others wait for the result.
+"""
+import threading
+import time
+
+EXPIRY_MARGIN = 60              # Refresh this many seconds before expiry
+DEFAULT_LIFETIME = 3600         # Spotify access tokens live one hour
+
+
+class TokenExpired(Exception):
+    """The token has expired and cannot be refreshed."""
+
+
+class TokenManager:
+    """Valid access token on demand, refreshed proactively when possible.
+
+    `refresh(refresh_token)` must return a new token_info dict (e.g.
+    `SpotifyOAuth.refresh_access_token`). Without it, e.g. for a pasted
+    external token, the manager only tracks expiry and raises TokenExpired.
+    """
+
+    def __init__(self, token_info, refresh=None, label="Spotify token"):
+        self.token_info = dict(token_info)
+        self.token_info.setdefault('expires_at', int(time.time()) + DEFAULT_LIFETIME)
+        self.refresh_fn = refresh
+        self.label = label
+        self._lock = threading.Lock()
+
+    @property
+    def can_refresh(self):
+        return self.refresh_fn is not None and bool(self.token_info.get('refresh_token'))
+
+    @property
+    def expires_in(self):
+        """Seconds until expiry (negative once expired)."""
+        return self.token_info['expires_at'] - time.time()
+
+    @property
+    def expired(self):
+        return self.expires_in <= 0
+
+    def access_token(self):
+        """Return a token valid for at least EXPIRY_MARGIN seconds if possible."""
+        if self.expires_in > EXPIRY_MARGIN:
+            return self.token_info['access_token']
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self.expires_in > EXPIRY_MARGIN:
+                return self.token_info['access_token']
+            if self.can_refresh:
+                self._refresh()
+            elif self.expired:
+                raise TokenExpired(f"{self.label} expired; please provide a new one.")
+            return self.token_info['access_token']
+
+    def refresh(self):
+        """Force a refresh, e.g. after the API answered 401."""
+        token_before = self.token_info['access_token']
+        with self._lock:
+            if self.token_info['access_token'] != token_before:
+                return      # Someone else already refreshed
+            if not self.can_refresh:
+                self.token_info['expires_at'] = 0
+                raise TokenExpired(f"{self.label} was rejected; please provide a new one.")
+            self._refresh()
+
+    def _refresh(self):
+        new_info = self.refresh_fn(self.token_info['refresh_token'])
+        # Spotify may omit the refresh token when it doesn't rotate it
+        new_info.setdefault('refresh_token', self.token_info['refresh_token'])
+        new_info.setdefault('expires_at', int(time.time()) + new_info.get('expires_in', DEFAULT_LIFETIME))
+        self.token_info = new_info
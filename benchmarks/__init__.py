@@ -0,0 +1 @@
+"""Offline benchmarks against a local fake Spotify API (see run.py and startup.py)."""
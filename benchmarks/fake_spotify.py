@@ -0,0 +1,338 @@
+"""Local stand-in for the parts of the Spotify Web API this project uses.
+
+Serves, under `/v1/`:
+
+* `GET me`, `GET me/playlists`, `GET search?type=playlist`
+* `GET playlists/{id}` and `GET playlists/{id}/items` (also `/tracks`)
+* `POST users/{id}/playlists` and `POST playlists/{id}/items` (also `/tracks`)
+* `GET tracks`, `GET audio-features`, `GET artists` and `GET albums` by `ids`
+* `GET albums/{id}/tracks`
+
+Playlists are synthetic: tracks are generated from `(playlist id, position)`
+on request, so a 100k-track playlist costs no memory until something is
+added to it. Every response can be delayed by `latency` (plus up to
+`jitter`), and every `throttle_every`-th request answers 429 with
+`Retry-After: retry_after`. Only the standard library is used.
+
+    server = FakeSpotify.start(playlists={"pl1k": 1000}, latency=0.02)
+    sp = spotipy.Spotify(auth="fake")
+    sp.prefix = server.prefix
+    ...
+    server.stop()
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+USER_ID = "bench-user"
+PAGE_LIMITS = {"me/playlists": 50, "search": 50}
+IDS_LIMITS = {"tracks": 50, "audio-features": 100, "artists": 50, "albums": 20}
+ALBUM_PAGE = 50
+MAX_ADD = 100
+
+
+def snapshot_of(playlist):
+    return hashlib.sha1(f"{playlist['id']}:{playlist['version']}".encode()).hexdigest()[:16]
+
+
+def track_number(track_id):
+    """The number a synthetic track id encodes (see `synthetic_track`)."""
+    return int(track_id[1:]) if track_id[1:].isdigit() else None
+
+
+def track_object(n, name):
+    """Track object for synthetic track number `n`."""
+    track_id = f"t{n:010d}"
+    return {
+        "id": track_id,
+        "uri": f"spotify:track:{track_id}",
+        "name": name,
+        "duration_ms": 120000 + n % 240000,
+        "artists": [{"id": f"a{n % 997}", "name": f"Artist {n % 997}"}],
+        "album": {"id": f"al{n % 4999}", "name": f"Album {n % 4999}",
+                  "release_date": f"{1960 + n % 64}-{1 + n % 12:02d}-{1 + n % 28:02d}"},
+        "external_ids": {"isrc": f"QZ{n % 100:02d}{n % 10 ** 8:08d}"},
+    }
+
+
+def synthetic_track(playlist_id, position):
+    """Deterministic track object for one position of a synthetic playlist."""
+    n = int(hashlib.md5(f"{playlist_id}:{position}".encode()).hexdigest()[:8], 16)
+    return track_object(n, f"Track {position} of {playlist_id}")
+
+
+def synthetic_features(track_id):
+    n = track_number(track_id) or 0
+    return {
+        "id": track_id, "tempo": 60 + n % 120 + 0.5, "key": n % 12, "mode": n % 2, "time_signature": 4,
+        "energy": n % 100 / 100, "danceability": n % 97 / 97, "valence": n % 89 / 89,
+        "acousticness": n % 83 / 83, "loudness": -(n % 30) - 0.5,
+    }
+
+
+def synthetic_artist(artist_id):
+    n = int(artist_id[1:]) if artist_id[1:].isdigit() else 0
+    genres = ["pop", "rock", "indie", "jazz", "hip hop", "electronic", "folk"]
+    return {"id": artist_id, "name": f"Artist {n}", "genres": [genres[n % 7], genres[(n // 7) % 7]][:1 + n % 2]}
+
+
+def album_size(album_id):
+    """Track count of a synthetic album (`al<n>`); some need more than one page."""
+    n = int(album_id[2:]) if album_id[2:].isdigit() else 0
+    return 8 + n % 80
+
+
+def album_tracks(album_id, limit, offset):
+    """Simplified track objects of a synthetic album."""
+    n = int(album_id[2:]) if album_id[2:].isdigit() else 0
+    tracks = []
+    for position in range(offset, min(offset + limit, album_size(album_id))):
+        track = track_object(n * 100 + position, f"Track {position + 1} of {album_id}")
+        del track["album"], track["external_ids"]
+        tracks.append(track)
+    return tracks
+
+
+class FakeSpotify:
+    """In-memory playlist state plus the HTTP server exposing it."""
+
+    def __init__(self, playlists=None, latency=0.0, jitter=0.0, throttle_every=0, retry_after=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self.playlists = {}
+        for playlist_id, size in (playlists or {}).items():
+            self.add_playlist(playlist_id, size)
+        self._server = None
+        self._thread = None
+
+    def add_playlist(self, playlist_id, size, name=None, owner=USER_ID, added=None):
+        """Register a playlist of `size` synthetic tracks (plus `added` URIs)."""
+        self.playlists[playlist_id] = {
+            "id": playlist_id,
+            "name": name or f"Playlist {playlist_id}",
+            "owner": owner,
+            "size": size,
+            "added": list(added or []),
+            "version": 0,
+        }
+
+    def add_library(self, count, size=50):
+        """Add `count` small playlists, e.g. to benchmark library loading."""
+        for i in range(count):
+            self.add_playlist(f"lib{i:05d}", size, name=f"Library playlist {i}",
+                              owner=USER_ID if i % 3 else "spotify")
+
+    # --- Server lifecycle ---
+    @classmethod
+    def start(cls, host="127.0.0.1", port=0, **kwargs):
+        fake = cls(**kwargs)
+        fake._server = ThreadingHTTPServer((host, port), _handler_for(fake))
+        fake._server.daemon_threads = True
+        fake._thread = threading.Thread(target=fake._server.serve_forever, name="fake-spotify", daemon=True)
+        fake._thread.start()
+        return fake
+
+    @property
+    def prefix(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # --- API objects ---
+    def _simple(self, pl):
+        owner = pl["owner"]
+        return {
+            "id": pl["id"],
+            "name": pl["name"],
+            "description": f"Synthetic playlist with {pl['size']} tracks",
+            "owner": {"id": owner, "display_name": "Spotify" if owner == "spotify" else owner},
+            "snapshot_id": snapshot_of(pl),
+            "tracks": {"total": pl["size"] + len(pl["added"])},
+            "images": [],
+            "public": True,
+            "collaborative": False,
+            "uri": f"spotify:playlist:{pl['id']}",
+            "external_urls": {"spotify": f"https://open.spotify.com/playlist/{pl['id']}"},
+        }
+
+    def _page(self, items, total, limit, offset, path):
+        next_offset = offset + limit
+        return {
+            "items": items,
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "next": f"{self.prefix}{path}?offset={next_offset}&limit={limit}" if next_offset < total else None,
+        }
+
+    def _album(self, album_id):
+        n = int(album_id[2:]) if album_id[2:].isdigit() else 0
+        page = self._page(album_tracks(album_id, ALBUM_PAGE, 0), album_size(album_id), ALBUM_PAGE, 0,
+                          f"albums/{album_id}/tracks")
+        return {"id": album_id, "name": f"Album {n}", "uri": f"spotify:album:{album_id}", "tracks": page}
+
+    def _items(self, pl, limit, offset):
+        total = pl["size"] + len(pl["added"])
+        items = []
+        for position in range(offset, min(offset + limit, total)):
+            if position < pl["size"]:
+                track = synthetic_track(pl["id"], position)
+            else:
+                uri = pl["added"][position - pl["size"]]
+                track = dict(synthetic_track(pl["id"], position), id=uri.rsplit(":", 1)[-1], uri=uri)
+            items.append({"added_at": "2024-01-01T00:00:00Z", "track": track})
+        return self._page(items, total, limit, offset, f"playlists/{pl['id']}/items")
+
+    def handle(self, method, path, query, body):
+        """Return `(status, payload)` for one API request."""
+        parts = path.strip("/").split("/")
+        limit = min(int(query.get("limit", 20)), 100)
+        offset = int(query.get("offset", 0))
+
+        if method == "GET" and parts == ["me"]:
+            return 200, {"id": USER_ID, "display_name": "Benchmark User", "country": "US"}
+        if method == "GET" and parts == ["me", "playlists"]:
+            playlists = list(self.playlists.values())
+            limit = min(limit, PAGE_LIMITS["me/playlists"])
+            page = [self._simple(pl) for pl in playlists[offset:offset + limit]]
+            return 200, self._page(page, len(playlists), limit, offset, "me/playlists")
+        if method == "GET" and parts == ["search"]:
+            words = query.get("q", "").lower().replace("owner:spotify", "").split()
+            matches = [pl for pl in self.playlists.values() if all(w in pl["name"].lower() for w in words)]
+            limit = min(limit, PAGE_LIMITS["search"])
+            page = [self._simple(pl) for pl in matches[offset:offset + limit]]
+            return 200, {"playlists": self._page(page, len(matches), limit, offset, "search")}
+        if method == "GET" and len(parts) == 1 and parts[0] in IDS_LIMITS:
+            ids = [i for i in query.get("ids", "").split(",") if i]
+            if len(ids) > IDS_LIMITS[parts[0]]:
+                return 400, {"error": {"status": 400, "message": f"Too many ids, max {IDS_LIMITS[parts[0]]}"}}
+            if parts[0] == "tracks":
+                tracks = [track_number(i) for i in ids]
+                return 200, {"tracks": [track_object(n, f"Track t{n:010d}") if n is not None else None for n in tracks]}
+            if parts[0] == "audio-features":
+                return 200, {"audio_features": [synthetic_features(i) for i in ids]}
+            if parts[0] == "albums":
+                return 200, {"albums": [self._album(i) for i in ids]}
+            return 200, {"artists": [synthetic_artist(i) for i in ids]}
+        if method == "GET" and len(parts) == 3 and parts[0] == "albums" and parts[2] == "tracks":
+            limit = min(limit, ALBUM_PAGE)
+            page = album_tracks(parts[1], limit, offset)
+            return 200, self._page(page, album_size(parts[1]), limit, offset, f"albums/{parts[1]}/tracks")
+        if method == "POST" and len(parts) == 3 and parts[0] == "users" and parts[2] == "playlists":
+            with self._lock:
+                playlist_id = f"new{len(self.playlists):05d}"
+                self.add_playlist(playlist_id, 0, name=body.get("name"), owner=parts[1])
+            return 201, self._simple(self.playlists[playlist_id])
+
+        if parts[0] == "playlists" and len(parts) >= 2:
+            pl = self.playlists.get(parts[1])
+            if pl is None:
+                return 404, {"error": {"status": 404, "message": "Resource not found"}}
+            if method == "GET" and len(parts) == 2:
+                full = self._simple(pl)
+                full["followers"] = {"total": 0}
+                full["tracks"] = self._items(pl, 100, 0)
+                return 200, full
+            if len(parts) == 3 and parts[2] in ("items", "tracks"):
+                if method == "GET":
+                    return 200, self._items(pl, limit, offset)
+                if method == "POST":
+                    uris = body.get("uris", []) if isinstance(body, dict) else body
+                    if len(uris) > MAX_ADD:
+                        return 400, {"error": {"status": 400, "message": f"Too many items, max {MAX_ADD}"}}
+                    with self._lock:
+                        pl["added"].extend(uris)
+                        pl["version"] += 1
+                    return 201, {"snapshot_id": snapshot_of(pl)}
+
+        return 404, {"error": {"status": 404, "message": f"No fake for {method} {path}"}}
+
+    def before_request(self):
+        """Apply latency and 429 injection; True if the request is throttled."""
+        with self._lock:
+            self.requests += 1
+            throttle = bool(self.throttle_every) and self.requests % self.throttle_every == 0
+            self.throttled += int(throttle)
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        return throttle
+
+
+def _handler_for(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"       # Keep-alive, like the real API
+        disable_nagle_algorithm = True      # Otherwise small responses wait for delayed ACKs
+
+        def _respond(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _dispatch(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            if fake.before_request():
+                self._respond(429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                              {"Retry-After": str(fake.retry_after)})
+                return
+            url = urlsplit(self.path)
+            path = url.path[len("/v1/"):] if url.path.startswith("/v1/") else url.path
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                body = json.loads(raw) if raw else {}
+                status, payload = fake.handle(method, path, query, body)
+            except (ValueError, KeyError) as e:
+                status, payload = 400, {"error": {"status": 400, "message": str(e)}}
+            self._respond(status, payload)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the fake Spotify API until interrupted.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Answer every Nth request with 429")
+    parser.add_argument("--library", type=int, default=200, help="Small playlists in the library")
+    args = parser.parse_args()
+
+    server = FakeSpotify.start(
+        port=args.port, latency=args.latency, throttle_every=args.throttle_every,
+        playlists={"pl100": 100, "pl10k": 10_000, "pl100k": 100_000},
+    )
+    server.add_library(args.library)
+    print(f"Fake Spotify API at {server.prefix} (Ctrl+C to stop)")
+    print(f"Try: SPOTIFY_API_PREFIX={server.prefix} python main.py --token fake library")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
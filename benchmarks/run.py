@@ -0,0 +1,186 @@
+"""Benchmark harness against the local fake Spotify API.
+
+    python -m benchmarks.run                 # compare against baselines.json
+    python -m benchmarks.run --quick         # skip the 100k-track scenarios
+    python -m benchmarks.run --save          # record the results as new baselines
+    python -m benchmarks.run -k fetch        # only scenarios containing "fetch"
+
+Every scenario goes through the real client (`client.RateLimitedSpotify`,
+with its own token bucket so runs don't depend on the production rate) and
+the real fetch / export / clone code, pointed at `fake_spotify.FakeSpotify`.
+Each scenario runs `--repeat` times and the median is reported. With
+baselines recorded under the same settings, throughput changes beyond
+`--tolerance` are flagged and make the run exit with status 1.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks.fake_spotify import FakeSpotify
+from client import MAX_CONCURRENT, RateLimitedSpotify, TokenBucket, _new_session
+from clone import CloneJob, run_clone
+from exporters import EXPORT_FORMATS, available_formats
+from library import fetch_user_playlists
+from tracks import fetch_track_table
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+LIBRARY_SIZE = 500
+PLAYLISTS = {"pl100": 100, "pl10k": 10_000, "pl100k": 100_000}
+THROTTLE_EVERY = 25         # Every Nth request answers 429 in the throttled scenario
+
+
+def make_client(server, rate):
+    sp = RateLimitedSpotify(
+        auth="fake-token", requests_session=_new_session(), requests_timeout=10,
+        limiter=TokenBucket(rate=rate, capacity=max(1, int(rate)), max_concurrent=MAX_CONCURRENT),
+    )
+    sp.prefix = server.prefix
+    return sp
+
+
+def scenarios(quick):
+    """`(name, unit, setup, run)`; `run(sp, state)` returns how many units it processed."""
+    sizes = [name for name in PLAYLISTS if not (quick and name == "pl100k")]
+    table_source = "pl10k" if quick else "pl100k"
+
+    def fetch(playlist_id):
+        return lambda sp, state: len(fetch_track_table(sp, playlist_id))
+
+    def export(fmt):
+        def run(sp, state):
+            EXPORT_FORMATS[fmt].write(state["table"], io.BytesIO())
+            return len(state["table"])
+        return run
+
+    def load_table(sp, state):
+        if "table" not in state:
+            state["table"] = fetch_track_table(sp, table_source)
+
+    def clone(sp, state):
+        job = CloneJob("pl10k", "Benchmark", None)
+        run_clone(job, sp, state["table10k"].uri_pages)
+        return job.added
+
+    def load_table10k(sp, state):
+        if "table10k" not in state:
+            state["table10k"] = fetch_track_table(sp, "pl10k")
+
+    yield "library_load", "playlists", None, lambda sp, state: len(fetch_user_playlists(sp)[0])
+    for name in sizes:
+        yield f"fetch_{name[2:]}", "tracks", None, fetch(name)
+    yield "fetch_10k_throttled", "tracks", None, fetch("pl10k")
+    for fmt in available_formats():
+        yield f"export_{fmt}_{table_source[2:]}", "rows", load_table, export(fmt)
+    yield "clone_10k", "tracks", load_table10k, clone
+
+
+def run_benchmarks(args):
+    # spotipy logs every injected 429 as an error before the client retries it
+    logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+    server = FakeSpotify.start(playlists=PLAYLISTS, latency=args.latency)
+    server.add_library(LIBRARY_SIZE)
+    sp = make_client(server, args.rate)
+    results = {}
+    state = {}
+    try:
+        for name, unit, setup, run in scenarios(args.quick):
+            if args.k and args.k not in name:
+                continue
+            if setup:
+                setup(sp, state)
+            server.throttle_every = THROTTLE_EVERY if name.endswith("_throttled") else 0
+            server.retry_after = 0
+            timings, requests_before = [], server.requests
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                count = run(sp, state)
+                timings.append(time.perf_counter() - started)
+            seconds = statistics.median(timings)
+            results[name] = {
+                "unit": unit,
+                "count": count,
+                "seconds": round(seconds, 4),
+                "per_second": round(count / seconds, 1) if seconds else None,
+                "requests": (server.requests - requests_before) // args.repeat,
+            }
+            print(f"{name:<24} {seconds:8.3f}s  {results[name]['per_second']:>12,.0f} {unit}/s  "
+                  f"{results[name]['requests']:>5} requests", file=sys.stderr)
+    finally:
+        server.stop()
+    return results
+
+
+def settings(args):
+    return {"latency": args.latency, "rate": args.rate}
+
+
+def compare(results, baselines, tolerance):
+    """Print throughput against the baselines; return the regressed scenario names."""
+    regressions = []
+    print(f"\n{'scenario':<24} {'baseline/s':>12} {'now/s':>12} {'change':>8}")
+    for name, result in results.items():
+        base = baselines.get(name)
+        if not base or not base.get("per_second") or not result["per_second"]:
+            print(f"{name:<24} {'-':>12} {result['per_second'] or 0:>12,.0f} {'new':>8}")
+            continue
+        change = result["per_second"] / base["per_second"] - 1
+        flag = ""
+        if change < -tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change > tolerance:
+            flag = "  faster"
+        print(f"{name:<24} {base['per_second']:>12,.0f} {result['per_second']:>12,.0f} {change:>+8.0%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark fetch, export and clone against a fake Spotify API.")
+    parser.add_argument("--quick", action="store_true", help="Skip the 100k-track scenarios")
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake API latency per request (s)")
+    parser.add_argument("--rate", type=float, default=1000, help="Client token bucket rate (requests/s)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario; the median is reported")
+    parser.add_argument("-k", metavar="TEXT", help="Only run scenarios whose name contains TEXT")
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed throughput drop before failing")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON on stdout")
+    parser.add_argument("--baselines", default=BASELINES, help="Baselines file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+    stored = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, encoding="utf-8") as fh:
+            stored = json.load(fh)
+
+    if args.save:
+        stored.setdefault("results", {}).update(results)
+        stored["settings"] = settings(args)
+        stored["machine"] = f"{platform.system()} {platform.machine()}, Python {platform.python_version()}"
+        with open(args.baselines, "w", encoding="utf-8") as fh:
+            json.dump(stored, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Baselines saved to {args.baselines}", file=sys.stderr)
+        return 0
+
+    if not stored:
+        print("No baselines yet; run with --save to record them.", file=sys.stderr)
+        return 0
+    if stored.get("settings") != settings(args):
+        print(f"Note: baselines were recorded with {stored.get('settings')}, not {settings(args)}.",
+              file=sys.stderr)
+    regressions = compare(results, stored.get("results", {}), args.tolerance)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Cold start and per-run overhead of the Streamlit app against the fake API.
+
+    python -m benchmarks.startup             # check against the budgets below
+    python -m benchmarks.startup --json      # also print the measurements
+
+Everything runs in a fresh interpreter pointed at `fake_spotify.FakeSpotify`
+with a logged-in session:
+
+* `import`: the app's own imports (Streamlit itself excluded; the server has
+  it loaded before any script runs),
+* `first_run`: the first script run of a session,
+* `warm_overhead`: the `startup` and `auth` render laps of a warm rerun,
+  i.e. time spent before the run does any real work,
+* `warm_run`: a whole warm rerun.
+
+Run times are the `metrics.RenderClock` laps the app stores in session
+state, so they measure the script, not AppTest's polling. The medians of
+`--repeat` warm reruns are reported; a measurement over its budget makes the
+run exit with status 1.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.fake_spotify import FakeSpotify
+from metrics import RERUN_OVERHEAD_BUDGET
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+LIBRARY_SIZE = 200
+BUDGETS = {                 # Seconds
+    "import": 0.6,          # Mostly spotipy, which imports redis
+    "first_run": 1.5,       # Loads the library, and pandas with the first table (pyarrow imports it)
+    "warm_overhead": RERUN_OVERHEAD_BUDGET,
+    "warm_run": 0.25,
+}
+SETTLE_RUNS = 50            # Reruns allowed for background jobs of the first run to finish
+
+
+def app_imports(path=APP):
+    """Top-level modules imported by the app, except Streamlit."""
+    with open(path, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return [m for m in dict.fromkeys(modules) if m.split(".")[0] != "streamlit"]
+
+
+def measure(repeat):
+    """Child process body: time imports and script runs, return the measurements."""
+    import importlib
+
+    from streamlit.testing.v1 import AppTest
+
+    from metrics import run_overhead
+
+    started = time.perf_counter()
+    for module in app_imports():
+        importlib.import_module(module)
+    imported = time.perf_counter() - started
+
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.secrets["SPOTIPY_CLIENT_ID"] = "bench"
+    at.secrets["SPOTIPY_CLIENT_SECRET"] = "bench"
+    at.session_state["token_info"] = {
+        "access_token": "fake-token", "refresh_token": "fake", "expires_at": time.time() + 3600,
+        "expires_in": 3600, "scope": "", "token_type": "Bearer",
+    }
+
+    def laps():
+        return at.session_state["render_laps"]
+
+    at.run()
+    first_laps = {section: round(seconds, 4) for section, seconds in laps()}
+    for _ in range(SETTLE_RUNS):
+        if not any(button.label == "Cancel" for button in at.button):
+            break
+        time.sleep(0.1)
+        at.run()
+
+    overheads, totals = [], []
+    for _ in range(repeat):
+        at.run()
+        overheads.append(run_overhead(laps()))
+        totals.append(sum(seconds for _, seconds in laps()))
+    return {
+        "import": round(imported, 4),
+        "first_run": round(sum(first_laps.values()), 4),
+        "warm_overhead": round(statistics.median(overheads), 4),
+        "warm_run": round(statistics.median(totals), 4),
+        "first_run_laps": first_laps,
+        "errors": [e.value for e in at.exception] + [e.value for e in at.error],
+    }
+
+
+def run_child(prefix, repeat):
+    env = dict(os.environ, SPOTIFY_API_PREFIX=prefix)
+    root = os.path.dirname(APP)
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child", "--repeat", str(repeat)],
+        cwd=root, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app cold start and per-run overhead.")
+    parser.add_argument("--repeat", type=int, default=10, help="Warm reruns; the median is reported")
+    parser.add_argument("--json", action="store_true", help="Print the measurements as JSON on stdout")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(args.repeat)))
+        return 0
+
+    server = FakeSpotify.start(playlists={"pl100": 100}, latency=0)
+    server.add_library(LIBRARY_SIZE)
+    try:
+        results = run_child(server.prefix, args.repeat)
+    finally:
+        server.stop()
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+    over = []
+    print(f"\n{'measurement':<16} {'ms':>8} {'budget':>8}", file=sys.stderr)
+    for name, budget in BUDGETS.items():
+        flag = ""
+        if results[name] > budget:
+            flag = "  OVER BUDGET"
+            over.append(name)
+        print(f"{name:<16} {results[name] * 1000:>8.1f} {budget * 1000:>8.0f}{flag}", file=sys.stderr)
+    if "first_run" in over:
+        print("First run: " + " · ".join(f"{section} {seconds * 1000:.0f} ms"
+                                         for section, seconds in results["first_run_laps"].items()), file=sys.stderr)
+    for error in results["errors"]:
+        print(f"App error: {error}", file=sys.stderr)
+    return 1 if over or results["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
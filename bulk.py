@@ -0,0 +1,189 @@
+"""Export many playlists into one ZIP archive.
+
+Playlists are fetched by a small worker pool, and all of their requests go
+through the shared rate limiter in `client`. Each finished playlist is written
+to the archive right away and then dropped, so at most `workers` track tables
+are in memory at once. Per-playlist failures are recorded in the archive's
+manifest and don't stop the others.
+
+Each run builds a new archive next to `path` and moves it into place only
+once every playlist has been handled, so an interrupted, crashed or killed
+run leaves the previous archive intact. An interrupted run (e.g. a cancelled
+job) keeps what it wrote as `<path>.interrupted`. Running again on the same
+path resumes: playlists that archive or the previous one record as finished,
+at the same snapshot, are copied over instead of being fetched again.
+Playlists not in the new run are dropped from the archive.
+"""
+import json
+import os
+import re
+import shutil
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+from exporters import EXPORT_FORMATS
+from metrics import METRICS
+from tracks import fetch_track_table
+
+DEFAULT_WORKERS = 3
+MANIFEST = "manifest.json"
+_OLD_MANIFEST = re.compile(r"^manifest-(\d+)\.json$")    # Appended by earlier versions on resume
+
+
+@dataclass
+class BulkEntry:
+    id: str
+    name: str
+    snapshot_id: Optional[str] = None
+    file: Optional[str] = None
+    tracks: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class BulkResult:
+    path: str
+    entries: List[BulkEntry] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def failed(self):
+        return [e for e in self.entries if e.error]
+
+
+def archive_name(playlist, extension):
+    """Stable, filesystem-safe file name for a playlist inside the archive."""
+    safe = re.sub(r'[^\w\- ]+', '_', playlist.get('name') or 'playlist').strip()[:80]
+    return f"{safe or 'playlist'}-{playlist['id']}.{extension}"
+
+
+def finished_entries(path):
+    """`{file: entry dict}` the manifest of the archive at `path` records as written, or {}.
+
+    A missing or unreadable archive (e.g. from a killed run of an older
+    version) has nothing to resume from.
+    """
+    try:
+        with zipfile.ZipFile(path) as zf:
+            names = set(zf.namelist())
+            manifests = sorted(
+                (int(m.group(1)), name) for name in names if (m := _OLD_MANIFEST.match(name))
+            )
+            manifest = manifests[-1][1] if manifests else MANIFEST
+            if manifest not in names:
+                return {}
+            entries = json.loads(zf.read(manifest))
+    except (OSError, zipfile.BadZipFile, ValueError):
+        return {}
+    return {
+        e['file']: e for e in entries
+        if isinstance(e, dict) and e.get('file') in names and not e.get('error')
+    }
+
+
+def export_playlists(sp, playlists, path, fmt="csv", workers=DEFAULT_WORKERS, on_progress=None,
+                     load_table=None, enricher=None):
+    """Write every playlist in `playlists` into the ZIP at `path`.
+
+    `playlists` are playlist objects as returned by `current_user_playlists`.
+    `load_table(playlist)` returns its TrackTable (default: fetch it; pass
+    a TrackStore-backed loader to skip unchanged playlists). With an
+    `enrich.Enricher`, enrichable formats get its extra columns; its cache
+    means artists shared by many playlists are looked up once.
+    `on_progress(done, total, entry)` is called from the calling thread after
+    each playlist. Returns a BulkResult; the manifest inside the archive
+    lists every playlist with its file name (set once the file is complete)
+    or error.
+    """
+    export_format = EXPORT_FORMATS[fmt]
+    load_table = load_table or (lambda pl: fetch_track_table(sp, pl['id']))
+    if not export_format.enrichable:
+        enricher = None
+
+    def load(pl):
+        # Runs on a worker, so enrichment lookups overlap like fetches do
+        table = load_table(pl)
+        return table, enricher.columns(table) if enricher else None
+    started = time.perf_counter()
+    result = BulkResult(path)
+
+    interrupted = f"{path}.interrupted"
+    previous_entries = {}
+    for source in (path, interrupted):  # An interrupted later run is newer
+        if os.path.exists(source):
+            previous_entries.update((file, (source, e)) for file, e in finished_entries(source).items())
+    reuse, todo = [], []
+    for pl in playlists:
+        entry = BulkEntry(pl['id'], pl.get('name') or "", pl.get('snapshot_id'))
+        result.entries.append(entry)
+        file = archive_name(pl, export_format.extension)
+        source, previous = previous_entries.get(file, (None, None))
+        if previous is not None and previous.get('snapshot_id') == entry.snapshot_id:
+            entry.tracks = previous.get('tracks') or 0
+            reuse.append((entry, file, source))
+        else:
+            todo.append((entry, pl))
+
+    partial = f"{path}.partial"
+    done = 0
+    completed = False
+    with ExitStack() as sources, zipfile.ZipFile(partial, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        try:
+            archives = {}
+            for entry, file, source in reuse:
+                if source not in archives:
+                    archives[source] = sources.enter_context(zipfile.ZipFile(source))
+                with archives[source].open(file) as src, zf.open(file, 'w') as dst:
+                    shutil.copyfileobj(src, dst)
+                entry.file = file
+                done += 1
+                if on_progress:
+                    on_progress(done, len(result.entries), entry)
+
+            queue = iter(todo)
+            pending = {}
+            while True:
+                while len(pending) < max(1, workers):
+                    entry, pl = next(queue, (None, None))
+                    if entry is None:
+                        break
+                    pending[pool.submit(load, pl)] = (entry, pl)
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    entry, pl = pending.pop(future)
+                    file = archive_name(pl, export_format.extension)
+                    try:
+                        table, extra = future.result()
+                        with METRICS.timer("export", f"bulk:{fmt}") as timing:
+                            with zf.open(file, 'w') as fh:
+                                export_format.write(table, fh, extra=extra)
+                            timing["bytes"] = zf.getinfo(file).compress_size
+                        # Only now is the file complete; the manifest trusts entries with a file
+                        entry.file = file
+                        entry.tracks = len(table)
+                    except Exception as e:
+                        entry.error = str(e)
+                    done += 1
+                    if on_progress:
+                        on_progress(done, len(result.entries), entry)
+            completed = True
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            result.elapsed = time.perf_counter() - started
+            # Written last and on interruption too, so the archive is self-describing
+            zf.writestr(MANIFEST, json.dumps([asdict(e) for e in result.entries], ensure_ascii=False, indent=2))
+            zf.close()
+            sources.close()
+            # Only a finished run replaces the previous archive; an interrupted one is kept to resume from
+            os.replace(partial, path if completed else interrupted)
+            if completed and os.path.exists(interrupted):
+                os.remove(interrupted)
+    return result
@@ -0,0 +1,289 @@
+"""Small TTL + LRU caches used to avoid re-fetching Spotify data on reruns.
+
+`TTLCache` lives in memory, `SqliteCache` persists pickled values on disk,
+`RedisCache` keeps them in a Redis-compatible server, and `TieredCache` puts
+a memory cache in front of a persistent one. They share one interface
+(`get`, `set`, `delete`, `clear`) so callers don't care which one they hold.
+Keys are tuples of plain values. Persistent caches skip values that cannot be
+pickled and treat entries that can no longer be unpickled (e.g. written by
+another version) as misses.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import METRICS
+
+_MISSING = object()
+# Raised by pickle.dumps for values it can't handle (locks, local functions, ...)
+PICKLE_ERRORS = (pickle.PicklingError, TypeError, AttributeError)
+# Raised by pickle.loads for damaged blobs or classes that moved or changed
+UNPICKLE_ERRORS = (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError)
+
+
+def row_weight(value):
+    """Rows held by a cached value, for `TTLCache(weigh=...)`: tracks of a table, items of a list or page."""
+    if isinstance(value, dict):
+        return max(1, len(value.get('items', ())))
+    return max(1, len(value))
+
+
+def _dumps(value):
+    try:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except PICKLE_ERRORS:
+        return None
+
+
+def _loads(blob):
+    try:
+        return pickle.loads(blob)
+    except UNPICKLE_ERRORS:
+        return _MISSING
+
+
+class TTLCache:
+    """Thread-safe in-memory cache with per-entry expiry and LRU eviction.
+
+    `maxsize` bounds the number of entries, or with `weigh(value)` their
+    total weight (e.g. rows); a value heavier than that is not stored.
+    """
+
+    def __init__(self, maxsize=128, ttl=600, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigh = weigh
+        self.weight = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        value, expires, weight = self._data.pop(key)
+        self.weight -= weight
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires, _ = entry
+            if expires < time.time():
+                self._pop(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        weight = self.weigh(value) if self.weigh else 1
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            if weight > self.maxsize:
+                return
+            self._data[key] = (value, expires, weight)
+            self.weight += weight
+            while self.weight > self.maxsize:
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SqliteCache:
+    """On-disk cache backed by a single SQLite table.
+
+    Values are pickled; see the module docstring for values that aren't.
+    Entries past their expiry are ignored and purged on
+    write; when the table grows beyond `maxsize` rows the least recently read
+    entries are dropped.
+    """
+
+    def __init__(self, path, maxsize=2000, ttl=24 * 3600):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB, expires REAL, accessed REAL)"
+            )
+
+    @staticmethod
+    def _key(key):
+        return repr(key)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM cache WHERE key = ?", (self._key(key),)
+            ).fetchone()
+            if row is None:
+                return default
+            if row[1] < now:
+                with self._conn:
+                    self._conn.execute("DELETE FROM cache WHERE key = ?", (self._key(key),))
+                return default
+            value = _loads(row[0])
+            with self._conn:
+                if value is _MISSING:
+                    self._conn.execute("DELETE FROM cache WHERE key = ?", (self._key(key),))
+                    return default
+                self._conn.execute(
+                    "UPDATE cache SET accessed = ? WHERE key = ?", (now, self._key(key))
+                )
+        return value
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        blob = _dumps(value)
+        if blob is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (self._key(key), blob, expires, now),
+            )
+            self._conn.execute("DELETE FROM cache WHERE expires < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (self._key(key),))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class RedisCache:
+    """Cache in a Redis-compatible server, shared by every process using it.
+
+    Values are pickled and expire server-side. A sorted set of access times
+    keeps at most `maxsize` entries under `prefix`, dropping the least
+    recently read first. Needs the optional `redis` package.
+    """
+
+    def __init__(self, url, maxsize=2000, ttl=24 * 3600, prefix="spotify-tools"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("A redis:// cache needs the redis package (pip install redis)") from e
+        self.url = url
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.prefix = prefix
+        self._index = f"{prefix}:index"
+        self._redis = redis.Redis.from_url(url)
+
+    def _key(self, key):
+        return f"{self.prefix}:{key!r}"
+
+    def get(self, key, default=None):
+        name = self._key(key)
+        blob = self._redis.get(name)
+        if blob is None:
+            self._redis.zrem(self._index, name)
+            return default
+        value = _loads(blob)
+        if value is _MISSING:
+            self.delete(key)
+            return default
+        self._redis.zadd(self._index, {name: time.time()})
+        return value
+
+    def set(self, key, value, ttl=None):
+        name = self._key(key)
+        blob = _dumps(value)
+        if blob is None:
+            return
+        pipe = self._redis.pipeline()
+        pipe.set(name, blob, ex=max(1, int(self.ttl if ttl is None else ttl)))
+        pipe.zadd(self._index, {name: time.time()})
+        pipe.execute()
+        excess = self._redis.zcard(self._index) - self.maxsize
+        if excess > 0:
+            oldest = self._redis.zrange(self._index, 0, excess - 1)
+            if oldest:
+                self._redis.delete(*oldest)
+                self._redis.zrem(self._index, *oldest)
+
+    def delete(self, key):
+        name = self._key(key)
+        self._redis.delete(name)
+        self._redis.zrem(self._index, name)
+
+    def clear(self):
+        names = self._redis.zrange(self._index, 0, -1)
+        if names:
+            self._redis.delete(*names)
+        self._redis.delete(self._index)
+
+    def __len__(self):
+        return self._redis.zcard(self._index)
+
+
+class TieredCache:
+    """Memory cache in front of an optional persistent one.
+
+    Lookups are counted in `METRICS` per key namespace (the first element
+    of the key) as memory hits, disk hits or misses.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key, default=None):
+        namespace = key[0] if isinstance(key, tuple) and key else "cache"
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            METRICS.cache(namespace, "memory")
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key, _MISSING)
+            if value is not _MISSING:
+                METRICS.cache(namespace, "disk")
+                self.memory.set(key, value)
+                return value
+        METRICS.cache(namespace, "miss")
+        return default
+
+    def set(self, key, value, ttl=None):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
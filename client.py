@@ -0,0 +1,219 @@
+"""Shared Spotify client factory.
+
+Every Spotify call goes through a `RateLimitedSpotify` built by `get_client`:
+
+* one pooled `requests.Session` per token, reused across reruns,
+* a process-wide token bucket plus a cap on concurrent requests,
+* 429 handling that honors `Retry-After` (and pauses every worker, not just
+  the one that got throttled) and jittered exponential backoff for 5xx and
+  connection errors,
+* per-endpoint latency, response size and retry counts in `metrics.METRICS`,
+* optional `auth.TokenManager`, asked for a fresh token before each request
+  and refreshed once when Spotify answers 401.
+
+Setting `SPOTIFY_API_PREFIX` (e.g. to the `benchmarks/fake_spotify.py`
+server) points every client at another Web API base URL.
+"""
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+import spotipy
+from spotipy.exceptions import SpotifyException
+
+from metrics import METRICS
+
+RATE_PER_SECOND = 10        # Sustained request rate for the whole process
+BURST = 20                  # Bucket capacity
+MAX_CONCURRENT = 8          # Requests in flight at once, process-wide
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5          # Seconds, doubled per attempt
+BACKOFF_CAP = 30.0
+POOL_SIZE = 16              # Keep-alive connections per session
+MAX_CLIENTS = 64            # Tokens kept warm before the oldest is closed
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+API_PREFIX = os.environ.get("SPOTIFY_API_PREFIX")
+
+# Scopes: playlist access (read/write), user library, follow status, etc.
+SCOPE = (
+    "playlist-read-private playlist-read-collaborative playlist-modify-public "
+    "playlist-modify-private user-library-read user-read-private user-follow-read"
+)
+
+
+class TokenBucket:
+    """Blocking token bucket shared by all clients in the process."""
+
+    def __init__(self, rate=RATE_PER_SECOND, capacity=BURST, max_concurrent=MAX_CONCURRENT):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def acquire(self):
+        """Wait for a token and a concurrency slot; call `release()` after."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now < self._paused_until:
+                    wait_for = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                else:
+                    wait_for = (1 - self._tokens) / self.rate
+            time.sleep(wait_for)
+        self._slots.acquire()
+
+    def release(self):
+        self._slots.release()
+
+    def pause(self, seconds):
+        """Hold every caller back for `seconds` (used for Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+LIMITER = TokenBucket()
+
+_ID_PARENTS = {"playlists", "users", "albums", "artists", "tracks", "shows", "episodes"}
+_PREFIX_RE = re.compile(r"^https?://[^/]+/v1/")
+
+
+def endpoint_name(method, url):
+    """Collapse ids out of a URL: 'GET playlists/{id}/tracks'."""
+    path = _PREFIX_RE.sub("", url).split("?")[0].strip("/")
+    parts = path.split("/")
+    for i in range(1, len(parts)):
+        if parts[i - 1] in _ID_PARENTS and parts[i]:
+            parts[i] = "{id}"
+    return f"{method} {'/'.join(parts)}"
+
+
+def retry_delay(error, attempt):
+    """Seconds to wait before retry number `attempt` (0-based)."""
+    retry_after = None
+    headers = getattr(error, "headers", None)
+    if headers:
+        try:
+            retry_after = float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            retry_after = None
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 1)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class RateLimitedSpotify(spotipy.Spotify):
+    """spotipy client that schedules, retries and times every request."""
+
+    def __init__(self, *args, limiter=LIMITER, stats=METRICS, max_retries=MAX_RETRIES,
+                 token_manager=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+        self.stats = stats
+        self.max_retries = max_retries
+        self.token_manager = token_manager
+
+    def _auth_headers(self):
+        if self.token_manager is not None:
+            return {"Authorization": f"Bearer {self.token_manager.access_token()}"}
+        return super()._auth_headers()
+
+    def _internal_call(self, method, url, payload, params):
+        endpoint = endpoint_name(method, url)
+        attempt = 0
+        reauthed = False
+        while True:
+            reauth = False
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                # spotipy mutates params (content_type), so hand it a copy
+                _response_size.value = 0
+                result = super()._internal_call(method, url, payload, dict(params))
+            except SpotifyException as e:
+                elapsed = time.perf_counter() - start
+                if e.http_status == 401 and self.token_manager is not None and not reauthed:
+                    # Revoked or expired early: refresh once, then retry
+                    self.stats.record("api", endpoint, elapsed, failed=True)
+                    reauth = True
+                elif e.http_status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    self.stats.record("api", endpoint, elapsed, failed=True)
+                    raise
+                else:
+                    delay = retry_delay(e, attempt)
+                    if e.http_status == 429:
+                        self.limiter.pause(delay)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                elapsed = time.perf_counter() - start
+                if attempt >= self.max_retries:
+                    self.stats.record("api", endpoint, elapsed, failed=True)
+                    raise
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            else:
+                self.stats.record("api", endpoint, time.perf_counter() - start, bytes=_response_size.value)
+                return result
+            finally:
+                self.limiter.release()
+
+            if reauth:
+                # Raises auth.TokenExpired when the token can't be refreshed
+                self.token_manager.refresh()
+                reauthed = True
+                continue
+            self.stats.retry("api", endpoint)
+            attempt += 1
+            time.sleep(delay)
+
+
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+_response_size = threading.local()     # Body size of this thread's last response
+
+
+def _record_size(response, *args, **kwargs):
+    _response_size.value = len(response.content)
+
+
+def _new_session():
+    session = requests.Session()
+    # Retries are handled in RateLimitedSpotify, not by urllib3
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(_record_size)
+    return session
+
+
+def get_client(auth):
+    """Return the shared client for `auth`, creating it on first use.
+
+    `auth` is either an access token string or an `auth.TokenManager`.
+    """
+    with _clients_lock:
+        client = _clients.get(auth)
+        if client is not None:
+            _clients.move_to_end(auth)
+            return client
+        if isinstance(auth, str):
+            client = RateLimitedSpotify(auth=auth, requests_session=_new_session(), requests_timeout=10)
+        else:
+            client = RateLimitedSpotify(token_manager=auth, requests_session=_new_session(), requests_timeout=10)
+        if API_PREFIX:
+            client.prefix = API_PREFIX
+        _clients[auth] = client
+        while len(_clients) > MAX_CLIENTS:
+            _, old = _clients.popitem(last=False)
+            old._session.close()
+        return client
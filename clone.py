@@ -0,0 +1,148 @@
+"""Resumable "Create Copy of Playlist" jobs.
+
+A `CloneJob` holds everything needed to continue a copy: the target playlist
+and how far into the source it has been written. `run_clone` writes one add
+request per source page of URIs. Writes stay sequential so track order is
+preserved, while the page source keeps fetching the next pages in the
+background. The job is only advanced after Spotify acknowledges a chunk, so a
+failed or interrupted run can be resumed by calling `run_clone` again with the
+same job. If the source playlist changed in the meantime, offsets no longer
+line up, so the copy is emptied and started over.
+"""
+import datetime
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from fetching import PAGE_SIZE
+from tracks import is_addable
+
+ADD_CHUNK = 100     # Maximum URIs per playlist_add_items request
+
+
+@dataclass
+class CloneJob:
+    source_id: str
+    source_name: str
+    source_snapshot: Optional[str] = None
+    target_id: Optional[str] = None
+    target_url: Optional[str] = None
+    source_offset: int = 0      # Source items acknowledged so far
+    total: int = 0              # Source items, known after the first page
+    added: int = 0              # URIs written to the target
+    skipped: int = 0            # Empty or local items that cannot be added
+    status: str = "pending"     # pending, running, paused, failed, done
+    error: Optional[str] = None
+    elapsed: float = 0.0        # Seconds spent writing, across resumes
+    target_name: Optional[str] = None   # Default: "Copy of <source_name>"
+    description: Optional[str] = None
+    restarted: bool = False     # The source changed between runs and the copy was started over
+
+    @property
+    def progress(self):
+        return min(self.source_offset / self.total, 1.0) if self.total else 0.0
+
+    @property
+    def throughput(self):
+        """Tracks added per second of write time."""
+        return self.added / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def resumable(self):
+        return self.status in ("paused", "failed") and self.target_id is not None
+
+
+def playable_uris(items):
+    """URIs from a page of playlist items that Spotify will accept back."""
+    uris = []
+    for item in items:
+        track = item.get('track') if item else None
+        uri = track.get('uri') if track else None
+        if is_addable(uri):
+            uris.append(uri)
+    return uris
+
+
+def uri_pages(pages):
+    """Adapt raw `(offset, items, total)` pages to `run_clone` pages."""
+    for offset, items, total in pages:
+        yield offset, playable_uris(items), len(items), total
+
+
+def list_pages(uris, size=PAGE_SIZE):
+    """`run_clone` pages over a plain URI list, e.g. one restored from a share code."""
+    def pages_from(start=0):
+        total = len(uris)
+        for offset in range(start, total, size):
+            chunk = uris[offset:offset + size]
+            yield offset, [u for u in chunk if is_addable(u)], len(chunk), total
+    return pages_from
+
+
+def create_target(sp, job):
+    """Create the empty copy in the current user's library."""
+    user_id = sp.current_user()['id']
+    today = datetime.date.today().strftime('%Y-%m-%d')
+    new_pl = sp.user_playlist_create(
+        user_id,
+        job.target_name or f"Copy of {job.source_name}",
+        public=False,
+        description=job.description or f"Static copy of {job.source_name} created on {today}",
+    )
+    job.target_id = new_pl['id']
+    job.target_url = new_pl['external_urls']['spotify']
+
+
+def restart_if_changed(job, sp, snapshot_id):
+    """Empty a partly written copy whose source is no longer at `job.source_snapshot`."""
+    if not snapshot_id or not job.source_snapshot or snapshot_id == job.source_snapshot:
+        return
+    if job.target_id is not None and job.source_offset:
+        sp.playlist_replace_items(job.target_id, [])
+        job.source_offset = job.added = job.skipped = 0
+        job.restarted = True
+    job.source_snapshot = snapshot_id
+
+
+def run_clone(job, sp, pages_from, on_progress=None, snapshot_id=None):
+    """Create (if needed) and fill the target playlist for `job`.
+
+    `pages_from(start)` must yield `(offset, uris, item_count, total)`
+    source pages beginning at offset `start`, e.g. `TrackTable.uri_pages` or
+    `uri_pages(iter_track_pages(...))`; `sp` is the client used for writing.
+    `snapshot_id` is the source's current snapshot, if known; when resuming
+    a job started at another snapshot the copy starts over. `on_progress(job)`
+    is called after every acknowledged chunk. Exceptions are recorded on the
+    job and re-raised.
+    """
+    job.status = "running"
+    job.error = None
+    try:
+        if job.target_id is None:
+            create_target(sp, job)
+        else:
+            restart_if_changed(job, sp, snapshot_id)
+
+        for offset, uris, item_count, total in pages_from(job.source_offset):
+            job.total = total
+            started = time.perf_counter()
+            for i in range(0, len(uris), ADD_CHUNK):
+                sp.playlist_add_items(job.target_id, uris[i:i + ADD_CHUNK])
+            job.elapsed += time.perf_counter() - started
+            job.added += len(uris)
+            job.skipped += item_count - len(uris)
+            job.source_offset = offset + item_count
+            if on_progress:
+                on_progress(job)
+
+        job.source_offset = max(job.source_offset, job.total)
+        job.status = "done"
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        raise
+    except BaseException:
+        # Interrupted from outside (e.g. a Streamlit rerun); progress is kept.
+        job.status = "paused"
+        raise
+    return job
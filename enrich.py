@@ -0,0 +1,238 @@
+"""Optional export enrichment: all artists, ISRC, release date, genres and audio features.
+
+The track table only keeps what the track list needs, so enrichment looks the
+rest up by id: track details 50 ids per request, audio features 100 per
+request and artists 50 per request, each the endpoint's maximum. Every result
+is kept in an `EnrichmentCache` (SQLite, optionally on disk), so tracks and
+artists that recur across playlists are fetched once. An `Enricher` shared by
+several exports (e.g. a bulk export) also never requests the same id twice
+at the same time.
+
+Spotify no longer serves audio features to every app; when the endpoint is
+refused, those columns stay empty and `Enricher.warnings` says why.
+"""
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from spotipy.exceptions import SpotifyException
+
+from metrics import METRICS
+from tracks import is_addable
+
+TRACKS_BATCH = 50
+FEATURES_BATCH = 100
+ARTISTS_BATCH = 50
+DEFAULT_WORKERS = 4
+ARTIST_TTL = 30 * 24 * 3600     # Genres change; track data and features don't
+
+# Extra export columns and their value types, in output order
+ENRICH_COLUMNS = {
+    "Artists": str,
+    "ISRC": str,
+    "Release Date": str,
+    "Genres": str,
+    "Tempo": float,
+    "Key": int,
+    "Mode": int,
+    "Time Signature": int,
+    "Energy": float,
+    "Danceability": float,
+    "Valence": float,
+    "Acousticness": float,
+    "Loudness": float,
+}
+FEATURE_KEYS = {
+    "Tempo": "tempo", "Key": "key", "Mode": "mode", "Time Signature": "time_signature",
+    "Energy": "energy", "Danceability": "danceability", "Valence": "valence",
+    "Acousticness": "acousticness", "Loudness": "loudness",
+}
+SEPARATOR = "; "
+
+
+def track_id(uri):
+    """Spotify track id from a track URI, or None for local files and episodes."""
+    if is_addable(uri) and uri.startswith("spotify:track:"):
+        return uri.rsplit(":", 1)[-1]
+    return None
+
+
+class EnrichmentCache:
+    """Looked-up track, audio feature and artist data by id, in SQLite.
+
+    `None` results (e.g. no audio features for a track) are stored too, so
+    they are not requested again.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS enrichment ("
+                "kind TEXT, id TEXT, data TEXT, fetched_at REAL, PRIMARY KEY (kind, id))"
+            )
+
+    def get_many(self, kind, ids, ttl=None):
+        """`{id: data}` for the ids that are cached (and younger than `ttl`)."""
+        found = {}
+        ids = list(ids)
+        oldest = time.time() - ttl if ttl else 0
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, data FROM enrichment WHERE kind = ? AND fetched_at >= ? "
+                    f"AND id IN ({','.join('?' * len(chunk))})",
+                    (kind, oldest, *chunk),
+                ).fetchall()
+                found.update((row_id, json.loads(data)) for row_id, data in rows)
+        return found
+
+    def put_many(self, kind, values):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO enrichment (kind, id, data, fetched_at) VALUES (?, ?, ?, ?)",
+                ((kind, row_id, json.dumps(data), now) for row_id, data in values.items()),
+            )
+
+
+class Enricher:
+    """Adds ENRICH_COLUMNS to track tables through batched, cached lookups."""
+
+    def __init__(self, sp, cache=None, workers=DEFAULT_WORKERS):
+        self.sp = sp
+        self.cache = cache if cache is not None else EnrichmentCache()
+        self.workers = workers
+        self.features_available = True
+        self.warnings = []
+        self._lock = threading.Lock()
+        # kind -> {id: Event set once the lookup that claimed the id has ended}
+        self._inflight = {kind: {} for kind in ("track", "features", "artist")}
+
+    # --- Batched fetchers: ids in, {id: data or None} out ---
+    def _fetch_tracks(self, ids):
+        found = {}
+        for track in self.sp.tracks(ids)['tracks']:
+            if track:
+                album = track.get('album') or {}
+                found[track['id']] = {
+                    'artists': [(a.get('id'), a.get('name')) for a in track.get('artists') or []],
+                    'isrc': (track.get('external_ids') or {}).get('isrc'),
+                    'release_date': album.get('release_date'),
+                }
+        return found
+
+    def _fetch_features(self, ids):
+        if not self.features_available:
+            return {}
+        try:
+            features = self.sp.audio_features(ids) or []
+        except SpotifyException as e:
+            if e.http_status not in (403, 404):
+                raise
+            # Not available to this app; don't cache, just stop asking
+            self.features_available = False
+            self.warnings.append(f"Audio features unavailable ({e.http_status}); those columns are empty.")
+            return {}
+        return {
+            f['id']: {key: f.get(key) for key in FEATURE_KEYS.values()}
+            for f in features if f
+        }
+
+    def _fetch_artists(self, ids):
+        return {
+            artist['id']: {'genres': artist.get('genres') or []}
+            for artist in self.sp.artists(ids)['artists'] if artist
+        }
+
+    def _fetch_batches(self, kind, ids, batch_size, fetch, on_progress=None):
+        """Fetch `ids` in full batches on the worker pool and cache what comes back."""
+        batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+        fetched = {}
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(batches))))
+        try:
+            for batch, result in zip(batches, pool.map(fetch, batches)):
+                # Ids Spotify returned nothing for are remembered as None
+                fetched.update({i: result.get(i) for i in batch})
+                if on_progress:
+                    on_progress(kind, len(fetched), len(ids))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            if kind != "features" or self.features_available:
+                self.cache.put_many(kind, fetched)
+        return fetched
+
+    def _lookup(self, kind, ids, batch_size, fetch, ttl=None, on_progress=None):
+        """Cached data for `ids`, fetching the missing ones in full batches.
+
+        Ids another lookup is already fetching are not requested again: this
+        one waits for them, and only for them, after fetching its own.
+        `on_progress(kind, fetched, missing)` is called after each batch; if it
+        raises (e.g. a cancelled job), queued batches are dropped and what was
+        fetched so far is still cached.
+        """
+        ids = list(dict.fromkeys(i for i in ids if i))
+        found = {}
+        pending = ids
+        while pending:
+            # Only the cache check and the claim happen under the lock; fetches run outside it
+            with self._lock:
+                found.update(self.cache.get_many(kind, pending, ttl=ttl))
+                missing = [i for i in pending if i not in found]
+                if pending is ids:
+                    METRICS.cache(f"enrich_{kind}", "miss" if missing else "hit")
+                inflight = self._inflight[kind]
+                waiting = {inflight[i] for i in missing if i in inflight}
+                claimed = [i for i in missing if i not in inflight]
+                done = threading.Event()
+                inflight.update(dict.fromkeys(claimed, done))
+            if claimed:
+                try:
+                    found.update(self._fetch_batches(kind, claimed, batch_size, fetch, on_progress))
+                finally:
+                    with self._lock:
+                        for i in claimed:
+                            del inflight[i]
+                    done.set()
+            for event in waiting:
+                event.wait()
+            # Ids another lookup had claimed: read from the cache, or fetched here if it failed
+            pending = [i for i in missing if i not in found] if waiting else []
+        return found
+
+    def isrcs(self, table):
+        """ISRC per row of `table` (None where unknown), from the cached track lookup."""
+        ids = [track_id(uri) for uri in table.uri]
+        tracks = self._lookup("track", ids, TRACKS_BATCH, self._fetch_tracks)
+        return [(tracks.get(tid) or {}).get('isrc') for tid in ids]
+
+    def columns(self, table, on_progress=None):
+        """`{column: values}` aligned with every row of `table` (see `_lookup` for `on_progress`)."""
+        ids = [track_id(uri) for uri in table.uri]
+        with METRICS.timer("prepare", "enrich"):
+            tracks = self._lookup("track", ids, TRACKS_BATCH, self._fetch_tracks, on_progress=on_progress)
+            features = self._lookup("features", ids, FEATURES_BATCH, self._fetch_features, on_progress=on_progress)
+            artist_ids = (a_id for t in tracks.values() if t for a_id, _ in t['artists'])
+            artists = self._lookup(
+                "artist", artist_ids, ARTISTS_BATCH, self._fetch_artists, ttl=ARTIST_TTL, on_progress=on_progress
+            )
+
+        columns = {name: [] for name in ENRICH_COLUMNS}
+        for tid in ids:
+            track = tracks.get(tid) or {}
+            feature = features.get(tid) or {}
+            genres = {}     # Ordered union over all artists
+            for a_id, _ in track.get('artists', ()):
+                genres.update(dict.fromkeys((artists.get(a_id) or {}).get('genres', ())))
+            columns["Artists"].append(SEPARATOR.join(name for _, name in track.get('artists', ()) if name) or None)
+            columns["ISRC"].append(track.get('isrc'))
+            columns["Release Date"].append(track.get('release_date'))
+            columns["Genres"].append(SEPARATOR.join(genres) or None)
+            for column, key in FEATURE_KEYS.items():
+                columns[column].append(feature.get(key))
+        return columns
@@ -0,0 +1,201 @@
+"""Playlist export formats.
+
+Each writer streams a `TrackTable` into a binary file object in batches, so no
+second full copy of the playlist is built on the way out. Writers also take an
+iterable of TrackTable chunks instead (see `tracks.stream_track_chunks`), so a
+playlist can be exported without ever holding all of it. `export_bytes`
+produces a format on demand and memoizes it on the table, i.e. once per
+playlist snapshot; `export_stream_file` encodes chunks to a temporary file.
+
+Tabular formats also take `extra`, additional `{column: values}` aligned with
+the table rows (see `enrich.Enricher.columns`); M3U and XSPF ignore it.
+"""
+import csv
+import importlib.util
+import io
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Callable
+from xml.sax.saxutils import escape
+
+from enrich import ENRICH_COLUMNS
+from metrics import METRICS
+from tracks import EXPORT_COLUMNS, TrackTable
+
+BATCH_ROWS = 5000   # Rows per write batch / Parquet row group
+
+
+def _batches(source):
+    """Yield `(table, available row indexes)`, about BATCH_ROWS rows at a time.
+
+    `source` is a TrackTable or an iterable of TrackTable chunks; `extra`
+    columns only line up with a whole table.
+    """
+    if not isinstance(source, TrackTable):
+        for chunk in source:
+            yield chunk, chunk.available_rows()
+        return
+    rows = source.available_rows()
+    for i in range(0, len(rows), BATCH_ROWS):
+        yield source, rows[i:i + BATCH_ROWS]
+
+
+def _json_key(column):
+    return column.lower().replace(" ", "_")
+
+
+def write_csv(source, fh, extra=None):
+    extra = extra or {}
+    text = io.TextIOWrapper(fh, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS + tuple(extra))
+    extra_values = list(extra.values())
+    for table, batch in _batches(source):
+        writer.writerows(
+            (table.name[i], table.artist[i], table.album[i], table.duration_ms[i],
+             *(values[i] for values in extra_values))
+            for i in batch
+        )
+    text.detach()
+
+
+def write_jsonl(source, fh, extra=None):
+    extra = {_json_key(column): values for column, values in (extra or {}).items()}
+    for table, batch in _batches(source):
+        lines = (
+            json.dumps({
+                "title": table.name[i],
+                "artist": table.artist[i],
+                "album": table.album[i],
+                "duration_ms": table.duration_ms[i],
+                "uri": table.uri[i],
+                **{key: values[i] for key, values in extra.items()},
+            }, ensure_ascii=False)
+            for i in batch
+        )
+        fh.write(("\n".join(lines) + "\n").encode('utf-8'))
+
+
+def write_m3u(source, fh, extra=None):
+    fh.write(b"#EXTM3U\n")
+    for table, batch in _batches(source):
+        fh.write("".join(
+            f"#EXTINF:{table.duration_ms[i] // 1000},{table.artist[i]} - {table.name[i]}\n{table.uri[i]}\n"
+            for i in batch
+        ).encode('utf-8'))
+
+
+def write_xspf(source, fh, extra=None):
+    fh.write(b'<?xml version="1.0" encoding="UTF-8"?>\n'
+             b'<playlist version="1" xmlns="http://xspf.org/ns/0/">\n  <trackList>\n')
+    for table, batch in _batches(source):
+        fh.write("".join(
+            "    <track>"
+            f"<location>{escape(table.uri[i])}</location>"
+            f"<title>{escape(table.name[i])}</title>"
+            f"<creator>{escape(table.artist[i])}</creator>"
+            f"<album>{escape(table.album[i])}</album>"
+            f"<duration>{table.duration_ms[i]}</duration>"
+            "</track>\n"
+            for i in batch
+        ).encode('utf-8'))
+    fh.write(b"  </trackList>\n</playlist>\n")
+
+
+def write_parquet(source, fh, extra=None):
+    # pyarrow is optional; the format is hidden when it isn't installed
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    extra = extra or {}
+    types = {str: pa.string(), int: pa.int64(), float: pa.float64()}
+    schema = pa.schema([
+        ("Title", pa.string()),
+        ("Artist", pa.string()),
+        ("Album", pa.string()),
+        ("Duration (ms)", pa.int64()),
+        ("URI", pa.string()),
+        *((column, types[ENRICH_COLUMNS.get(column, str)]) for column in extra),
+    ])
+    with pq.ParquetWriter(fh, schema) as writer:
+        for table, batch in _batches(source):
+            writer.write_table(pa.table({
+                "Title": [table.name[i] for i in batch],
+                "Artist": [table.artist[i] for i in batch],
+                "Album": [table.album[i] for i in batch],
+                "Duration (ms)": [table.duration_ms[i] for i in batch],
+                "URI": [table.uri[i] for i in batch],
+                **{column: [values[i] for i in batch] for column, values in extra.items()},
+            }, schema=schema))
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    label: str
+    extension: str
+    mime: str
+    write: Callable
+    enrichable: bool = False    # Has room for enrichment columns
+
+
+EXPORT_FORMATS = {
+    "csv": ExportFormat("CSV", "csv", "text/csv", write_csv, enrichable=True),
+    "parquet": ExportFormat("Parquet", "parquet", "application/vnd.apache.parquet", write_parquet, enrichable=True),
+    "jsonl": ExportFormat("JSON Lines", "jsonl", "application/jsonl", write_jsonl, enrichable=True),
+    "m3u": ExportFormat("M3U", "m3u8", "audio/x-mpegurl", write_m3u),
+    "xspf": ExportFormat("XSPF", "xspf", "application/xspf+xml", write_xspf),
+}
+
+
+def available_formats():
+    """Format keys usable in this environment, in display order."""
+    return [
+        key for key in EXPORT_FORMATS
+        if key != "parquet" or importlib.util.find_spec("pyarrow") is not None
+    ]
+
+
+def export_bytes(table, fmt, enricher=None, on_progress=None):
+    """Return `table` encoded as `fmt`, built on first request only.
+
+    With an `enrich.Enricher`, enrichable formats get its extra columns;
+    `on_progress` is passed on to `Enricher.columns`.
+    """
+    enricher = enricher if EXPORT_FORMATS[fmt].enrichable else None
+
+    def build():
+        extra = table.memo('enrichment', lambda: enricher.columns(table, on_progress=on_progress)) if enricher else None
+        with METRICS.timer("export", fmt) as timing:
+            buffer = io.BytesIO()
+            EXPORT_FORMATS[fmt].write(table, buffer, extra=extra)
+            timing["bytes"] = buffer.tell()
+        return buffer.getvalue()
+    return table.memo(('export', fmt, enricher is not None), build)
+
+
+def export_stream_file(chunks, fmt):
+    """Encode TrackTable chunks (streaming mode) as `fmt` into a temporary file.
+
+    Returns the file opened for reading from the start; it is removed from
+    disk already, and its space is freed once the caller closes it (use it as
+    a context manager). Nothing is held in memory while encoding, but whoever
+    reads the file (e.g. a Streamlit download, which keeps downloads in
+    memory) may still load it whole.
+    """
+    with METRICS.timer("export", fmt) as timing:
+        with tempfile.NamedTemporaryFile(prefix="spotify-export-", delete=False) as fh:
+            try:
+                EXPORT_FORMATS[fmt].write(chunks, fh)
+            except BaseException:
+                fh.close()
+                os.remove(fh.name)
+                raise
+            timing["bytes"] = fh.tell()
+    output = open(fh.name, 'rb')
+    try:
+        os.remove(fh.name)
+    except OSError:
+        pass    # Windows can't remove an open file; it stays in the temp directory
+    return output
@@ -0,0 +1,196 @@
+"""Playlist metadata resolution and paged track fetching.
+
+Spotify returns playlist items at most 100 per request. The first page carries
+the playlist total, so every remaining offset is known up front and can be
+requested concurrently. Pages are still handed back in playlist order.
+
+Playlist metadata goes through `PlaylistFetchPlanner`, which remembers which
+request variant works for a token and memoizes resolved playlists.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from spotipy.exceptions import SpotifyException
+
+from cache import TTLCache
+from metrics import METRICS
+
+PAGE_SIZE = 100
+DEFAULT_WORKERS = 4
+
+# Only the columns the track list and exporters actually use.
+TRACK_FIELDS = "total,items(track(id,uri,name,duration_ms,artists(name),album(name)))"
+PLAYLIST_FIELDS = (
+    "id,name,description,snapshot_id,public,collaborative,images,"
+    "owner(id,display_name),external_urls,tracks(total)"
+)
+
+# Request variants for /playlists/{id}, in order of preference.
+STRATEGIES = (
+    ("from_token", {"market": "from_token"}),   # Needs scope user-read-private
+    ("no market", {}),
+    ("US", {"market": "US"}),
+)
+# Statuses no other variant can fix: bad token, missing playlist, throttling
+# (already retried by the client) and server errors.
+FATAL_STATUSES = {401, 404, 429, 500, 502, 503, 504}
+SNAPSHOTLESS_TTL = 60   # Memo lifetime when the caller has no snapshot_id
+
+
+def fetch_track_page(sp, playlist_id, offset, market=None):
+    """Fetch one projected page of playlist items starting at `offset`."""
+    return sp.playlist_items(
+        playlist_id,
+        fields=TRACK_FIELDS,
+        limit=PAGE_SIZE,
+        offset=offset,
+        market=market,
+        additional_types=("track",),
+    )
+
+
+def iter_offset_pages(fetch_page, page_size, workers=DEFAULT_WORKERS, start=0, name="page"):
+    """Yield `(offset, page)` for every page of an offset-paged endpoint, in order.
+
+    `fetch_page(offset)` returns one page dict carrying `total`. The first
+    page is fetched alone to learn the total. The remaining offsets are
+    fetched by a bounded worker pool; at most `2 * workers` pages are in
+    flight or buffered at any time, so memory stays flat even when one slow
+    page holds back the ones after it. `start` (a multiple of `page_size`)
+    skips the pages before it. Each page is timed as a `page` metric under
+    `name`.
+    """
+    def timed_fetch(offset):
+        with METRICS.timer("page", name):
+            return fetch_page(offset)
+
+    first = timed_fetch(start)
+    total = first.get('total') or 0
+    yield start, first
+
+    next_offset = start + page_size
+    remaining = iter(range(next_offset, total, page_size))
+    window = max(1, workers) * 2
+    pending = {}
+    ready = {}
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        while True:
+            while len(pending) + len(ready) < window:
+                offset = next(remaining, None)
+                if offset is None:
+                    break
+                pending[pool.submit(timed_fetch, offset)] = offset
+
+            if not pending and next_offset not in ready:
+                break
+
+            if pending and next_offset not in ready:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ready[pending.pop(future)] = future.result()
+
+            while next_offset in ready:
+                yield next_offset, ready.pop(next_offset)
+                next_offset += page_size
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_track_pages(sp, playlist_id, market=None, workers=DEFAULT_WORKERS, start=0):
+    """Yield `(offset, items, total)` for every page of a playlist, in order.
+
+    Pages are fetched concurrently by `iter_offset_pages`. `start` skips the
+    pages before it, e.g. when resuming a clone.
+    """
+    total = None
+    for offset, page in iter_offset_pages(
+        lambda off: fetch_track_page(sp, playlist_id, off, market), PAGE_SIZE, workers=workers, start=start,
+        name="playlist_items",
+    ):
+        if total is None:
+            total = page.get('total') or 0
+        yield offset, page['items'], total
+
+
+def fetch_all_tracks(sp, playlist_id, market=None, workers=DEFAULT_WORKERS):
+    """Return every item of a playlist as one list."""
+    tracks = []
+    for _, items, _ in iter_track_pages(sp, playlist_id, market=market, workers=workers):
+        tracks.extend(items)
+    return tracks
+
+
+class PlaylistFetchError(Exception):
+    """No strategy could load a playlist. `errors` holds one line per attempt."""
+
+    def __init__(self, errors):
+        super().__init__(errors[-1] if errors else "Could not load playlist")
+        self.errors = errors
+
+
+def is_fatal(error):
+    """True when retrying the request with another variant cannot help."""
+    return isinstance(error, SpotifyException) and error.http_status in FATAL_STATUSES
+
+
+class PlaylistFetchPlanner:
+    """Resolve playlist metadata for one token with as few requests as possible.
+
+    The strategy that last worked is tried first. If it fails with an error
+    another variant might fix, the remaining variants are raced and the first
+    success becomes the new preference. Results are memoized by
+    `(playlist_id, snapshot_id)`.
+    """
+
+    def __init__(self, sp, memo=None, namespace=None):
+        self.sp = sp
+        self.memo = memo if memo is not None else TTLCache(maxsize=64, ttl=3600)
+        self.namespace = namespace
+        self.preferred = STRATEGIES[0]
+
+    def _fetch(self, strategy, playlist_id):
+        return self.sp.playlist(playlist_id, fields=PLAYLIST_FIELDS, **strategy[1])
+
+    def resolve(self, playlist_id, snapshot_id=None):
+        """Return `(playlist, market)`; raise PlaylistFetchError on failure.
+
+        `market` is the market the winning strategy used, so track pages can
+        be requested the same way.
+        """
+        key = ('playlist', self.namespace, playlist_id, snapshot_id)
+        memoized = self.memo.get(key)
+        if memoized is not None:
+            return memoized
+
+        errors = []
+        strategy = self.preferred
+        try:
+            playlist = self._fetch(strategy, playlist_id)
+        except Exception as e:
+            errors.append(f"{strategy[0]}: {e}")
+            if is_fatal(e):
+                raise PlaylistFetchError(errors)
+            playlist, strategy = self._race(playlist_id, [s for s in STRATEGIES if s is not strategy], errors)
+
+        self.preferred = strategy
+        resolved = (playlist, strategy[1].get("market"))
+        if snapshot_id is None:
+            self.memo.set(key, resolved, ttl=SNAPSHOTLESS_TTL)
+        self.memo.set(('playlist', self.namespace, playlist_id, playlist.get('snapshot_id')), resolved)
+        return resolved
+
+    def _race(self, playlist_id, strategies, errors):
+        """Run the fallback variants concurrently and return the first success."""
+        pool = ThreadPoolExecutor(max_workers=len(strategies))
+        try:
+            futures = {pool.submit(self._fetch, s, playlist_id): s for s in strategies}
+            for future in as_completed(futures):
+                strategy = futures[future]
+                try:
+                    return future.result(), strategy
+                except Exception as e:
+                    errors.append(f"{strategy[0]}: {e}")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise PlaylistFetchError(errors)
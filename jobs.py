@@ -0,0 +1,181 @@
+"""Background jobs that survive Streamlit reruns.
+
+Any widget interaction stops the running script and starts it over, so long
+work done inside the script is thrown away halfway. A `JobRunner` runs such
+work on per-process thread pools instead: one for interactive loads the page
+is waiting for, and one for long writes and exports, so a few big clones
+never hold up everyone's track lists. Jobs are registered per session
+under a key chosen by the caller; submitting a key that is still queued or
+running (or done) returns the existing job, so the next rerun just picks it
+up again.
+
+The task receives its `Job` and calls `job.report(...)` to publish progress,
+which the UI polls. Cancelling is cooperative: the next `report()` raises
+`JobCancelled` inside the task. Results are kept on the job and passed to
+`on_done`, e.g. to put them into a cache that later reruns read from.
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 4         # Interactive loads (track tables)
+LONG_WORKERS = 2            # Clones, bulk exports, imports and other long jobs
+KEEP_FINISHED = 15 * 60     # Seconds a finished job stays in the registry
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobCancelled(BaseException):
+    """Raised in a task at its next `report()` after `cancel()`.
+
+    A BaseException, like KeyboardInterrupt, so the task's own `except
+    Exception` handlers let it through; `clone.run_clone` treats it as a
+    pause and keeps the job resumable.
+    """
+
+
+class Job:
+    """State of one background task, safe to read from any thread."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, key, label=""):
+        self.id = next(self._ids)
+        self.key = key
+        self.label = label
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.partial = None     # Optional intermediate result for previews
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def report(self, progress=None, message=None, partial=None):
+        """Publish progress (0..1); raises JobCancelled once cancel() was called."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+        if partial is not None:
+            self.partial = partial
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; True if it did within `timeout`."""
+        return self._done.wait(timeout)
+
+
+class JobRunner:
+    """Per-process worker pool with a job registry keyed by session."""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, long_workers=LONG_WORKERS, keep=KEEP_FINISHED):
+        self.keep = keep
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._long_pool = ThreadPoolExecutor(max_workers=long_workers, thread_name_prefix="long-job")
+        self._lock = threading.Lock()
+        self._jobs = {}     # session -> {key: Job}
+
+    def submit(self, session, key, fn, *args, label="", on_done=None, long_running=False, **kwargs):
+        """Run `fn(job, *args, **kwargs)` in the background, once per key.
+
+        Returns the existing job whatever its status, so a result, error or
+        cancellation can be shown on every rerun without starting the work
+        again; `forget()` the key first to run it again (e.g. on Retry).
+        `on_done(result)` runs on the worker after success; if it raises,
+        the job fails. `long_running` jobs (writes, exports) queue on their
+        own pool, never in front of interactive loads.
+        """
+        with self._lock:
+            self._prune()
+            jobs = self._jobs.setdefault(session, {})
+            job = jobs.get(key)
+            if job is not None:
+                return job
+            job = jobs[key] = Job(key, label)
+        pool = self._long_pool if long_running else self._pool
+        pool.submit(self._run, job, fn, args, kwargs, on_done)
+        return job
+
+    def _run(self, job, fn, args, kwargs, on_done):
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            if job.cancel_requested:
+                raise JobCancelled()
+            result = fn(job, *args, **kwargs)
+            if on_done is not None:
+                on_done(result)
+            job.result = result
+            job.progress = 1.0
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except BaseException as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            job.partial = None
+            job._done.set()
+
+    def get(self, session, key):
+        with self._lock:
+            return self._jobs.get(session, {}).get(key)
+
+    def jobs(self, session):
+        """This session's jobs, newest first."""
+        with self._lock:
+            return sorted(self._jobs.get(session, {}).values(), key=lambda job: job.id, reverse=True)
+
+    def cancel(self, session, key):
+        job = self.get(session, key)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def forget(self, session, key):
+        """Drop a job from the registry (cancelling it if it still runs)."""
+        with self._lock:
+            job = self._jobs.get(session, {}).pop(key, None)
+        if job is not None and job.active:
+            job.cancel()
+
+    def drop_session(self, session):
+        """Cancel and forget every job of a session, e.g. on logout."""
+        with self._lock:
+            jobs = self._jobs.pop(session, {})
+        for job in jobs.values():
+            job.cancel()
+
+    def _prune(self):
+        cutoff = time.time() - self.keep
+        for session, jobs in list(self._jobs.items()):
+            for key, job in list(jobs.items()):
+                if not job.active and job.finished < cutoff:
+                    del jobs[key]
+            if not jobs:
+                del self._jobs[session]
@@ -0,0 +1,98 @@
+"""Playlist library listing and link parsing, independent of the UI."""
+import threading
+import time
+
+from fetching import DEFAULT_WORKERS, iter_offset_pages
+from links import parse_link
+
+LIBRARY_PAGE_SIZE = 50      # Maximum for current_user_playlists
+
+
+def get_playlist_id_from_link(url):
+    """Extract the playlist id from a playlist link or `spotify:playlist:` URI."""
+    ref = parse_link(url)
+    return ref.id if ref is not None and ref.kind == "playlist" else None
+
+
+def fetch_user_playlists(sp, fetch_log=None, on_page=None, workers=DEFAULT_WORKERS):
+    """Fetch all playlists from the current user's library.
+
+    Note: "Made For You" playlists (Discover Weekly, Release Radar, etc.)
+    will only appear if the user has followed/liked them in Spotify.
+    The first page gives the total; the remaining pages are fetched
+    concurrently and reassembled in order. `on_page(playlists, total)` is
+    called with the growing list after each page. Returns
+    `(playlists, total_from_api)`; progress lines with per-page timings are
+    appended to `fetch_log` when given.
+    """
+    fetch_log = fetch_log if fetch_log is not None else []
+    all_playlists = []
+    timings = {}    # offset -> ms, filled by the worker threads
+
+    def fetch_page(offset):
+        started = time.perf_counter()
+        page = sp.current_user_playlists(limit=LIBRARY_PAGE_SIZE, offset=offset)
+        timings[offset] = (time.perf_counter() - started) * 1000
+        return page
+
+    total_from_api = 0
+    started = time.perf_counter()
+    pages = iter_offset_pages(fetch_page, LIBRARY_PAGE_SIZE, workers=workers, name="current_user_playlists")
+    for page_num, (offset, results) in enumerate(pages, 1):
+        all_playlists.extend(results['items'])
+        if page_num == 1:
+            total_from_api = results.get('total', 0)
+            fetch_log.append(
+                f"First fetch: Got {len(results['items'])} items, API says total={total_from_api} "
+                f"({timings[offset]:.0f} ms)"
+            )
+        else:
+            fetch_log.append(f"Page {page_num}: Got {len(results['items'])} more items ({timings[offset]:.0f} ms)")
+        if on_page:
+            on_page(all_playlists, total_from_api)
+
+    fetch_log.append(
+        f"Final count: {len(all_playlists)} playlists fetched (API said {total_from_api}) "
+        f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+    return all_playlists, total_from_api
+
+
+class LibraryLoader:
+    """Runs `fetch_user_playlists` on a background thread.
+
+    `playlists` is an in-order prefix of the library that grows as pages
+    arrive, so callers can use the first playlists before the rest is in.
+    """
+
+    def __init__(self, sp, workers=DEFAULT_WORKERS):
+        self.sp = sp
+        self.workers = workers
+        self.playlists = []
+        self.total = None
+        self.fetch_log = []
+        self.error = None
+        self.done = False
+        self._first_page = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="library-loader", daemon=True)
+
+    def start(self, wait_first_page=True, timeout=30):
+        """Start loading; by default block until the first page is in."""
+        self._thread.start()
+        if wait_first_page:
+            self._first_page.wait(timeout)
+        return self
+
+    def _on_page(self, playlists, total):
+        self.playlists = playlists
+        self.total = total
+        self._first_page.set()
+
+    def _run(self):
+        try:
+            fetch_user_playlists(self.sp, self.fetch_log, on_page=self._on_page, workers=self.workers)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._first_page.set()
@@ -0,0 +1,204 @@
+"""Parse pasted Spotify links in bulk and resolve them to one track table.
+
+`parse_link` understands open.spotify.com URLs (with or without a locale
+segment, embed links, query strings) and `spotify:` URIs for playlists,
+albums and tracks. `parse_links` splits a pasted blob, drops duplicates and
+collects what it could not read.
+
+`resolve_links` fetches everything concurrently. Tracks go through the
+batched `tracks` endpoint 50 ids per request and albums through `albums` 20
+per request; playlists are resolved and fetched like anywhere else. All
+requests share the process-wide rate limit of the client. The result is a
+single TrackTable in pasted order, which exports and clones take as is.
+"""
+import re
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from fetching import DEFAULT_WORKERS, PlaylistFetchPlanner, iter_offset_pages
+from metrics import METRICS
+from tracks import TrackTable, fetch_track_table
+
+KINDS = ("playlist", "album", "track")
+TRACKS_BATCH = 50
+ALBUMS_BATCH = 20
+ALBUM_PAGE = 50
+SHORT_HOSTS = ("spotify.link", "spoti.fi")
+_ID = re.compile(r"^[0-9A-Za-z]{22}$")
+_SPLIT = re.compile(r"[\s,;]+")
+
+
+@dataclass(frozen=True)
+class SpotifyRef:
+    kind: str
+    id: str
+
+    @property
+    def uri(self):
+        return f"spotify:{self.kind}:{self.id}"
+
+
+def parse_link(text):
+    """SpotifyRef for a playlist/album/track URL or URI, or None."""
+    text = (text or "").strip().strip("<>\"'")
+    if text.startswith("spotify:"):
+        # Also the legacy spotify:user:<name>:playlist:<id> form
+        parts = text.split(":")
+        pairs = zip(parts[1:], parts[2:])
+    else:
+        url = urllib.parse.urlsplit(text if "//" in text else f"https://{text}")
+        host = url.hostname or ""
+        if host != "spotify.com" and not host.endswith(".spotify.com"):
+            return None
+        parts = [p for p in url.path.split("/") if p]
+        pairs = zip(parts, parts[1:])
+    for kind, ref_id in pairs:
+        if kind in KINDS and _ID.match(ref_id):
+            return SpotifyRef(kind, ref_id)
+    return None
+
+
+def parse_links(text):
+    """`(refs, duplicates, invalid)` for a blob of links separated by whitespace, commas or semicolons."""
+    refs, seen, invalid = [], set(), []
+    duplicates = 0
+    for token in _SPLIT.split(text or ""):
+        if not token:
+            continue
+        ref = parse_link(token)
+        if ref is None:
+            invalid.append(token)
+        elif ref in seen:
+            duplicates += 1
+        else:
+            seen.add(ref)
+            refs.append(ref)
+    return refs, duplicates, invalid
+
+
+def is_short_link(text):
+    host = urllib.parse.urlsplit(text if "//" in text else f"https://{text}").hostname or ""
+    return host in SHORT_HOSTS
+
+
+@dataclass
+class LinkResult:
+    kind: str
+    id: str
+    name: str = ""
+    tracks: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class LinkImport:
+    table: TrackTable
+    results: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def failed(self):
+        return [r for r in self.results if r.error]
+
+
+def _batches(ids, size):
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+def resolve_links(sp, refs, workers=DEFAULT_WORKERS, on_progress=None, load_table=None):
+    """Fetch every ref and return a LinkImport with all their tracks in order.
+
+    `load_table(playlist)` returns a playlist's TrackTable (default: fetch
+    it). `on_progress(done, total)` is called as refs are resolved. A ref
+    that can't be resolved gets an error on its LinkResult and no rows.
+    """
+    started = time.perf_counter()
+    by_kind = {kind: [r.id for r in refs if r.kind == kind] for kind in KINDS}
+    planner = PlaylistFetchPlanner(sp)
+    found = {}          # SpotifyRef -> (name, items or TrackTable) or Exception
+    done = 0
+
+    def fetch_tracks(ids):
+        return {
+            t['id']: (f"{t['name']} - {t['artists'][0]['name'] if t.get('artists') else ''}", [{'track': t}])
+            for t in sp.tracks(ids)['tracks'] if t
+        }
+
+    def fetch_albums(ids):
+        return {a['id']: (a.get('name') or "", album_items(a)) for a in sp.albums(ids)['albums'] if a}
+
+    def album_items(album):
+        page = album.get('tracks') or {}
+        items = list(page.get('items') or [])
+        if page.get('next') or len(items) < (page.get('total') or 0):
+            for _, more in iter_offset_pages(
+                lambda offset: sp.album_tracks(album['id'], limit=ALBUM_PAGE, offset=offset),
+                ALBUM_PAGE, start=len(items), name="album_tracks",
+            ):
+                items.extend(more.get('items') or [])
+        # Album tracks are simplified objects: add the album the table shows
+        return [{'track': {**t, 'album': {'name': album.get('name') or ""}}} for t in items if t]
+
+    def load_playlist(playlist_id):
+        playlist, market = planner.resolve(playlist_id)
+        table = load_table(playlist) if load_table else fetch_track_table(sp, playlist_id, market=market)
+        return playlist['name'], table
+
+    def report(count=1):
+        nonlocal done
+        done += count
+        if on_progress:
+            on_progress(done, len(refs))
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        track_batches = _batches(by_kind["track"], TRACKS_BATCH)
+        album_batches = _batches(by_kind["album"], ALBUMS_BATCH)
+        futures = [("track", batch, pool.submit(fetch_tracks, batch)) for batch in track_batches]
+        futures += [("album", batch, pool.submit(fetch_albums, batch)) for batch in album_batches]
+        playlist_futures = {pid: pool.submit(load_playlist, pid) for pid in by_kind["playlist"]}
+
+        for kind, batch, future in futures:
+            try:
+                objects = future.result()
+            except Exception as e:
+                objects = {}
+                for ref_id in batch:
+                    found[SpotifyRef(kind, ref_id)] = e
+            for ref_id in batch:
+                ref = SpotifyRef(kind, ref_id)
+                if ref in found:
+                    continue
+                found[ref] = objects.get(ref_id) or LookupError("not found")
+            report(len(batch))
+
+        for pid, future in playlist_futures.items():
+            try:
+                found[SpotifyRef("playlist", pid)] = future.result()
+            except Exception as e:
+                found[SpotifyRef("playlist", pid)] = e
+            report()
+    finally:
+        # Also reached when on_progress raises (e.g. a cancelled job): drop queued lookups
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    result = LinkImport(TrackTable())
+    with METRICS.timer("prepare", "link_import"):
+        for ref in refs:
+            outcome = found.get(ref, LookupError("not resolved"))
+            entry = LinkResult(ref.kind, ref.id)
+            if isinstance(outcome, Exception):
+                entry.error = str(outcome) or type(outcome).__name__
+            else:
+                entry.name, rows = outcome
+                if isinstance(rows, TrackTable):
+                    result.table.extend_from(rows)
+                else:
+                    result.table.extend(rows)
+                entry.tracks = len(rows)
+            result.results.append(entry)
+    result.elapsed = time.perf_counter() - started
+    return result
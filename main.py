@@ -1,16 +1,490 @@
-# This is a sample Python script.
+"""Command line entry point: export and clone playlists without Streamlit.
 
-# Press ⌃R to execute it or replace it with your code.
-# Press Double ⇧ to search everywhere for classes, files, tool windows, actions, and settings.
+    python main.py library [--json]
+    python main.py export PLAYLIST [-f parquet] [-o tracks.parquet]
+    python main.py export --all [-f csv] [-o backup.zip]
+    python main.py export PLAYLIST --enrich [--enrich-db spotify-enrich.db]
+    python main.py export PLAYLIST --stream [-f jsonl] [-o tracks.jsonl]
+    python main.py clone PLAYLIST [--stream]
+    python main.py sync [PLAYLIST ...] [--db spotify-store.db] [-v]
+    python main.py combine union|intersection|difference PLAYLIST ... [--match isrc] [--dry-run]
+    python main.py share PLAYLIST [--code [--stream]]
+    python main.py restore CODE_OR_FILE [--name NAME]
+    python main.py import LINK ... [--file links.txt] [-f csv] [-o tracks.csv | --clone NAME]
 
+PLAYLIST is a playlist id, open.spotify.com link or spotify: URI. Authentication uses
+--token / $SPOTIFY_TOKEN when given, otherwise an interactive OAuth login with
+the SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET and SPOTIPY_REDIRECT_URI
+environment variables (spotipy caches the token in ./.cache).
 
-def print_hi(name):
-    # Use a breakpoint in the code line below to debug your script.
-    print(f'Hi, {name}')  # Press ⌘F8 to toggle the breakpoint.
+--metrics FILE writes per-call/page/export timings in the OpenMetrics text
+format when the command ends; --log-json FILE appends every timing event as
+one JSON line while it runs.
 
+--stream handles each page of tracks as it arrives and keeps none of them, so
+memory stays flat for playlists of any length (no --db, --enrich or messages).
 
-# Press the green button in the gutter to run the script.
-if __name__ == '__main__':
-    print_hi('PyCharm')
+Only the standard library is imported at module level. Building the parser
+imports `exporters` and `setops` for their choices; each command imports the
+other fetch/export/clone modules it needs (never Streamlit).
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def progress(message, final=False):
+    """Single-line progress on stderr, overwritten in place on a terminal."""
+    if sys.stderr.isatty():
+        sys.stderr.write(f"\r\033[K{message}" + ("\n" if final else ""))
+    else:
+        sys.stderr.write(message + "\n")
+    sys.stderr.flush()
+
+
+def get_spotify(args):
+    from client import SCOPE, get_client
+
+    from auth import TokenManager
+
+    token = args.token or os.environ.get("SPOTIFY_TOKEN")
+    if token:
+        return get_client(TokenManager({'access_token': token}, label="--token"))
+
+    from spotipy.oauth2 import SpotifyOAuth
+    oauth = SpotifyOAuth(scope=SCOPE)
+    oauth.get_access_token(as_dict=False)   # Logs in or refreshes, then caches token_info
+    # Long exports outlive the one-hour token; the manager refreshes it
+    return get_client(TokenManager(oauth.get_cached_token(), refresh=oauth.refresh_access_token))
+
+
+def resolve_playlist_id(value):
+    from library import get_playlist_id_from_link
+    return get_playlist_id_from_link(value) or value
+
+
+def load_playlist(sp, value):
+    """Resolve metadata and fetch every track of one playlist."""
+    from fetching import PlaylistFetchPlanner
+    from tracks import fetch_track_table
+
+    playlist, market = PlaylistFetchPlanner(sp).resolve(resolve_playlist_id(value))
+    table = fetch_track_table(
+        sp, playlist['id'], market=market,
+        on_page=lambda t, total: progress(f"{playlist['name']}: {len(t)} / {total} tracks"),
+    )
+    progress(f"{playlist['name']}: {len(table)} tracks", final=True)
+    return playlist, table
+
+
+def stream_playlist(sp, value):
+    """Resolve metadata and stream the tracks of one playlist as TrackTable chunks."""
+    from fetching import PlaylistFetchPlanner
+    from tracks import stream_track_chunks
+
+    playlist, market = PlaylistFetchPlanner(sp).resolve(resolve_playlist_id(value))
+    chunks = stream_track_chunks(
+        sp, playlist['id'], market=market,
+        on_page=lambda rows, total: progress(f"{playlist['name']}: {rows} / {total} tracks", final=rows >= total),
+    )
+    return playlist, market, chunks
+
+
+def store_loader(args, sp):
+    """TrackStore-backed `load_table(playlist)` when --db is given, else None."""
+    if not args.db:
+        return None
+    from store import TrackStore
+
+    store = TrackStore(args.db)
+    account = sp.current_user()['id']
+    return lambda pl: store.sync(sp, account, pl).table
+
+
+def cmd_library(args):
+    from library import fetch_user_playlists
+
+    playlists, _ = fetch_user_playlists(get_spotify(args))
+    playlists = [pl for pl in playlists if pl]
+    if args.json:
+        json.dump(playlists, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return 0
+    for pl in playlists:
+        print(f"{pl['id']}\t{pl['tracks']['total']}\t{pl['owner']['display_name']}\t{pl['name']}")
+    return 0
+
+
+def get_enricher(args, sp, export_format):
+    """Enricher for --enrich, or None (also for formats without columns)."""
+    if not args.enrich:
+        return None
+    if not export_format.enrichable:
+        print(f"--enrich: {export_format.label} has no room for extra columns, ignoring", file=sys.stderr)
+        return None
+    from enrich import EnrichmentCache, Enricher
+    return Enricher(sp, EnrichmentCache(args.enrich_db))
+
+
+def cmd_export(args):
+    from exporters import EXPORT_FORMATS
+
+    sp = get_spotify(args)
+    export_format = EXPORT_FORMATS[args.format]
+    enricher = get_enricher(args, sp, export_format)
+
+    if args.all or len(args.playlists) > 1:
+        if args.stream:
+            # Bulk exports already hold at most --workers playlists at once
+            print("export: --stream works with a single PLAYLIST, not several or --all", file=sys.stderr)
+            return 2
+        from bulk import export_playlists
+        from fetching import PlaylistFetchPlanner
+        from library import fetch_user_playlists
+
+        if args.all:
+            playlists = [pl for pl in fetch_user_playlists(sp)[0] if pl]
+        else:
+            planner = PlaylistFetchPlanner(sp)
+            playlists = [planner.resolve(resolve_playlist_id(value))[0] for value in args.playlists]
+        result = export_playlists(
+            sp, playlists, args.output or "spotify-playlists.zip", fmt=args.format, workers=args.workers,
+            on_progress=lambda done, total, entry: progress(f"{done} / {total} {entry.name}", final=done == total),
+            load_table=store_loader(args, sp), enricher=enricher,
+        )
+        for warning in enricher.warnings if enricher else ():
+            print(warning, file=sys.stderr)
+        for entry in result.failed:
+            print(f"FAILED {entry.id} {entry.name}: {entry.error}", file=sys.stderr)
+        print(result.path)
+        return 1 if result.failed else 0
+
+    if not args.playlists:
+        print("export: give a PLAYLIST or --all", file=sys.stderr)
+        return 2
+
+    from bulk import archive_name
+
+    if args.stream:
+        if args.db or enricher:
+            print("export: --stream ignores --db and --enrich", file=sys.stderr)
+        playlist, _, chunks = stream_playlist(sp, args.playlists[0])
+        output = args.output or archive_name(playlist, export_format.extension)
+        if output == "-":
+            export_format.write(chunks, sys.stdout.buffer)
+        else:
+            with open(output, 'wb') as fh:
+                export_format.write(chunks, fh)
+            print(output)
+        return 0
+
+    load_table = store_loader(args, sp)
+    if load_table:
+        from fetching import PlaylistFetchPlanner
+        playlist, _ = PlaylistFetchPlanner(sp).resolve(resolve_playlist_id(args.playlists[0]))
+        table = load_table(playlist)
+    else:
+        playlist, table = load_playlist(sp, args.playlists[0])
+    extra = None
+    if enricher:
+        progress("Looking up audio features, artists and genres...")
+        extra = enricher.columns(table)
+        for warning in enricher.warnings:
+            print(warning, file=sys.stderr)
+    output = args.output or archive_name(playlist, export_format.extension)
+    if output == "-":
+        export_format.write(table, sys.stdout.buffer, extra=extra)
+    else:
+        with open(output, 'wb') as fh:
+            export_format.write(table, fh, extra=extra)
+        print(output)
+    return 0
+
+
+def cmd_clone(args):
+    from clone import CloneJob, run_clone, uri_pages
+
+    sp = get_spotify(args)
+    if args.stream:
+        from fetching import PlaylistFetchPlanner, iter_track_pages
 
-# See PyCharm help at https://www.jetbrains.com/help/pycharm/
+        playlist, market = PlaylistFetchPlanner(sp).resolve(resolve_playlist_id(args.playlist))
+
+        def pages_from(start=0):
+            return uri_pages(iter_track_pages(sp, playlist['id'], market=market, start=start))
+    else:
+        playlist, table = load_playlist(sp, args.playlist)
+        pages_from = table.uri_pages
+    job = CloneJob(playlist['id'], playlist['name'], playlist.get('snapshot_id'))
+    run_clone(
+        job, sp, pages_from,
+        on_progress=lambda j: progress(f"Added {j.added} / {j.total} tracks · {j.throughput:.0f} tracks/s"),
+    )
+    progress(f"Added {job.added} tracks in {job.elapsed:.1f}s", final=True)
+    print(job.target_url)
+    return 0
+
+
+def cmd_sync(args):
+    from fetching import PlaylistFetchPlanner
+    from library import fetch_user_playlists
+    from store import TrackStore
+
+    sp = get_spotify(args)
+    store = TrackStore(args.db)
+    account = sp.current_user()['id']
+    if args.playlists:
+        planner = PlaylistFetchPlanner(sp)
+        playlists = [planner.resolve(resolve_playlist_id(value))[0] for value in args.playlists]
+    else:
+        # The listing carries every snapshot_id, so unchanged playlists cost nothing more
+        playlists = [pl for pl in fetch_user_playlists(sp)[0] if pl]
+
+    counts = {"new": 0, "changed": 0, "unchanged": 0}
+    for pl in playlists:
+        result = store.sync(sp, account, pl)
+        counts[result.status] += 1
+        if result.status == "unchanged" and not args.verbose:
+            continue
+        line = f"{result.status}\t{result.playlist_id}\t{result.name}\t{len(result.table)} tracks"
+        if result.diff is not None:
+            line += f"\t{result.diff.summary()}"
+        print(line)
+        if args.verbose and result.diff:
+            for sign, changes in (("+", result.diff.added), ("-", result.diff.removed), ("~", result.diff.moved)):
+                for position, label in changes:
+                    print(f"  {sign} {position}. {label}")
+    progress(f"{counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged", final=True)
+    return 0
+
+
+def cmd_combine(args):
+    from clone import CloneJob, run_clone
+    from setops import combine, result_name
+
+    sp = get_spotify(args)
+    loaded = [load_playlist(sp, value) for value in args.playlists]
+    tables = [table for _, table in loaded]
+    isrcs = None
+    if args.match != "uri":
+        from enrich import EnrichmentCache, Enricher
+        enricher = Enricher(sp, EnrichmentCache(args.enrich_db))
+        progress("Looking up ISRCs...")
+        isrcs = [enricher.isrcs(table) for table in tables]
+    result = combine(tables, args.operation, match=args.match, isrcs=isrcs)
+    progress(f"{args.operation}: {len(result.table)} tracks, {result.duplicates} duplicates dropped, "
+             f"{result.skipped} unavailable or local skipped", final=True)
+    if args.dry_run:
+        for line in result.table.share_lines():
+            print(line)
+        return 0
+    if not len(result.table):
+        print("combine: the result is empty, nothing to write", file=sys.stderr)
+        return 1
+
+    names = [playlist['name'] for playlist, _ in loaded]
+    job = CloneJob(
+        loaded[0][0]['id'], names[0],
+        target_name=args.name or result_name(args.operation, names),
+        description=f"{args.operation.capitalize()} of {', '.join(names)}",
+    )
+    run_clone(
+        job, sp, result.table.uri_pages,
+        on_progress=lambda j: progress(f"Added {j.added} / {j.total} tracks · {j.throughput:.0f} tracks/s"),
+    )
+    progress(f"Added {job.added} tracks in {job.elapsed:.1f}s", final=True)
+    print(job.target_url)
+    return 0
+
+
+def cmd_share(args):
+    sp = get_spotify(args)
+    if args.code and args.stream:
+        from share import encode_share_code
+        playlist, _, chunks = stream_playlist(sp, args.playlist)
+        print(encode_share_code(playlist['name'], (uri for chunk in chunks for uri in chunk.uri)))
+        return 0
+    if args.stream:
+        print("share: --stream only applies with --code", file=sys.stderr)
+    playlist, table = load_playlist(sp, args.playlist)
+    if args.code:
+        from share import encode_share_code
+        print(encode_share_code(playlist['name'], table.uri))
+        return 0
+    from share import chunk_messages
+    try:
+        messages = chunk_messages(table.share_lines(), playlist['name'], limit=args.limit)
+    except ValueError as e:
+        print(f"share: {e}", file=sys.stderr)
+        return 2
+    print("\n\n".join(messages))
+    return 0
+
+
+def cmd_restore(args):
+    from clone import CloneJob, list_pages, run_clone
+    from share import decode_share_code
+
+    code = args.code
+    if os.path.exists(code):
+        with open(code, encoding="utf-8") as fh:
+            code = fh.read()
+    try:
+        name, uris = decode_share_code(code)
+    except ValueError as e:
+        print(f"restore: {e}", file=sys.stderr)
+        return 2
+    name = args.name or name or "Shared playlist"
+    job = CloneJob("share-code", name, target_name=name, description="Restored from a share code")
+    run_clone(
+        job, get_spotify(args), list_pages(uris),
+        on_progress=lambda j: progress(f"Added {j.added} / {j.total} tracks · {j.throughput:.0f} tracks/s"),
+    )
+    progress(f"Added {job.added} tracks in {job.elapsed:.1f}s", final=True)
+    print(job.target_url)
+    return 0
+
+
+def cmd_import(args):
+    from exporters import EXPORT_FORMATS
+    from links import parse_links, resolve_links
+
+    text = " ".join(args.links)
+    if args.file:
+        with (sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")) as fh:
+            text += "\n" + fh.read()
+    refs, duplicates, invalid = parse_links(text)
+    for token in invalid:
+        print(f"import: not a playlist, album or track link: {token}", file=sys.stderr)
+    if not refs:
+        print("import: no links to import", file=sys.stderr)
+        return 2
+
+    sp = get_spotify(args)
+    result = resolve_links(
+        sp, refs, workers=args.workers, load_table=store_loader(args, sp),
+        on_progress=lambda done, total: progress(f"Resolved {done} / {total} links", final=done == total),
+    )
+    for entry in result.failed:
+        print(f"FAILED {entry.kind} {entry.id}: {entry.error}", file=sys.stderr)
+    progress(f"{len(result.table)} tracks from {len(refs) - len(result.failed)} links"
+             + (f" ({duplicates} duplicates skipped)" if duplicates else ""), final=True)
+
+    if args.clone:
+        from clone import CloneJob, run_clone
+        job = CloneJob("link-import", args.clone, target_name=args.clone,
+                       description=f"Imported from {len(refs)} links")
+        run_clone(
+            job, sp, result.table.uri_pages,
+            on_progress=lambda j: progress(f"Added {j.added} / {j.total} tracks · {j.throughput:.0f} tracks/s"),
+        )
+        progress(f"Added {job.added} tracks in {job.elapsed:.1f}s", final=True)
+        print(job.target_url)
+    else:
+        export_format = EXPORT_FORMATS[args.format]
+        output = args.output or f"spotify-import.{export_format.extension}"
+        if output == "-":
+            export_format.write(result.table, sys.stdout.buffer)
+        else:
+            with open(output, 'wb') as fh:
+                export_format.write(result.table, fh)
+            print(output)
+    return 1 if result.failed else 0
+
+
+def build_parser():
+    # Choices come from the modules that implement them, so the CLI can't drift from them
+    from exporters import EXPORT_FORMATS
+    from setops import MATCH_LEVELS, OPERATIONS
+
+    parser = argparse.ArgumentParser(description="Export, back up and clone Spotify playlists.")
+    parser.add_argument("--token", help="Spotify access token (default: $SPOTIFY_TOKEN or OAuth login)")
+    parser.add_argument("--metrics", metavar="FILE", help="Write timing metrics (OpenMetrics text) on exit")
+    parser.add_argument("--log-json", metavar="FILE", help="Append every timing event as a JSON line")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    library = commands.add_parser("library", help="List the playlists in your library")
+    library.add_argument("--json", action="store_true", help="Print full playlist objects as JSON")
+    library.set_defaults(func=cmd_library)
+
+    export = commands.add_parser("export", help="Export one playlist to a file, or several to a ZIP")
+    export.add_argument("playlists", nargs="*", metavar="PLAYLIST", help="Playlist id or link")
+    export.add_argument("--all", action="store_true", help="Export the entire library into one ZIP")
+    export.add_argument("-f", "--format", default="csv", choices=list(EXPORT_FORMATS))
+    export.add_argument("-o", "--output", help="Output file ('-' for stdout; ZIP path for several playlists)")
+    export.add_argument("--workers", type=int, default=3, help="Playlists fetched concurrently")
+    export.add_argument("--db", help="Track store to read unchanged playlists from (see sync)")
+    export.add_argument("--enrich", action="store_true",
+                        help="Add all artists, ISRC, release date, genres and audio features (csv/jsonl/parquet)")
+    export.add_argument("--enrich-db", default="spotify-enrich.db",
+                        help="Cache for enrichment lookups (default: %(default)s)")
+    export.add_argument("--stream", action="store_true",
+                        help="Write tracks page by page without keeping the playlist in memory (one playlist)")
+    export.set_defaults(func=cmd_export)
+
+    clone = commands.add_parser("clone", help="Create a static copy of a playlist in your library")
+    clone.add_argument("playlist", metavar="PLAYLIST", help="Playlist id or link")
+    clone.add_argument("--stream", action="store_true", help="Copy page by page without loading the playlist first")
+    clone.set_defaults(func=cmd_clone)
+
+    sync = commands.add_parser("sync", help="Update the local track store and show what changed")
+    sync.add_argument("playlists", nargs="*", metavar="PLAYLIST", help="Playlist id or link (default: whole library)")
+    sync.add_argument("--db", default="spotify-store.db", help="SQLite track store (default: %(default)s)")
+    sync.add_argument("-v", "--verbose", action="store_true", help="List unchanged playlists and every change")
+    sync.set_defaults(func=cmd_sync)
+
+    combine = commands.add_parser("combine", help="Write the union, intersection or difference of playlists")
+    combine.add_argument("operation", choices=list(OPERATIONS),
+                         help="difference keeps the first playlist's tracks found in none of the others; "
+                              "union of one playlist removes its duplicates")
+    combine.add_argument("playlists", nargs="+", metavar="PLAYLIST", help="Playlist id or link")
+    combine.add_argument("--match", default="uri", choices=list(MATCH_LEVELS),
+                         help="Same track by URI; also by ISRC; also by normalized title and artist")
+    combine.add_argument("--name", help="Name of the new playlist")
+    combine.add_argument("--dry-run", action="store_true", help="Print the resulting tracks instead of writing")
+    combine.add_argument("--enrich-db", default="spotify-enrich.db",
+                         help="Cache for ISRC lookups (default: %(default)s)")
+    combine.set_defaults(func=cmd_combine)
+
+    share = commands.add_parser("share", help="Print a playlist as shareable messages or a restorable code")
+    share.add_argument("playlist", metavar="PLAYLIST", help="Playlist id or link")
+    share.add_argument("--code", action="store_true", help="Print a compact share code instead of text")
+    share.add_argument("--stream", action="store_true", help="With --code: build it page by page")
+    share.add_argument("--limit", type=int, default=1800, help="URL-encoded characters per message")
+    share.set_defaults(func=cmd_share)
+
+    restore = commands.add_parser("restore", help="Create a playlist from a share code")
+    restore.add_argument("code", metavar="CODE_OR_FILE", help="Share code, or a file containing one")
+    restore.add_argument("--name", help="Name of the new playlist (default: the shared name)")
+    restore.set_defaults(func=cmd_restore)
+
+    link_import = commands.add_parser("import", help="Resolve many playlist/album/track links into one list")
+    link_import.add_argument("links", nargs="*", metavar="LINK", help="Link or spotify: URI")
+    link_import.add_argument("--file", help="Read more links from a file ('-' for stdin)")
+    link_import.add_argument("-f", "--format", default="csv", choices=list(EXPORT_FORMATS))
+    link_import.add_argument("-o", "--output", help="Output file ('-' for stdout)")
+    link_import.add_argument("--clone", metavar="NAME", help="Write the tracks to a new playlist instead")
+    link_import.add_argument("--workers", type=int, default=4, help="Lookups run concurrently")
+    link_import.add_argument("--db", help="Track store to read unchanged playlists from (see sync)")
+    link_import.set_defaults(func=cmd_import)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.log_json:
+        from metrics import enable_json_log
+        enable_json_log(args.log_json)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if args.metrics:
+            from metrics import METRICS
+            METRICS.write_openmetrics(args.metrics)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Process-wide timings and counters.
+
+Everything that can make a session slow is recorded under a `(kind, name)`
+pair:
+
+* `api`: one Spotify request, by endpoint (latency, response bytes, retries),
+* `page`: one page of a paginated listing, including scheduling and retries,
+* `prepare`: turning API pages into tables and derived data,
+* `export`: generating an export file,
+* `render`: one section of a Streamlit script run.
+
+Cache lookups are counted per cache as hits/misses. `METRICS.snapshot()`
+feeds the sidebar diagnostics, `openmetrics()` renders everything in the
+OpenMetrics text format, and every event is also logged as one JSON line on
+the `metrics` logger (see `enable_json_log`).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+SAMPLES = 256               # Recent latencies kept per (kind, name) for p95
+OVERHEAD_SECTIONS = ("startup", "auth")    # Render laps before a run does any real work
+RERUN_OVERHEAD_BUDGET = 0.05                # Seconds those may take on a warm session
+PREFIX = "spotify_tools"
+
+log = logging.getLogger("metrics")
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Thread-safe registry of timings and cache counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._cache = {}
+
+    def _entry(self, kind, name):
+        key = (kind, name)
+        entry = self._timings.get(key)
+        if entry is None:
+            entry = self._timings[key] = {
+                "calls": 0, "errors": 0, "retries": 0, "bytes": 0,
+                "total_s": 0.0, "max_s": 0.0, "samples": deque(maxlen=SAMPLES),
+            }
+        return entry
+
+    def record(self, kind, name, seconds, bytes=0, failed=False, **labels):
+        """Record one finished operation; `labels` only go to the JSON log."""
+        with self._lock:
+            entry = self._entry(kind, name)
+            entry["calls"] += 1
+            entry["errors"] += int(failed)
+            entry["bytes"] += bytes
+            entry["total_s"] += seconds
+            entry["max_s"] = max(entry["max_s"], seconds)
+            entry["samples"].append(seconds)
+        if log.isEnabledFor(logging.INFO):
+            event = {"ts": round(time.time(), 3), "kind": kind, "name": name, "ms": round(seconds * 1000, 2)}
+            if bytes:
+                event["bytes"] = bytes
+            if failed:
+                event["failed"] = True
+            event.update(labels)
+            log.info(json.dumps(event, ensure_ascii=False))
+
+    def retry(self, kind, name):
+        with self._lock:
+            self._entry(kind, name)["retries"] += 1
+        if log.isEnabledFor(logging.INFO):
+            log.info(json.dumps({"ts": round(time.time(), 3), "kind": kind, "name": name, "retry": True}))
+
+    def cache(self, cache, result):
+        """Count one lookup in `cache`; `result` is e.g. "hit" or "miss"."""
+        with self._lock:
+            counts = self._cache.setdefault(cache, {})
+            counts[result] = counts.get(result, 0) + 1
+
+    @contextmanager
+    def timer(self, kind, name, **labels):
+        """Time a block; set `info['bytes']` inside it to record a size."""
+        info = {"bytes": 0}
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield info
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.record(kind, name, time.perf_counter() - start, bytes=info["bytes"], failed=failed, **labels)
+
+    def snapshot(self, kind=None):
+        """One row per `(kind, name)`, largest total time first."""
+        with self._lock:
+            rows = [
+                {
+                    "Kind": k,
+                    "Name": name,
+                    "Calls": e["calls"],
+                    "Retries": e["retries"],
+                    "Errors": e["errors"],
+                    "Avg (ms)": round(1000 * e["total_s"] / e["calls"], 1) if e["calls"] else 0.0,
+                    "p95 (ms)": round(1000 * _percentile(e["samples"], 0.95), 1),
+                    "Max (ms)": round(1000 * e["max_s"], 1),
+                    "Total (s)": round(e["total_s"], 2),
+                    "KB": round(e["bytes"] / 1024, 1),
+                }
+                for (k, name), e in self._timings.items() if kind is None or k == kind
+            ]
+        return sorted(rows, key=lambda r: r["Total (s)"], reverse=True)
+
+    def cache_snapshot(self):
+        """One row per cache with its lookup outcomes and hit rate."""
+        with self._lock:
+            caches = {name: dict(counts) for name, counts in self._cache.items()}
+        rows = []
+        for name, counts in sorted(caches.items()):
+            lookups = sum(counts.values())
+            misses = counts.get("miss", 0)
+            rows.append({
+                "Cache": name,
+                "Lookups": lookups,
+                "Hit rate": f"{100 * (lookups - misses) / lookups:.0f}%" if lookups else "-",
+                "Outcomes": ", ".join(f"{result} {n}" for result, n in sorted(counts.items())),
+            })
+        return rows
+
+    def openmetrics(self):
+        """All metrics in the OpenMetrics text exposition format."""
+        with self._lock:
+            timings = {key: {**e, "samples": list(e["samples"])} for key, e in self._timings.items()}
+            caches = {name: dict(counts) for name, counts in self._cache.items()}
+
+        lines = [f"# TYPE {PREFIX}_duration_seconds summary", f"# UNIT {PREFIX}_duration_seconds seconds"]
+        for (kind, name), e in sorted(timings.items()):
+            labels = f'kind="{_label(kind)}",name="{_label(name)}"'
+            lines.append(f'{PREFIX}_duration_seconds{{{labels},quantile="0.95"}} {_percentile(e["samples"], 0.95)}')
+            lines.append(f"{PREFIX}_duration_seconds_count{{{labels}}} {e['calls']}")
+            lines.append(f"{PREFIX}_duration_seconds_sum{{{labels}}} {e['total_s']}")
+        for metric, field in (("errors", "errors"), ("retries", "retries"), ("bytes", "bytes")):
+            lines.append(f"# TYPE {PREFIX}_{metric} counter")
+            for (kind, name), e in sorted(timings.items()):
+                lines.append(f'{PREFIX}_{metric}_total{{kind="{_label(kind)}",name="{_label(name)}"}} {e[field]}')
+        lines.append(f"# TYPE {PREFIX}_cache_lookups counter")
+        for cache, counts in sorted(caches.items()):
+            for result, n in sorted(counts.items()):
+                lines.append(f'{PREFIX}_cache_lookups_total{{cache="{_label(cache)}",result="{_label(result)}"}} {n}')
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_openmetrics(self, path):
+        """Atomically replace `path` with the current `openmetrics()` text."""
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(self.openmetrics())
+        os.replace(tmp, path)
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._cache.clear()
+
+
+METRICS = Metrics()
+
+_log_paths = set()
+
+
+def enable_json_log(path):
+    """Append every metrics event to `path` as one JSON object per line."""
+    path = os.path.abspath(path)
+    if path in _log_paths:
+        return
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    _log_paths.add(path)
+
+
+class RenderClock:
+    """Times consecutive sections of one script run as `render` events.
+
+    Each `lap(section)` records the time since the previous lap (or since
+    `start`, a `time.perf_counter()` value, default: when the clock was
+    created).
+    """
+
+    def __init__(self, metrics=METRICS, start=None, **labels):
+        self.metrics = metrics
+        self.labels = labels
+        self.laps = []
+        self._last = time.perf_counter() if start is None else start
+
+    def lap(self, section):
+        now = time.perf_counter()
+        self.metrics.record("render", section, now - self._last, **self.labels)
+        self.laps.append((section, now - self._last))
+        self._last = now
+
+
+def run_overhead(laps):
+    """Seconds of `(section, seconds)` render laps spent in OVERHEAD_SECTIONS."""
+    return sum(seconds for section, seconds in laps if section in OVERHEAD_SECTIONS)
@@ -0,0 +1,162 @@
+"""In-memory search index over the user's playlist library.
+
+Built once per library listing. Names, owners and descriptions are broken
+into character trigrams, so a filter query only scores playlists that share
+at least one trigram with it. Matching is fuzzy: a playlist matches when
+enough of the query's trigrams occur in it, which tolerates typos and
+partial words. Queries shorter than a trigram fall back to word prefixes.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+MIN_SIMILARITY = 0.5        # Share of query trigrams a match must contain
+
+# Filters over the library: the owned / followed / Spotify split
+OWNERSHIP_FILTERS = {
+    "all": "All",
+    "mine": "Mine",
+    "followed": "Followed",
+    "spotify": "By Spotify",
+}
+
+SORT_ORDERS = {
+    "relevance": "Best match",
+    "name": "Name",
+    "tracks": "Most tracks",
+    "library": "Library order",
+}
+
+
+def normalize(text):
+    """Lowercase, accent-free text with punctuation collapsed to spaces."""
+    text = unicodedata.normalize('NFKD', text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.sub(r'[^\w]+', ' ', text.lower()).split())
+
+
+def trigrams(text):
+    """Set of character trigrams of each word, padded so prefixes count more."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def owner_label(playlist):
+    owner = playlist.get('owner') or {}
+    return owner.get('display_name') or owner.get('id') or ""
+
+
+def display_name(playlist):
+    return f"{playlist.get('name') or 'Untitled'} • {owner_label(playlist)}"
+
+
+class PlaylistIndex:
+    """Trigram index over playlists, looked up by id.
+
+    `user_id` is the library owner; it decides what counts as "mine"
+    versus "followed".
+    """
+
+    def __init__(self, playlists, user_id=None):
+        self.user_id = user_id
+        self.by_id = {}
+        self._ids = []          # Library order
+        self._names = []        # Normalized, for prefix/substring checks
+        self._text = []         # Name, owner and description, normalized
+        self._gram_index = defaultdict(set)
+        self.spotify_owned = []
+        self.user_owned = []
+        self.mine = []
+
+        for pl in playlists:
+            if not pl or pl['id'] in self.by_id:
+                continue
+            pos = len(self._ids)
+            self.by_id[pl['id']] = pl
+            self._ids.append(pl['id'])
+            name = normalize(pl.get('name'))
+            text = " ".join(filter(None, (name, normalize(owner_label(pl)), normalize(pl.get('description')))))
+            self._names.append(name)
+            self._text.append(text)
+            for gram in trigrams(text):
+                self._gram_index[gram].add(pos)
+
+            owner_id = (pl.get('owner') or {}).get('id')
+            if owner_id == 'spotify':
+                self.spotify_owned.append(pos)
+            else:
+                self.user_owned.append(pos)
+            if user_id and owner_id == user_id:
+                self.mine.append(pos)
+
+        self._ownership = {
+            "mine": set(self.mine),
+            "followed": set(range(len(self._ids))) - set(self.mine),
+            "spotify": set(self.spotify_owned),
+        }
+        self._name_order = sorted(range(len(self._ids)), key=lambda pos: self._names[pos])
+
+    def __len__(self):
+        return len(self._ids)
+
+    def label(self, playlist_id):
+        return display_name(self.by_id[playlist_id])
+
+    def _scores(self, query):
+        """Relevance per matching position for a normalized query."""
+        query_grams = trigrams(query)
+        if len(query.replace(" ", "")) < 3 or not query_grams:
+            # Too short for trigrams: plain word-prefix match
+            return {
+                pos: 1.0 for pos, text in enumerate(self._text)
+                if any(word.startswith(query) for word in text.split())
+            }
+
+        hits = defaultdict(int)
+        for gram in query_grams:
+            for pos in self._gram_index.get(gram, ()):
+                hits[pos] += 1
+        scores = {}
+        for pos, count in hits.items():
+            score = count / len(query_grams)
+            name = self._names[pos]
+            if query in self._text[pos]:
+                score += 1.0
+            if name.startswith(query):
+                score += 1.0
+            if score >= MIN_SIMILARITY:
+                scores[pos] = score
+        return scores
+
+    def search(self, query="", ownership="all", sort="relevance", limit=None):
+        """Playlist ids matching `query` and `ownership`, sorted.
+
+        Returns `(ids, total)`: at most `limit` ids and the number of
+        matches overall.
+        """
+        query = normalize(query)
+        allowed = self._ownership.get(ownership)
+        if query:
+            scores = self._scores(query)
+            positions = [pos for pos in scores if allowed is None or pos in allowed]
+        else:
+            scores = {}
+            positions = self._name_order if sort in ("relevance", "name") else range(len(self._ids))
+            positions = [pos for pos in positions if allowed is None or pos in allowed]
+
+        if sort == "tracks":
+            positions.sort(key=lambda pos: -((self.by_id[self._ids[pos]].get('tracks') or {}).get('total') or 0))
+        elif sort == "library":
+            positions.sort()
+        elif query and sort == "relevance":
+            positions.sort(key=lambda pos: (-scores[pos], self._names[pos]))
+        elif query:
+            positions.sort(key=lambda pos: self._names[pos])
+
+        total = len(positions)
+        if limit is not None:
+            positions = positions[:limit]
+        return [self._ids[pos] for pos in positions], total
@@ -0,0 +1,86 @@
+"""Cached, prefetching playlist search.
+
+Results are cached per normalized query, market and offset, so reruns, repeat
+clicks on the quick-access buttons and "load more" never pay twice for the same
+page. `prefetch` fetches a page on a background thread; a later `search` for
+the same page waits for that request instead of issuing another one.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TTLCache
+from metrics import METRICS
+
+SEARCH_LIMIT = 8
+SEARCH_TTL = 10 * 60
+MIN_QUERY_LENGTH = 2
+
+# Fixed official queries behind the Quick Access buttons
+QUICK_ACCESS = {
+    "Discover Weekly": "Discover Weekly owner:spotify",
+    "Release Radar": "Release Radar owner:spotify",
+    "On Repeat": "On Repeat owner:spotify",
+    "Time Capsule": "Time Capsule owner:spotify",
+}
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search-prefetch")
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive cache key for a query."""
+    return " ".join((query or "").lower().split())
+
+
+class PlaylistSearch:
+    """Playlist search for one client with an LRU+TTL result cache."""
+
+    def __init__(self, sp, cache=None, limit=SEARCH_LIMIT):
+        self.sp = sp
+        self.cache = cache if cache is not None else TTLCache(maxsize=256, ttl=SEARCH_TTL)
+        self.limit = limit
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _key(self, query, offset, market):
+        return ('search', normalize_query(query), market, offset, self.limit)
+
+    def _fetch(self, key, query, offset, market):
+        try:
+            results = self.sp.search(q=query, type='playlist', limit=self.limit, offset=offset, market=market)
+            page = results['playlists']
+            result = {
+                'items': [pl for pl in page['items'] if pl],
+                'total': page.get('total', 0),
+                'has_more': bool(page.get('next')),
+            }
+            self.cache.set(key, result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def search(self, query, offset=0, market=None):
+        """Return `{'items', 'total', 'has_more'}` for one page of results."""
+        key = self._key(query, offset, market)
+        cached = self.cache.get(key)
+        if cached is not None:
+            METRICS.cache("search", "hit")
+            return cached
+        with self._lock:
+            future = self._inflight.get(key)
+        if future is not None:
+            METRICS.cache("search", "prefetched")
+            return future.result()
+        METRICS.cache("search", "miss")
+        return self._fetch(key, query, offset, market)
+
+    def prefetch(self, query, offset=0, market=None):
+        """Start fetching a page in the background unless it is cached or in flight."""
+        key = self._key(query, offset, market)
+        if self.cache.get(key) is not None:
+            return
+        with self._lock:
+            if key in self._inflight:
+                return
+            future = _prefetch_pool.submit(self._fetch, key, query, offset, market)
+            self._inflight[key] = future
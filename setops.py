@@ -0,0 +1,192 @@
+"""Union, intersection, difference and dedupe across playlists.
+
+Tracks are matched by identity keys, strongest first:
+
+* `uri`: the same Spotify track,
+* `isrc`: the same recording released under another URI (single and album
+  versions, regional releases),
+* `title`: the same normalized title and main artist, ignoring "feat." and
+  remaster suffixes.
+
+Choosing a match level also uses the levels before it. Every row of every
+input is indexed once into hash maps from key to recording; rows sharing any
+key are merged into one recording with a union-find, so building the index
+and every operation run in (near) linear time in the total number of rows.
+Results are TrackTables and are written like clones, through
+`clone.run_clone` and `TrackTable.uri_pages`.
+"""
+import re
+from dataclasses import dataclass, field
+
+from metrics import METRICS
+from playlist_index import normalize
+from tracks import TrackTable, is_addable
+
+MATCH_LEVELS = {
+    "uri": "Same Spotify track",
+    "isrc": "... or same recording (ISRC), e.g. single and album versions",
+    "title": "... or same title and main artist",
+}
+OPERATIONS = {
+    "union": "Merge: every track of any playlist, once (one playlist: remove duplicates)",
+    "intersection": "Tracks that are in every playlist",
+    "difference": "Tracks of the first playlist that are in none of the others",
+}
+
+SYMBOLS = {"union": " + ", "intersection": " ∩ ", "difference": " − "}
+
+_FEATURING = re.compile(r"\s*[(\[](?:feat|ft|with)\.?\s[^)\]]*[)\]]", re.IGNORECASE)
+_REMASTER = re.compile(
+    r"\s*(?:-\s*|[(\[])(?:\d{4}\s+)?(?:digital(?:ly)?\s+)?remaster(?:ed)?(?:\s+\d{4})?(?:\s+version)?[)\]]?\s*$",
+    re.IGNORECASE,
+)
+
+
+def title_key(name, artist):
+    """Normalized "title / main artist", or None when either is missing."""
+    title = normalize(_REMASTER.sub("", _FEATURING.sub("", name or "")))
+    artist = normalize(artist)
+    return f"{title}\x1f{artist}" if title and artist else None
+
+
+@dataclass
+class SetResult:
+    table: TrackTable
+    operation: str
+    match: str
+    inputs: int = 0             # Rows across all input playlists
+    duplicates: int = 0         # Rows dropped because their recording was already in the result
+    skipped: int = 0            # Unavailable and local rows, which can't be written
+    matched_by: dict = field(default_factory=dict)  # Level -> rows that joined an earlier recording
+
+
+class TrackIndex:
+    """Recording id for every row of several TrackTables.
+
+    `isrcs`, if given, holds one list per table aligned with its rows (see
+    `enrich.Enricher.isrcs`); rows without an ISRC only match on the other
+    keys.
+    """
+
+    def __init__(self, tables, match="uri", isrcs=None):
+        if match not in MATCH_LEVELS:
+            raise ValueError(f"Unknown match level {match!r}; choose from {', '.join(MATCH_LEVELS)}")
+        self.tables = list(tables)
+        self.match = match
+        levels = list(MATCH_LEVELS)
+        self.matched_by = dict.fromkeys(levels[:levels.index(match) + 1], 0)
+        self.skipped = 0
+        self._parent = []
+        self._by_key = {}
+        self.recordings = [self._add_table(table, isrcs[t] if isrcs else None) for t, table in enumerate(self.tables)]
+        # Flatten every id to its final root once, so lookups are plain reads
+        for rows in self.recordings:
+            for i, rec in enumerate(rows):
+                if rec >= 0:
+                    rows[i] = self._find(rec)
+
+    def _find(self, rec):
+        parent = self._parent
+        while parent[rec] != rec:
+            parent[rec] = parent[parent[rec]]
+            rec = parent[rec]
+        return rec
+
+    def _keys(self, uri, isrc, name, artist):
+        yield "uri", uri
+        if "isrc" in self.matched_by and isrc:
+            yield "isrc", isrc
+        if "title" in self.matched_by:
+            key = title_key(name, artist)
+            if key:
+                yield "title", key
+
+    def _add_table(self, table, isrcs):
+        rows = []
+        for i, (uri, name, artist, _, _, available) in enumerate(table.rows()):
+            if not available or not is_addable(uri):
+                self.skipped += 1
+                rows.append(-1)
+                continue
+            keys = list(self._keys(uri, isrcs[i] if isrcs else None, name, artist))
+            rec = None
+            for level, key in keys:
+                found = self._by_key.get((level, key))
+                if found is None:
+                    continue
+                found = self._find(found)
+                if rec is None:
+                    rec = found
+                    self.matched_by[level] += 1
+                elif found != rec:
+                    self._parent[found] = rec
+            if rec is None:
+                rec = len(self._parent)
+                self._parent.append(rec)
+            for level, key in keys:
+                self._by_key.setdefault((level, key), rec)
+            rows.append(rec)
+        return rows
+
+    def present(self, t):
+        """Set of recording ids in table `t`."""
+        return {rec for rec in self.recordings[t] if rec >= 0}
+
+
+def _select(index, t_rows, result):
+    """Build the result table from `(table, row)` pairs, first occurrence per recording."""
+    seen = set()
+    rows = []
+    for t, i in t_rows:
+        rec = index.recordings[t][i]
+        if rec in seen:
+            result.duplicates += 1
+            continue
+        seen.add(rec)
+        rows.append(index.tables[t].row(i))
+    result.table = TrackTable.from_rows(rows)
+    return result
+
+
+def combine(tables, operation="union", match="uri", isrcs=None):
+    """Run `operation` (see OPERATIONS) over `tables`, in their order; returns a SetResult."""
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation {operation!r}; choose from {', '.join(OPERATIONS)}")
+    if not tables:
+        raise ValueError("No playlists to combine")
+    with METRICS.timer("prepare", f"setops:{operation}"):
+        index = TrackIndex(tables, match=match, isrcs=isrcs)
+        result = SetResult(
+            TrackTable(), operation, match,
+            inputs=sum(len(t) for t in tables), skipped=index.skipped, matched_by=dict(index.matched_by),
+        )
+
+        def live(t):
+            return ((t, i) for i, rec in enumerate(index.recordings[t]) if rec >= 0)
+
+        if operation == "union":
+            return _select(index, (pair for t in range(len(tables)) for pair in live(t)), result)
+
+        first = index.present(0)
+        if operation == "intersection":
+            for t in range(1, len(tables)):
+                first &= index.present(t)
+            keep = first
+        else:
+            others = set()
+            for t in range(1, len(tables)):
+                others |= index.present(t)
+            keep = first - others
+        return _select(index, (pair for pair in live(0) if index.recordings[0][pair[1]] in keep), result)
+
+
+def result_name(operation, names):
+    """Default name for a written result, e.g. "Rock ∩ Chill"."""
+    if operation == "union" and len(names) == 1:
+        return f"{names[0]} (deduplicated)"
+    return SYMBOLS[operation].join(names)
+
+
+def dedupe(table, match="isrc", isrcs=None):
+    """`table` with repeated recordings removed (a union of one playlist)."""
+    return combine([table], "union", match=match, isrcs=[isrcs] if isrcs else None)
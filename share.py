@@ -0,0 +1,118 @@
+"""Share text and restorable share codes for playlists of any length.
+
+A long playlist joined into one "Title - Artist" message makes wa.me URLs of
+hundreds of KB, which browsers and WhatsApp refuse. `chunk_messages` splits
+the lines into numbered messages whose encoded URL stays under
+`MESSAGE_LIMIT`. A share code is the compact alternative: the track ids,
+zlib-compressed and base64url-encoded behind `CODE_PREFIX`, which
+`decode_share_code` turns back into URIs a new playlist can be written from.
+
+Everything here is pure and meant to be memoized per snapshot through
+`TrackTable.memo`.
+"""
+import base64
+import json
+import urllib.parse
+import zlib
+
+from tracks import is_addable
+
+MESSAGE_LIMIT = 1800        # Encoded characters per wa.me message; longer links get cut or refused
+MIN_LINE_ROOM = 40          # Encoded characters a message must have left for a line after its header
+CODE_PREFIX = "spl1:"
+MAX_PAYLOAD = 4 * 1024 * 1024   # Decompressed bytes a share code may hold, far above any real playlist
+TRACK_PREFIX = "spotify:track:"
+
+
+def whatsapp_url(text):
+    return f"https://wa.me/?text={urllib.parse.quote(text)}"
+
+
+def _encoded_len(text):
+    return len(urllib.parse.quote(text))
+
+
+def _cut(line, room):
+    """Longest prefix of `line` whose URL-encoded form fits `room` characters."""
+    used = 0
+    for i, char in enumerate(line):
+        used += _encoded_len(char)
+        if used > room:
+            return line[:i]
+    return line
+
+
+def chunk_messages(lines, title="", limit=MESSAGE_LIMIT):
+    """Split `lines` into messages whose URL-encoded text fits `limit`.
+
+    With more than one message each starts with "title (i/n)". A single
+    line longer than the limit gets a message of its own, cut to fit.
+    Raises ValueError when `limit` leaves less than MIN_LINE_ROOM for a
+    line after the header.
+    """
+    header_room = _encoded_len(f"{title} (9999/9999)\n")
+    budget = limit - header_room
+    if budget < MIN_LINE_ROOM:
+        raise ValueError(f"A limit of {limit} leaves no room for tracks; use at least {header_room + MIN_LINE_ROOM}")
+    chunks, current, size = [], [], 0
+    for line in lines:
+        cost = _encoded_len(line) + 3    # "%0A" between lines
+        if cost > budget:
+            line = _cut(line, budget - 3)
+            cost = _encoded_len(line) + 3
+        if current and size + cost > budget:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(line)
+        size += cost
+    if current:
+        chunks.append(current)
+    if len(chunks) <= 1:
+        return ["\n".join(chunk) for chunk in chunks]
+    return [f"{title} ({i}/{len(chunks)})\n" + "\n".join(chunk) for i, chunk in enumerate(chunks, 1)]
+
+
+def encode_share_code(name, uris):
+    """Compact, restorable code for a playlist's addable tracks and episodes.
+
+    `uris` may be any iterable, e.g. a stream of pages; ids are compressed
+    as they come, so only the compressed code is held.
+    """
+    packer = zlib.compressobj(9)
+    parts = [packer.compress(f'{{"n":{json.dumps(name, ensure_ascii=False)},"i":['.encode("utf-8"))]
+    separator = ""
+    for uri in uris:
+        if not is_addable(uri):
+            continue
+        item = uri[len(TRACK_PREFIX):] if uri.startswith(TRACK_PREFIX) else uri
+        parts.append(packer.compress(f"{separator}{json.dumps(item, ensure_ascii=False)}".encode("utf-8")))
+        separator = ","
+    parts.append(packer.compress(b"]}") + packer.flush())
+    return CODE_PREFIX + base64.urlsafe_b64encode(b"".join(parts)).decode("ascii").rstrip("=")
+
+
+def decode_share_code(code):
+    """`(name, uris)` from a share code; raises ValueError if it isn't one."""
+    code = "".join((code or "").split())
+    if not code.startswith(CODE_PREFIX):
+        raise ValueError(f"Share codes start with {CODE_PREFIX}")
+    body = code[len(CODE_PREFIX):]
+    try:
+        packed = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+        # Codes are pasted by users: bound the output so a tiny code can't expand to gigabytes
+        decompressor = zlib.decompressobj()
+        raw = decompressor.decompress(packed, MAX_PAYLOAD)
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"unpacks to over {MAX_PAYLOAD // (1024 * 1024)} MB")
+        if not decompressor.eof:
+            raise ValueError("incomplete data")
+        payload = json.loads(raw)
+    except (ValueError, zlib.error) as e:
+        raise ValueError(f"Damaged share code: {e}") from e
+    name = payload.get("n") if isinstance(payload, dict) else None
+    items = payload.get("i", []) if isinstance(payload, dict) else None
+    if not isinstance(name, (str, type(None))) or not isinstance(items, list) \
+            or not all(isinstance(item, str) for item in items):
+        raise ValueError("Damaged share code: unexpected content")
+    uris = [item if ":" in item else TRACK_PREFIX + item for item in items]
+    return name or "", uris
@@ -0,0 +1,108 @@
+"""Process-wide cache for data that is the same for every user.
+
+Session caches are per user, so when many users open the same editorial
+playlist each of them fetches it again. `SharedCache` is one more tier,
+shared by every session of the process (or, with a file or Redis backend,
+by every process using it). Only data no token can influence goes in:
+
+* track tables of public, non-collaborative playlists, keyed by
+  `(playlist_id, snapshot_id, market)`,
+* playlist search result pages, keyed by query, market, offset and limit.
+
+Private and collaborative playlists are never shared. Spotify applies the
+user's country whenever a market is requested, so such results are keyed
+by that country and not shared at all when it is unknown.
+"""
+from cache import RedisCache, SqliteCache, TTLCache, row_weight
+from metrics import METRICS
+
+SHARED_MAX_ROWS = 250_000   # Memory backend bound: table rows plus search results
+SHARED_MAX_ENTRIES = 2000   # File / Redis backend bound
+SHARED_TTL = 24 * 3600      # Keyed by snapshot_id, so only age limits tables
+SHARED_SEARCH_TTL = 10 * 60
+
+
+def open_backend(spec=""):
+    """Cache backend for `spec`: "" for memory, "redis://..." or a SQLite file path."""
+    if not spec:
+        return TTLCache(maxsize=SHARED_MAX_ROWS, ttl=SHARED_TTL, weigh=row_weight)
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(spec, maxsize=SHARED_MAX_ENTRIES, ttl=SHARED_TTL, prefix="spotify-tools:shared")
+    return SqliteCache(spec, maxsize=SHARED_MAX_ENTRIES, ttl=SHARED_TTL)
+
+
+def is_shareable(playlist):
+    """True for playlists every user sees the same: public and not collaborative."""
+    return playlist.get('public') is True and not playlist.get('collaborative')
+
+
+def shared_market(market, country):
+    """Market part of a shared key, or None when the result can't be shared.
+
+    Without a market Spotify returns items unchanged for everyone. With one
+    (including "from_token") the token's country decides, so it must be known.
+    """
+    if market is None:
+        return "-"
+    return country or None
+
+
+class SharedCache:
+    """Shared tier in front of a backend from `open_backend`; lookups are counted in METRICS."""
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else open_backend()
+
+    def _get(self, kind, key):
+        value = self.backend.get(('shared', kind) + key)
+        METRICS.cache(f"shared_{kind}", "miss" if value is None else "hit")
+        return value
+
+    def get_table(self, playlist, market=None, country=None):
+        """Shared TrackTable for a playlist object, or None."""
+        key = self.table_key(playlist, market, country)
+        return self._get('table', key) if key else None
+
+    def set_table(self, playlist, table, market=None, country=None):
+        """Share a TrackTable if the playlist allows it; returns whether it did."""
+        key = self.table_key(playlist, market, country)
+        if key:
+            self.backend.set(('shared', 'table') + key, table, ttl=SHARED_TTL)
+        return key is not None
+
+    @staticmethod
+    def table_key(playlist, market=None, country=None):
+        snapshot_id = playlist.get('snapshot_id')
+        market_key = shared_market(market, country)
+        if not (snapshot_id and market_key and is_shareable(playlist)):
+            return None
+        return (playlist['id'], snapshot_id, market_key)
+
+    def search_view(self, country=None):
+        """Cache for `search.PlaylistSearch` results seen by a token from `country`.
+
+        Search always applies the token's country, so without one there is
+        nothing safe to share and None is returned.
+        """
+        return SharedSearchView(self, country) if country else None
+
+
+class SharedSearchView:
+    """The search part of a SharedCache for one country, with the plain cache interface."""
+
+    def __init__(self, shared, country):
+        self.shared = shared
+        self.country = country
+
+    def get(self, key, default=None):
+        value = self.shared._get('search', (self.country,) + key)
+        return default if value is None else value
+
+    def set(self, key, value, ttl=None):
+        self.shared.backend.set(('shared', 'search', self.country) + key, value, ttl=SHARED_SEARCH_TTL)
+
+    def delete(self, key):
+        self.shared.backend.delete(('shared', 'search', self.country) + key)
+
+    def clear(self):
+        pass    # Other sessions rely on it; entries expire on their own
@@ -0,0 +1,175 @@
+"""Local SQLite track store for incremental playlist sync.
+
+The store keeps, per account, each playlist's `snapshot_id` and its track rows.
+`TrackStore.sync` only fetches a playlist when its snapshot differs from the
+stored one, and reports what changed since the previous sync. Spotify has no
+diff endpoint, so a changed playlist is still fetched in full; unchanged ones
+cost nothing beyond the library listing that carries their snapshot ids.
+"""
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from metrics import METRICS
+from tracks import TrackTable, fetch_track_table
+
+
+@dataclass
+class PlaylistDiff:
+    """Changes between two versions of a playlist, as `(position, label)` pairs."""
+    added: List[tuple] = field(default_factory=list)
+    removed: List[tuple] = field(default_factory=list)
+    moved: List[tuple] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.moved)
+
+    def summary(self):
+        return f"+{len(self.added)} added, -{len(self.removed)} removed, ~{len(self.moved)} moved"
+
+
+@dataclass
+class SyncResult:
+    playlist_id: str
+    name: str
+    status: str                 # new, changed, unchanged
+    table: TrackTable
+    diff: Optional[PlaylistDiff] = None
+
+
+def _label(table, i):
+    return f"{table.name[i]} - {table.artist[i]}"
+
+
+def _longest_increasing(values):
+    """Indexes into `values` forming one longest strictly increasing run."""
+    tails, tail_idx, prev = [], [], [None] * len(values)
+    for i, v in enumerate(values):
+        k = bisect_left(tails, v)
+        if k == len(tails):
+            tails.append(v)
+            tail_idx.append(i)
+        else:
+            tails[k] = v
+            tail_idx[k] = i
+        prev[i] = tail_idx[k - 1] if k else None
+    keep = set()
+    i = tail_idx[-1] if tail_idx else None
+    while i is not None:
+        keep.add(i)
+        i = prev[i]
+    return keep
+
+
+def diff_tables(old, new):
+    """Compute added/removed/moved tracks between two TrackTables.
+
+    Tracks are matched by URI, duplicates in occurrence order. Of the
+    matched tracks, those outside the longest run that kept its relative
+    order are reported as moved. Runs in O(n log n).
+    """
+    old_positions = defaultdict(deque)
+    for i, uri in enumerate(old.uri):
+        if uri:
+            old_positions[uri].append(i)
+
+    diff = PlaylistDiff()
+    matched = []    # (new_pos, old_pos)
+    for i, uri in enumerate(new.uri):
+        if not uri:
+            continue
+        if old_positions[uri]:
+            matched.append((i, old_positions[uri].popleft()))
+        else:
+            diff.added.append((i + 1, _label(new, i)))
+
+    for positions in old_positions.values():
+        diff.removed.extend((i + 1, _label(old, i)) for i in positions)
+    diff.removed.sort()
+
+    in_order = _longest_increasing([old_pos for _, old_pos in matched])
+    diff.moved = [
+        (new_pos + 1, _label(new, new_pos))
+        for k, (new_pos, _) in enumerate(matched) if k not in in_order
+    ]
+    return diff
+
+
+class TrackStore:
+    """Playlist metadata and track rows per account, in one SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS playlists (
+                    account TEXT, id TEXT, name TEXT, snapshot_id TEXT, synced_at REAL,
+                    PRIMARY KEY (account, id)
+                );
+                CREATE TABLE IF NOT EXISTS tracks (
+                    account TEXT, playlist_id TEXT, position INTEGER,
+                    uri TEXT, name TEXT, artist TEXT, album TEXT, duration_ms INTEGER, available INTEGER,
+                    PRIMARY KEY (account, playlist_id, position)
+                );
+            """)
+
+    def snapshot(self, account, playlist_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT snapshot_id FROM playlists WHERE account = ? AND id = ?", (account, playlist_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def load(self, account, playlist_id):
+        """Stored TrackTable for a playlist, or None if it was never synced."""
+        with self._lock:
+            if self._conn.execute(
+                "SELECT 1 FROM playlists WHERE account = ? AND id = ?", (account, playlist_id)
+            ).fetchone() is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT uri, name, artist, album, duration_ms, available FROM tracks "
+                "WHERE account = ? AND playlist_id = ? ORDER BY position",
+                (account, playlist_id),
+            ).fetchall()
+        return TrackTable.from_rows(rows)
+
+    def save(self, account, playlist, table):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO playlists (account, id, name, snapshot_id, synced_at) VALUES (?, ?, ?, ?, ?)",
+                (account, playlist['id'], playlist.get('name'), playlist.get('snapshot_id'), time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM tracks WHERE account = ? AND playlist_id = ?", (account, playlist['id'])
+            )
+            self._conn.executemany(
+                "INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((account, playlist['id'], position, *row) for position, row in enumerate(table.rows())),
+            )
+
+    def sync(self, sp, account, playlist, market=None, on_page=None):
+        """Bring one playlist up to date and return a SyncResult.
+
+        `playlist` needs `id`, `name` and `snapshot_id` (a library listing
+        entry is enough). Nothing is fetched when the stored snapshot matches.
+        """
+        stored = self.load(account, playlist['id'])
+        if stored is not None and playlist.get('snapshot_id') and \
+                self.snapshot(account, playlist['id']) == playlist['snapshot_id']:
+            METRICS.cache("track_store", "hit")
+            return SyncResult(playlist['id'], playlist.get('name') or "", "unchanged", stored)
+
+        METRICS.cache("track_store", "miss")
+        table = fetch_track_table(sp, playlist['id'], market=market, on_page=on_page)
+        with METRICS.timer("prepare", "store_save"):
+            self.save(account, playlist, table)
+        if stored is None:
+            return SyncResult(playlist['id'], playlist.get('name') or "", "new", table)
+        return SyncResult(playlist['id'], playlist.get('name') or "", "changed", table, diff_tables(stored, table))
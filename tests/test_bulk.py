@@ -0,0 +1,80 @@
+import json
+import zipfile
+
+import pytest
+
+from bulk import MANIFEST, export_playlists
+from tracks import TrackTable
+
+
+@pytest.fixture
+def playlists():
+    return [{'id': pid, 'name': pid.upper(), 'snapshot_id': "1"} for pid in "abc"]
+
+
+def export(path, playlists, fail=(), interrupt=(), on_progress=None):
+    loaded = []
+
+    def load(pl):
+        loaded.append(pl['id'])
+        if pl['id'] in interrupt:
+            raise KeyboardInterrupt
+        if pl['id'] in fail:
+            raise RuntimeError("boom")
+        return TrackTable()
+    result = export_playlists(None, playlists, str(path), load_table=load, workers=1, on_progress=on_progress)
+    return result, loaded
+
+
+def manifest(path):
+    with zipfile.ZipFile(path) as zf:
+        return {e['id']: e['file'] for e in json.loads(zf.read(MANIFEST))}
+
+
+def test_resume_redoes_failed_and_changed_playlists(tmp_path, playlists):
+    path = tmp_path / "out.zip"
+    export(path, playlists, fail={"b"})
+    playlists[2]['snapshot_id'] = "2"
+    result, loaded = export(path, playlists)
+    assert loaded == ["b", "c"]
+    assert not result.failed
+    assert manifest(path) == {"a": "A-a.csv", "b": "B-b.csv", "c": "C-c.csv"}
+
+
+def test_interrupted_run_keeps_previous_archive_and_resumes(tmp_path, playlists):
+    path = tmp_path / "out.zip"
+    export(path, playlists)
+    for pl in playlists[1:]:
+        pl['snapshot_id'] = "2"
+    with pytest.raises(KeyboardInterrupt):
+        export(path, playlists, interrupt={"c"})
+    with zipfile.ZipFile(path) as zf:
+        assert {e['snapshot_id'] for e in json.loads(zf.read(MANIFEST))} == {"1"}
+    assert manifest(tmp_path / "out.zip.interrupted") == {"a": "A-a.csv", "b": "B-b.csv", "c": None}
+
+    _, loaded = export(path, playlists)
+    assert loaded == ["c"]
+    assert manifest(path) == {"a": "A-a.csv", "b": "B-b.csv", "c": "C-c.csv"}
+    assert not (tmp_path / "out.zip.interrupted").exists()
+
+
+def test_interrupt_while_copying_keeps_previous_archive(tmp_path, playlists):
+    path = tmp_path / "out.zip"
+    export(path, playlists)
+
+    def stop(done, total, entry):
+        raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        export(path, playlists, on_progress=stop)
+    assert manifest(path) == {"a": "A-a.csv", "b": "B-b.csv", "c": "C-c.csv"}
+    with zipfile.ZipFile(path) as zf:
+        assert {"A-a.csv", "B-b.csv", "C-c.csv"} <= set(zf.namelist())
+
+
+def test_damaged_archive_is_rebuilt(tmp_path, playlists):
+    path = tmp_path / "out.zip"
+    path.write_bytes(b"not a zip")
+    result, loaded = export(path, playlists)
+    assert loaded == ["a", "b", "c"]
+    assert len(manifest(path)) == 3
+    assert not (tmp_path / "out.zip.partial").exists()
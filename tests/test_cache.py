@@ -0,0 +1,38 @@
+import threading
+
+from cache import SqliteCache, TieredCache, TTLCache, row_weight
+from tracks import TrackTable
+
+
+def table(rows):
+    return TrackTable.from_rows((f"spotify:track:{n}", "Song", "Artist", "Album", 1000, True) for n in range(rows))
+
+
+def test_memory_cache_is_bounded_by_rows():
+    cache = TTLCache(maxsize=1000, weigh=row_weight)
+    cache.set("small", table(100))
+    cache.set("big", table(800))
+    assert cache.weight == 900
+    cache.set("more", table(300))
+    assert cache.get("small") is None and cache.get("big") is None
+    assert cache.weight == 300
+    cache.set("huge", table(5000))
+    assert cache.get("huge") is None
+
+
+def test_unpicklable_value_stays_in_memory_only(tmp_path):
+    disk = SqliteCache(str(tmp_path / "cache.db"))
+    cache = TieredCache(TTLCache(), disk)
+    value = [threading.Lock()]
+    cache.set(("k",), value)
+    assert cache.get(("k",)) is value
+    assert len(disk) == 0
+
+
+def test_damaged_entry_is_a_miss_and_dropped(tmp_path):
+    disk = SqliteCache(str(tmp_path / "cache.db"))
+    disk.set(("k",), [1, 2])
+    with disk._conn:
+        disk._conn.execute("UPDATE cache SET value = ?", (b"\x80\x05garbage",))
+    assert disk.get(("k",), "miss") == "miss"
+    assert len(disk) == 0
@@ -0,0 +1,64 @@
+import pytest
+
+from clone import CloneJob, list_pages, run_clone
+
+
+class FakeWriter:
+    def __init__(self):
+        self.items = []
+
+    def current_user(self):
+        return {'id': "me"}
+
+    def user_playlist_create(self, user_id, name, public, description):
+        return {'id': "copy", 'external_urls': {'spotify': "https://open.spotify.com/playlist/copy"}}
+
+    def playlist_add_items(self, playlist_id, uris):
+        self.items += uris
+
+    def playlist_replace_items(self, playlist_id, uris):
+        self.items = list(uris)
+
+
+def uris(count, prefix="a"):
+    return [f"spotify:track:{prefix}{n}" for n in range(count)]
+
+
+def test_offset_advances_by_items_returned():
+    source = uris(7)
+    job = CloneJob("src", "Source")
+    run_clone(job, FakeWriter(), list_pages(source, size=3))
+    assert job.source_offset == 7
+    assert job.added == 7
+
+
+def interrupted_after(pages, limit):
+    def pages_from(start=0):
+        for n, page in enumerate(pages(start)):
+            if n == limit:
+                raise KeyboardInterrupt
+            yield page
+    return pages_from
+
+
+def test_resume_continues_at_same_snapshot():
+    writer, source = FakeWriter(), uris(7)
+    job = CloneJob("src", "Source", "snap1")
+    with pytest.raises(KeyboardInterrupt):
+        run_clone(job, writer, interrupted_after(list_pages(source, size=3), 1))
+    assert (job.status, job.source_offset) == ("paused", 3)
+    run_clone(job, writer, list_pages(source, size=3), snapshot_id="snap1")
+    assert writer.items == source
+    assert not job.restarted
+
+
+def test_resume_restarts_when_source_changed():
+    writer = FakeWriter()
+    job = CloneJob("src", "Source", "snap1")
+    with pytest.raises(KeyboardInterrupt):
+        run_clone(job, writer, interrupted_after(list_pages(uris(7), size=3), 1))
+    changed = uris(5, prefix="b")
+    run_clone(job, writer, list_pages(changed, size=3), snapshot_id="snap2")
+    assert writer.items == changed
+    assert job.restarted and job.source_snapshot == "snap2"
+    assert job.added == 5
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from enrich import EnrichmentCache, Enricher
+
+
+class FakeTracks:
+    """`sp.tracks` that records requested ids and how many calls overlap."""
+
+    def __init__(self, delay=0.2, fail_ids=()):
+        self.delay = delay
+        self.fail_ids = set(fail_ids)
+        self.requested = []
+        self.running = self.max_running = 0
+        self._lock = threading.Lock()
+
+    def tracks(self, ids):
+        with self._lock:
+            self.requested += ids
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self.delay)
+            if self.fail_ids & set(ids):
+                raise RuntimeError("lookup failed")
+            return {'tracks': [{'id': i, 'artists': [], 'external_ids': {'isrc': f"ISRC{i}"}} for i in ids]}
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def lookup_in_threads(enricher, *id_lists):
+    results, errors = [None] * len(id_lists), []
+
+    def run(n, ids):
+        try:
+            results[n] = enricher._lookup("track", ids, 50, enricher._fetch_tracks)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(n, ids)) for n, ids in enumerate(id_lists)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_lookups_of_different_ids_overlap():
+    sp = FakeTracks()
+    enricher = Enricher(sp, EnrichmentCache())
+    results, errors = lookup_in_threads(enricher, ["a", "b"], ["c", "d"])
+    assert not errors
+    assert sp.max_running == 2
+    assert results[1]["c"]["isrc"] == "ISRCc"
+
+
+def test_shared_ids_are_fetched_once():
+    sp = FakeTracks()
+    enricher = Enricher(sp, EnrichmentCache())
+    results, errors = lookup_in_threads(enricher, ["a", "b"], ["b", "c"])
+    assert not errors
+    assert sorted(sp.requested) == ["a", "b", "c"]
+    assert results[1]["b"]["isrc"] == "ISRCb"
+
+
+def test_waiting_lookup_fetches_ids_whose_owner_failed():
+    sp = FakeTracks(fail_ids={"a"})
+    enricher = Enricher(sp, EnrichmentCache())
+    results, errors = lookup_in_threads(enricher, ["a", "b"], ["b"])
+    assert len(errors) == 1
+    assert results[1]["b"]["isrc"] == "ISRCb"
+    assert enricher._inflight["track"] == {}
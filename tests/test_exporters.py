@@ -0,0 +1,36 @@
+import io
+import os
+
+import pytest
+
+from exporters import export_stream_file
+from tracks import TrackTable
+
+
+def chunks(count, size):
+    for start in range(0, count, size):
+        yield TrackTable.from_rows(
+            (f"spotify:track:{n}", f"Song {n}", "Artist", "Album", 180000, True)
+            for n in range(start, min(start + size, count))
+        )
+
+
+def test_stream_file_holds_every_chunk_and_leaves_nothing_behind(tmp_path, monkeypatch):
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    with export_stream_file(chunks(250, 100), "csv") as fh:
+        assert isinstance(fh, io.BufferedReader)
+        lines = fh.read().decode("utf-8").splitlines()
+    assert len(lines) == 251
+    assert lines[-1].startswith("Song 249,")
+    assert os.listdir(tmp_path) == []
+
+
+def test_stream_file_is_removed_when_encoding_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+
+    def failing():
+        yield from chunks(10, 5)
+        raise RuntimeError("page failed")
+    with pytest.raises(RuntimeError):
+        export_stream_file(failing(), "csv")
+    assert os.listdir(tmp_path) == []
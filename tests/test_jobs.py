@@ -0,0 +1,50 @@
+import threading
+
+from jobs import CANCELLED, DONE, FAILED, JobRunner
+
+
+def test_cancelled_key_is_not_restarted_without_forget():
+    runner = JobRunner(max_workers=1)
+    started = threading.Event()
+    runs = []
+
+    def work(job):
+        runs.append(1)
+        started.set()
+        while True:
+            job.report(0.5, "working")
+
+    job = runner.submit("s", "k", work)
+    started.wait(5)
+    job.cancel()
+    job.wait(5)
+    assert job.status == CANCELLED
+    assert runner.submit("s", "k", work) is job
+    assert runs == [1]
+
+    runner.forget("s", "k")
+    assert runner.submit("s", "k", lambda job: "again").wait(5)
+    assert runner.get("s", "k").result == "again"
+
+
+def test_failed_key_is_kept_until_forgotten():
+    runner = JobRunner(max_workers=1)
+    calls = []
+
+    def fail(job):
+        calls.append(1)
+        raise RuntimeError("api down")
+
+    job = runner.submit("s", "k", fail)
+    job.wait(5)
+    assert job.status == FAILED and "api down" in job.error
+    assert runner.submit("s", "k", fail) is job
+    assert calls == [1]
+
+
+def test_done_job_result_is_returned():
+    runner = JobRunner(max_workers=1)
+    job = runner.submit("s", "k", lambda job: 42)
+    job.wait(5)
+    assert job.status == DONE
+    assert runner.submit("s", "k", lambda job: 0).result == 42
@@ -0,0 +1,75 @@
+import base64
+import json
+import zlib
+
+import pytest
+
+from share import CODE_PREFIX, MAX_PAYLOAD, MIN_LINE_ROOM, _encoded_len, chunk_messages, decode_share_code, encode_share_code
+
+
+def code_for(payload):
+    packed = zlib.compress(json.dumps(payload).encode("utf-8"))
+    return CODE_PREFIX + base64.urlsafe_b64encode(packed).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("limit", [1, 3, 10, 40])
+def test_limit_without_room_for_a_line_is_rejected(limit):
+    with pytest.raises(ValueError):
+        chunk_messages(["Song title - Artist"] * 5, "My playlist", limit=limit)
+
+
+def test_smallest_accepted_limit_keeps_whole_short_lines():
+    title = "My playlist"
+    limit = _encoded_len(f"{title} (9999/9999)\n") + MIN_LINE_ROOM
+    messages = chunk_messages(["Song title - Artist"] * 5, title, limit=limit)
+    assert len(messages) == 5
+    for message in messages:
+        assert message.endswith("Song title - Artist")
+        assert _encoded_len(message) <= limit
+
+
+def test_long_line_is_cut_to_fit():
+    title = "T"
+    limit = _encoded_len(f"{title} (9999/9999)\n") + MIN_LINE_ROOM
+    messages = chunk_messages(["é" * 500, "short"], title, limit=limit)
+    assert len(messages) == 2
+    assert messages[0].startswith("T (1/2)\né")
+    assert all(_encoded_len(message) <= limit for message in messages)
+
+
+def test_share_code_round_trip():
+    uris = ["spotify:track:abc", "spotify:local:x", "spotify:episode:e"]
+    name, restored = decode_share_code(encode_share_code("Mix", iter(uris)))
+    assert name == "Mix"
+    assert restored == ["spotify:track:abc", "spotify:episode:e"]
+
+
+@pytest.mark.parametrize("payload", [
+    [1, 2],
+    "text",
+    {"n": "x", "i": "abc"},
+    {"n": "x", "i": [1, "abc"]},
+    {"n": ["x"], "i": []},
+])
+def test_unexpected_payload_is_a_value_error(payload):
+    with pytest.raises(ValueError):
+        decode_share_code(code_for(payload))
+
+
+def test_garbage_is_a_value_error():
+    with pytest.raises(ValueError):
+        decode_share_code(CODE_PREFIX + "not-base64-zlib")
+
+
+def test_oversized_code_is_rejected_without_unpacking_it():
+    packed = zlib.compress(b" " * (MAX_PAYLOAD * 4), 9)
+    code = CODE_PREFIX + base64.urlsafe_b64encode(packed).decode("ascii")
+    assert len(code) < MAX_PAYLOAD // 100
+    with pytest.raises(ValueError, match="unpacks to over"):
+        decode_share_code(code)
+
+
+def test_truncated_code_is_a_value_error():
+    code = code_for({"n": "x", "i": ["abc"] * 200})
+    with pytest.raises(ValueError):
+        decode_share_code(code[:len(code) // 2])
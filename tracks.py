@@ -0,0 +1,182 @@
+"""Columnar track table shared by the track list, share text, CSV and clone.
+
+A `TrackTable` is built once per playlist snapshot from the raw item pages and
+then memoized by the caller. Everything derived from it (share text, export
+bytes, ...) goes through `TrackTable.memo`, so reruns that don't change the
+playlist don't recompute anything.
+"""
+import sys
+import time
+from array import array
+
+from fetching import PAGE_SIZE, iter_track_pages
+from metrics import METRICS
+
+UNAVAILABLE = "Unknown Track (Local? or Unplayable)"
+EXPORT_COLUMNS = ("Title", "Artist", "Album", "Duration (ms)")
+STREAM_CHUNK_ROWS = 5000    # Rows per chunk in streaming mode (one export batch)
+
+
+def is_addable(uri):
+    """Local files have URIs too, but Spotify rejects them in add requests."""
+    return bool(uri) and not uri.startswith("spotify:local:")
+
+
+class TrackTable:
+    """One list per column; row i is playlist position i."""
+
+    def __init__(self):
+        self.uri = []
+        self.name = []
+        self.artist = []
+        self.album = []
+        self.duration_ms = array('l')
+        self.available = array('b')
+        self._derived = {}
+
+    def __len__(self):
+        return len(self.uri)
+
+    def __getstate__(self):
+        # Derived values are cheap to rebuild and not worth persisting
+        state = self.__dict__.copy()
+        state['_derived'] = {}
+        return state
+
+    def extend(self, items):
+        """Append one page of raw playlist items."""
+        for item in items:
+            track = item.get('track') if item else None
+            if track:
+                self.uri.append(track.get('uri'))
+                self.name.append(track['name'])
+                # Artists and albums repeat a lot; interned, each is stored once
+                self.artist.append(sys.intern(track['artists'][0]['name']) if track.get('artists') else "")
+                self.album.append(sys.intern(track['album']['name']) if track.get('album') else "")
+                self.duration_ms.append(track.get('duration_ms') or 0)
+                self.available.append(1)
+            else:
+                self.uri.append(None)
+                self.name.append(UNAVAILABLE)
+                self.artist.append("")
+                self.album.append("")
+                self.duration_ms.append(0)
+                self.available.append(0)
+        self._derived.clear()
+
+    def extend_from(self, other):
+        """Append every row of another TrackTable."""
+        self.uri.extend(other.uri)
+        self.name.extend(other.name)
+        self.artist.extend(other.artist)
+        self.album.extend(other.album)
+        self.duration_ms.extend(other.duration_ms)
+        self.available.extend(other.available)
+        self._derived.clear()
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Rebuild a table from `(uri, name, artist, album, duration_ms, available)` rows."""
+        table = cls()
+        for uri, name, artist, album, duration_ms, available in rows:
+            table.uri.append(uri)
+            table.name.append(name)
+            table.artist.append(artist)
+            table.album.append(album)
+            table.duration_ms.append(duration_ms)
+            table.available.append(1 if available else 0)
+        return table
+
+    def rows(self):
+        """Iterate `(uri, name, artist, album, duration_ms, available)` rows."""
+        return zip(self.uri, self.name, self.artist, self.album, self.duration_ms, self.available)
+
+    def row(self, i):
+        """Row `i` as `(uri, name, artist, album, duration_ms, available)`."""
+        return self.uri[i], self.name[i], self.artist[i], self.album[i], self.duration_ms[i], self.available[i]
+
+    def memo(self, name, build):
+        """Return `build()` computed once for this table."""
+        if name not in self._derived:
+            METRICS.cache("table_memo", "miss")
+            self._derived[name] = build()
+        else:
+            METRICS.cache("table_memo", "hit")
+        return self._derived[name]
+
+    def window(self, start, end, first_position=None):
+        """Display columns for rows `start:end`, numbered from `first_position` (default start + 1)."""
+        durations = [ms // 1000 for ms in self.duration_ms[start:end]]
+        first_position = start + 1 if first_position is None else first_position
+        return {
+            "#": list(range(first_position, first_position + len(durations))),
+            "Title": self.name[start:end],
+            "Artist": self.artist[start:end],
+            "Album": self.album[start:end],
+            "Duration": [f"{s // 60}:{s % 60:02d}" for s in durations],
+        }
+
+    def available_rows(self):
+        """Indexes of rows that hold a real track."""
+        return [i for i, ok in enumerate(self.available) if ok]
+
+    def share_lines(self):
+        """'Title - Artist' for every available track."""
+        return [f"{self.name[i]} - {self.artist[i]}" for i in self.available_rows()]
+
+    def export_columns(self):
+        """Available tracks as {column: values} using EXPORT_COLUMNS."""
+        rows = self.available_rows()
+        return {
+            "Title": [self.name[i] for i in rows],
+            "Artist": [self.artist[i] for i in rows],
+            "Album": [self.album[i] for i in rows],
+            "Duration (ms)": [self.duration_ms[i] for i in rows],
+        }
+
+    def uri_pages(self, start=0, size=PAGE_SIZE):
+        """Yield `(offset, uris, item_count, total)` pages for cloning."""
+        total = len(self)
+        for offset in range(start, total, size):
+            uris = [u for u in self.uri[offset:offset + size] if is_addable(u)]
+            yield offset, uris, min(size, total - offset), total
+
+
+def fetch_track_table(sp, playlist_id, market=None, on_page=None):
+    """Fetch every page of a playlist into a new TrackTable.
+
+    `on_page(table, total)` is called after each page is added.
+    """
+    table = TrackTable()
+    building = 0.0
+    for _, items, total in iter_track_pages(sp, playlist_id, market=market):
+        started = time.perf_counter()
+        table.extend(items)
+        building += time.perf_counter() - started
+        if on_page:
+            on_page(table, total)
+    METRICS.record("prepare", "track_table", building)
+    return table
+
+
+def stream_track_chunks(sp, playlist_id, market=None, chunk_rows=STREAM_CHUNK_ROWS, on_page=None):
+    """Yield a playlist as TrackTables of about `chunk_rows` rows each.
+
+    Streaming mode for playlists too large to keep: each page is projected
+    into the current chunk as it arrives and then dropped, and a chunk is
+    released once the consumer moves on. Memory stays at one chunk plus the
+    fetch window whatever the playlist length. `on_page(rows, total)` is
+    called after each page with the rows seen so far.
+    """
+    chunk = TrackTable()
+    rows = 0
+    for _, items, total in iter_track_pages(sp, playlist_id, market=market):
+        chunk.extend(items)
+        rows += len(items)
+        if on_page:
+            on_page(rows, total)
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = TrackTable()
+    if len(chunk):
+        yield chunk